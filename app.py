@@ -1,3 +1,6 @@
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import LoginManager, login_required, current_user
 from config import config
@@ -7,18 +10,51 @@ from routes import api_bp
 from auth_routes import auth_bp
 from email_service import mail
 from scheduler import init_scheduler, shutdown_scheduler
+from password_hashing import init_password_hashing, shutdown_password_hashing
+from json_provider import FastJSONProvider
+from boot import BootTimer, ensure_schema, defer_until_first_request
+from instrumentation import init_instrumentation
+from metrics import init_metrics
+from tracing import init_tracing
+from profiling import init_profiling
+from events import init_events
+from cache_bus import init_cache_bus, shutdown_cache_bus
+from report_jobs import init_report_jobs, shutdown_report_jobs
+from autocomplete import init_autocomplete
+from kiosk_sync import init_kiosk_sync
+from compression import init_compression
 import atexit
 
-def create_app(config_name='development'):
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+def create_app(config_name='development', config_overrides=None):
     """Application factory"""
+    timer = BootTimer()
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     
     # Load configuration
     app.config.from_object(config[config_name])
+    if config_overrides:
+        app.config.update(config_overrides)
+    fast_boot = app.config.get('FAST_BOOT', False)
+    timer.mark('config')
     
-    # Initialize extensions
+    # Initialize extensions (fast boot sets up mail on first send)
     db.init_app(app)
-    mail.init_app(app)
+    if not fast_boot:
+        mail.init_app(app)
+    init_password_hashing(app)
+    init_instrumentation(app)
+    init_metrics(app)
+    init_tracing(app)
+    init_profiling(app)
+    init_events(app)
+    init_cache_bus(app)
+    init_report_jobs(app)
+    init_autocomplete(app)
+    init_kiosk_sync(app)
+    init_compression(app)
     
     # Initialize Flask-Login
     login_manager = LoginManager()
@@ -30,19 +66,33 @@ def create_app(config_name='development'):
     def load_user(user_id):
         return User.query.get(user_id)
     
+    timer.mark('extensions')
+    
     # Register blueprints
     app.register_blueprint(api_bp)
     app.register_blueprint(auth_bp)
+    timer.mark('blueprints')
     
-    # Create database tables
+    # Create database tables (fast boot skips this when the schema marker matches)
     with app.app_context():
-        db.create_all()
-    
-    # Initialize scheduler
-    init_scheduler(app)
+        if fast_boot:
+            ensure_schema()
+        else:
+            db.create_all()
+    timer.mark('schema')
+    
+    # Initialize scheduler (fast boot waits for the first request)
+    if fast_boot:
+        defer_until_first_request(app, init_scheduler)
+    else:
+        init_scheduler(app)
+    timer.mark('scheduler')
     
     # Shutdown scheduler on exit
     atexit.register(shutdown_scheduler)
+    atexit.register(shutdown_password_hashing)
+    atexit.register(shutdown_cache_bus)
+    atexit.register(shutdown_report_jobs)
     
     # Routes
     @app.route('/login', methods=['GET', 'POST'])
@@ -98,6 +148,11 @@ def create_app(config_name='development'):
         """Loans management page"""
         return render_template('loans.html')
     
+    timer.mark('routes')
+    app.extensions['boot_report'] = timer.report(IMPORT_SECONDS)
+    if app.config.get('BOOT_REPORT'):
+        print(timer.format(IMPORT_SECONDS))
+    
     return app
 
 if __name__ == '__main__':
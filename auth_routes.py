@@ -62,6 +62,10 @@ def login_api():
     if user.status != 'active':
         return jsonify({'error': 'User account is not active'}), 403
     
+    # Upgrade the hash while we have the plaintext password
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+    
     # Update last login
     user.last_login = datetime.utcnow()
     db.session.commit()
@@ -0,0 +1,202 @@
+"""Typeahead autocomplete for students and equipment.
+
+``GET /api/autocomplete?q=jo&type=students&limit=8`` answers from an
+in-memory prefix index kept per worker. Each index is a sorted array of
+``(term, id)`` pairs searched with ``bisect``. Students are indexed by first
+name, last name, full name and email. Equipment is indexed by each word of the
+name, the full name, the model and the serial number. A query with several
+words matches rows where every word prefixes one of their terms.
+
+Indexes are built on first use. Writes reach them through the cache
+invalidation bus (see cache_bus.py): an eviction of ``students:<id>`` marks
+that row stale, and the next query reloads only the stale rows. A table-wide
+eviction with no row keys (bulk writes, purges) rebuilds the index on the
+next query. Tables with more than AUTOCOMPLETE_MAX_ROWS live rows are not
+indexed, and neither are they with CACHE_ENABLED off (writes would never reach
+the index). Those queries use an indexed ``LIKE 'prefix%'`` lookup instead.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import login_required
+from models import db, Student, Equipment
+from cache_bus import cache
+import metrics
+
+autocomplete_bp = Blueprint('autocomplete', __name__, url_prefix='/api/autocomplete')
+
+# Longest term stored per field; longer values are matched on their first characters
+MAX_TERM_LENGTH = 64
+
+
+def normalize(value):
+    return ' '.join(str(value).lower().split())[:MAX_TERM_LENGTH] if value else ''
+
+
+class PrefixIndex:
+    """Sorted (term, id) array with incremental updates; build with a loader of live rows"""
+    
+    def __init__(self, name, model, columns, terms):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.terms = terms
+        self.lock = threading.Lock()
+        self.entries = []   # sorted (term, id)
+        self.items = {}     # id -> (item, terms)
+        self.built = False
+        self.stale = set()
+        self.oversized = False
+    
+    def select(self, *criteria):
+        return db.session.query(*(getattr(self.model, column) for column in self.columns))\
+            .filter(self.model.deleted_at.is_(None), *criteria)
+    
+    def item(self, row):
+        return dict(zip(self.columns, row))
+    
+    def invalidate(self, ids=None):
+        """Mark rows (or with no ids, the whole index) for reload on the next query"""
+        with self.lock:
+            if ids is None:
+                self.built = False
+                self.stale.clear()
+            elif self.built and not self.oversized:
+                self.stale.update(ids)
+    
+    def refresh(self, max_rows):
+        """Build or apply stale rows; False when the table is too large to index"""
+        with self.lock:
+            if self.built and not self.stale:
+                return not self.oversized
+            if not self.built:
+                self._build(max_rows)
+            elif not self.oversized:
+                ids, self.stale = self.stale, set()
+                rows = self.select(self.model.id.in_(ids)).all()
+                for ident in ids:
+                    self._remove(ident)
+                for row in rows:
+                    self._add(self.item(row))
+            return not self.oversized
+    
+    def _build(self, max_rows):
+        started = time.perf_counter()
+        self.entries, self.items, self.stale = [], {}, set()
+        self.built = True
+        self.oversized = self.select().count() > max_rows
+        if self.oversized:
+            print(f"Autocomplete: {self.name} has more than {max_rows} rows, using database lookups")
+            return
+        for row in self.select().all():
+            item = self.item(row)
+            terms = sorted({term for term in self.terms(item) if term})
+            self.items[item['id']] = (item, terms)
+            self.entries.extend((term, item['id']) for term in terms)
+        self.entries.sort()
+        metrics.observe('autocomplete_index_build_seconds', time.perf_counter() - started, {'index': self.name})
+        print(f"Autocomplete: indexed {len(self.items)} {self.name} ({len(self.entries)} terms)")
+    
+    def _add(self, item):
+        terms = sorted({term for term in self.terms(item) if term})
+        self.items[item['id']] = (item, terms)
+        for term in terms:
+            insort(self.entries, (term, item['id']))
+    
+    def _remove(self, ident):
+        item = self.items.pop(ident, None)
+        if item is None:
+            return
+        for term in item[1]:
+            position = bisect_left(self.entries, (term, ident))
+            if position < len(self.entries) and self.entries[position] == (term, ident):
+                del self.entries[position]
+    
+    def search(self, words, limit):
+        """Up to limit items whose terms are prefixed by every word, in term order"""
+        first, rest = words[0], words[1:]
+        results, seen = [], set()
+        with self.lock:
+            position = bisect_left(self.entries, (first,))
+            while position < len(self.entries) and len(results) < limit:
+                term, ident = self.entries[position]
+                if not term.startswith(first):
+                    break
+                position += 1
+                if ident in seen:
+                    continue
+                seen.add(ident)
+                item, terms = self.items[ident]
+                if all(any(t.startswith(word) for t in terms) for word in rest):
+                    results.append(item)
+        return results
+    
+    def search_database(self, words, limit):
+        """Prefix lookup against the table for indexes that are not kept in memory"""
+        columns = [getattr(self.model, column) for column in self.columns if column != 'id']
+        q = self.select()
+        for word in words:
+            pattern = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            q = q.filter(db.or_(*(column.ilike(pattern, escape='\\') for column in columns)))
+        return [self.item(row) for row in q.order_by(columns[0]).limit(limit).all()]
+
+
+def student_terms(item):
+    return (normalize(item['first_name']), normalize(item['last_name']),
+            normalize(f"{item['first_name']} {item['last_name']}"), normalize(item['email']))
+
+
+def equipment_terms(item):
+    return (*normalize(item['name']).split(), normalize(item['name']), normalize(item['model']),
+            normalize(item['serial_number']))
+
+
+INDEXES = {
+    'students': PrefixIndex('students', Student, ('id', 'first_name', 'last_name', 'email', 'program'),
+                            student_terms),
+    'equipment': PrefixIndex('equipment', Equipment,
+                             ('id', 'name', 'model', 'serial_number', 'category', 'availability_status'),
+                             equipment_terms),
+}
+
+
+def on_evict(keys, tags):
+    """Cache eviction listener: stale row keys, or the whole table for tag-only evictions"""
+    for name, index in INDEXES.items():
+        ids = [key.split(':', 1)[1] for key in keys if key.startswith(f'{name}:')]
+        if ids:
+            index.invalidate(ids)
+        elif name in tags:
+            index.invalidate()
+
+
+def lookup(name, q, limit):
+    """Matches for q in one index (or the database when the index is not kept)"""
+    index = INDEXES[name]
+    words = normalize(q).split()
+    if not words:
+        return []
+    config = current_app.config
+    if config.get('CACHE_ENABLED', True) and index.refresh(config.get('AUTOCOMPLETE_MAX_ROWS', 50000)):
+        return index.search(words, limit)
+    return index.search_database(words, limit)
+
+
+@autocomplete_bp.route('', methods=['GET'])
+@login_required
+def autocomplete():
+    """Top matches by prefix (?q=, ?type=students|equipment, ?limit=)"""
+    q = request.args.get('q', '')
+    types = [t for t in request.args.get('type', 'students,equipment').split(',') if t]
+    unknown = [t for t in types if t not in INDEXES]
+    if unknown:
+        return jsonify({'error': f"Unknown type: {', '.join(unknown)}"}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), current_app.config.get('AUTOCOMPLETE_MAX_LIMIT', 25)))
+    return jsonify({name: lookup(name, q, limit) for name in types}), 200
+
+
+def init_autocomplete(app):
+    """Register /api/autocomplete and keep the indexes in step with cache evictions"""
+    app.register_blueprint(autocomplete_bp)
+    cache.add_listener(on_evict)
@@ -0,0 +1,95 @@
+"""create_app() cold-start benchmark.
+
+Reports a per-package import-time breakdown (via ``python -X importtime``)
+and the median boot time of the factory with and without FAST_BOOT against an
+already-initialized SQLite file. ``--max-fast-ms`` turns it into a regression
+check that exits non-zero when fast boot gets slower than the budget.
+
+    python benchmarks/bench_boot.py --runs 20 --max-fast-ms 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_breakdown(top):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT, capture_output=True, text=True,
+        env=dict(os.environ, SCHEDULER_ENABLED='False')
+    )
+    totals = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        # Only count modules imported directly by app.py (depth 1 in the tree)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth != 1:
+            continue
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(cumulative)
+    
+    print("Import time of modules imported by app.py (cumulative):")
+    for package, us in sorted(totals.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<24}{us / 1000:>10.2f} ms")
+    print(f"  {'total':<24}{sum(totals.values()) / 1000:>10.2f} ms")
+
+
+def boot_times(create_app, config_class, fast_boot, runs):
+    config_class.FAST_BOOT = fast_boot
+    timings = []
+    last_report = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        app = create_app('development')
+        timings.append((time.perf_counter() - started) * 1000)
+        last_report = app.extensions['boot_report']
+    return timings, last_report
+
+
+def run(runs, top, max_fast_ms):
+    import_breakdown(top)
+    
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'boot.db')
+    sys.path.insert(0, ROOT)
+    from app import create_app, IMPORT_SECONDS
+    from config import DevelopmentConfig
+    from scheduler import shutdown_scheduler
+    
+    # First boot creates the schema and writes the marker
+    create_app('development')
+    
+    print(f"\nApp module import: {IMPORT_SECONDS * 1000:.2f} ms")
+    results = {}
+    for label, fast_boot in (('standard', False), ('fast boot', True)):
+        timings, report = boot_times(create_app, DevelopmentConfig, fast_boot, runs)
+        results[label] = statistics.median(timings)
+        print(f"\n{label}: median {results[label]:.2f} ms, min {min(timings):.2f} ms over {runs} runs")
+        for phase, ms in report['phases_ms'].items():
+            print(f"  {phase:<12}{ms:>10.2f} ms")
+    
+    shutdown_scheduler()
+    print(f"\nSpeedup: {results['standard'] / results['fast boot']:.1f}x")
+    
+    if max_fast_ms is not None and results['fast boot'] > max_fast_ms:
+        print(f"REGRESSION: fast boot median {results['fast boot']:.2f} ms exceeds {max_fast_ms} ms")
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=12, help='Packages to show in the import breakdown')
+    parser.add_argument('--max-fast-ms', type=float, help='Fail if fast boot median exceeds this')
+    args = parser.parse_args()
+    sys.exit(0 if run(args.runs, args.top, args.max_fast_ms) else 1)
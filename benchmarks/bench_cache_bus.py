@@ -0,0 +1,152 @@
+"""Cross-process delivery lag of the cache invalidation bus.
+
+Starts several listener processes per transport. Each builds the app, warms a
+tagged cache entry and records how long after publication every eviction
+arrives. The parent process publishes --messages evictions and reports the
+p50/p95/max lag per transport. The table transport runs on a temporary
+SQLite file. The redis transport runs against the bundled RESP stand-in
+(started in-process). The postgres transport runs only when
+--postgres-url is given.
+
+    python benchmarks/bench_cache_bus.py --listeners 3 --messages 50
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def build_app(database_url, transport, redis_url, poll_interval):
+    from app import create_app
+    return create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'DEBUG': False,
+        # The bus is built by hand below so receive() can be instrumented
+        'CACHE_BUS_TRANSPORT': 'none',
+        'CACHE_BUS_REDIS_URL': redis_url,
+        'CACHE_BUS_POLL_INTERVAL': poll_interval,
+        'EVENTS_ENABLED': False,
+        'METRICS_ENABLED': False
+    }), {'CACHE_BUS_TRANSPORT': transport, 'CACHE_BUS_REDIS_URL': redis_url,
+         'CACHE_BUS_POLL_INTERVAL': poll_interval}
+
+
+def run_listener(database_url, transport, redis_url, poll_interval, messages, timeout):
+    import cache_bus
+    from models import db
+    
+    app, bus_config = build_app(database_url, transport, redis_url, poll_interval)
+    with app.app_context():
+        engine = db.engine
+    
+    lags = []
+    done = threading.Event()
+    
+    class TimedBus(cache_bus.InvalidationBus):
+        def receive(self, message):
+            super().receive(message)
+            lags.append(time.time() - json.loads(message)['sent_at'])
+            cache_bus.cache.set('bench:entry', 1, tags=('bench',))
+            if len(lags) >= messages:
+                done.set()
+    
+    bus = TimedBus(cache_bus.make_transport(bus_config, engine))
+    bus.start()
+    cache_bus.cache.set('bench:entry', 1, tags=('bench',))
+    print('ready', flush=True)
+    done.wait(timeout)
+    bus.close()
+    print(json.dumps(lags), flush=True)
+
+
+def run_transport(transport, database_url, redis_url, args):
+    import cache_bus
+    from models import db
+    
+    children = [subprocess.Popen(
+        [sys.executable, __file__, '--child', transport, '--database-url', database_url, '--redis-url', redis_url,
+         '--messages', str(args.messages), '--poll-interval', str(args.poll_interval)],
+        stdout=subprocess.PIPE, text=True) for _ in range(args.listeners)]
+    for child in children:
+        while child.stdout.readline().strip() != 'ready':
+            pass
+    
+    app, bus_config = build_app(database_url, transport, redis_url, args.poll_interval)
+    with app.app_context():
+        engine = db.engine
+    publisher = cache_bus.InvalidationBus(cache_bus.make_transport(bus_config, engine))
+    # Let listeners finish subscribing / reading their starting version
+    time.sleep(max(1.0, args.poll_interval * 3))
+    for i in range(args.messages):
+        publisher.publish([], ['bench'])
+        time.sleep(args.interval)
+    
+    lags = []
+    for child in children:
+        out, _ = child.communicate(timeout=60)
+        lags.extend(json.loads(next(line for line in out.splitlines() if line.startswith('['))))
+    return lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--listeners', type=int, default=3)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.05, help='Seconds between published evictions')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='Table transport poll interval')
+    parser.add_argument('--postgres-url', help='Also measure the postgres transport against this database')
+    parser.add_argument('--child', choices=['table', 'redis', 'postgres'], help=argparse.SUPPRESS)
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    parser.add_argument('--redis-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_listener(args.database_url, args.child, args.redis_url, args.poll_interval, args.messages, timeout=60)
+        return
+    
+    import cache_bus
+    from models import db
+    
+    workdir = tempfile.mkdtemp()
+    sqlite_url = f"sqlite:///{os.path.join(workdir, 'bus.db')}"
+    app, _ = build_app(sqlite_url, 'none', '', args.poll_interval)
+    with app.app_context():
+        db.create_all()
+    
+    server = cache_bus.RespPubSubServer(('127.0.0.1', 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    redis_url = f'redis://127.0.0.1:{server.server_address[1]}/0'
+    
+    runs = [('table', sqlite_url), ('redis', sqlite_url)]
+    if args.postgres_url:
+        runs.append(('postgres', args.postgres_url))
+    
+    results = {}
+    try:
+        for transport, database_url in runs:
+            results[transport] = run_transport(transport, database_url, redis_url, args)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    expected = args.listeners * args.messages
+    print(f"\nInvalidation delivery lag ({args.listeners} listener processes, {args.messages} evictions)")
+    for transport, lags in results.items():
+        lags_ms = sorted(lag * 1000 for lag in lags)
+        p95 = lags_ms[int(len(lags_ms) * 0.95) - 1] if lags_ms else float('nan')
+        print(f"  {transport:<10}delivered {len(lags_ms):>4}/{expected}  "
+              f"p50 {statistics.median(lags_ms) if lags_ms else float('nan'):8.2f} ms  "
+              f"p95 {p95:8.2f} ms  max {max(lags_ms, default=float('nan')):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
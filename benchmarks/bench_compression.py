@@ -0,0 +1,118 @@
+"""Compression level benchmark for large JSON responses.
+
+Seeds an in-memory database and serializes the payloads of the list and
+report endpoints (loans, students, equipment, damage summary, overdue loans).
+Each payload is compressed with every available codec (gzip, plus brotli and
+zstd when installed) at each level. The output reports the compressed size,
+the ratio and the CPU time. For each codec it picks the level that minimizes
+CPU time plus transfer time at --bandwidth-mbps. This is how the
+COMPRESSION_GZIP_LEVEL default was chosen.
+
+    python benchmarks/bench_compression.py --rows 5000 --bandwidth-mbps 50
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Student, Equipment, Loan, DamageLog  # noqa: E402
+from serializers import fetch_students, fetch_equipment, fetch_loans  # noqa: E402
+import compression  # noqa: E402
+import reports  # noqa: E402
+
+LEVELS = {
+    'gzip': (compression.GzipCodec, range(1, 10)),
+    'br': (compression.BrotliCodec, range(0, 12)),
+    'zstd': (compression.ZstdCodec, (1, 2, 3, 4, 6, 9, 12, 15, 19)),
+}
+
+
+def seed(rows):
+    programs = ['Computer Science', 'Civil Engineering', 'Nursing', 'Accountancy', 'Psychology']
+    students = [{
+        'id': str(uuid4()), 'first_name': f'First{i}', 'last_name': f'Last{i}',
+        'program': programs[i % len(programs)], 'year_level': 1 + i % 4,
+        'email': f'student{i}@students.example.edu', 'status': 'active'
+    } for i in range(rows)]
+    equipment = [{
+        'id': str(uuid4()), 'name': f'Laptop #{i:05d}', 'model': 'ThinkPad T14',
+        'category': 'Laptop', 'serial_number': f'LAP{i:07d}', 'condition': 'Good',
+        'availability_status': 'On Loan'
+    } for i in range(rows)]
+    today = date.today()
+    loans = [{
+        'id': str(uuid4()), 'student_id': students[i]['id'], 'equipment_id': equipment[i]['id'],
+        'date_borrowed': today - timedelta(days=10 + i % 30), 'date_due': today - timedelta(days=i % 5),
+        'status': 'Borrowed', 'fine_rate': 5.0, 'accrued_fine': 5.0 * (i % 5)
+    } for i in range(rows)]
+    damage_logs = [{
+        'id': str(uuid4()), 'equipment_id': equipment[i]['id'], 'student_id': students[i]['id'],
+        'damage_type': 'Damage' if i % 3 else 'Lost', 'description': 'Cracked screen hinge',
+        'reported_by': 'staff0', 'status': 'Open', 'repair_cost': 1500.0, 'replacement_cost': 0.0
+    } for i in range(0, rows, 10)]
+    db.session.execute(db.insert(Student), students)
+    db.session.execute(db.insert(Equipment), equipment)
+    db.session.execute(db.insert(Loan), loans)
+    db.session.execute(db.insert(DamageLog), damage_logs)
+    db.session.commit()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run(rows, repeat, bandwidth_mbps):
+    app = create_app('testing', {'SCHEDULER_ENABLED': False, 'METRICS_ENABLED': False})
+    with app.app_context():
+        seed(rows)
+        payloads = {
+            'loans': app.json.dumps(fetch_loans()).encode(),
+            'students': app.json.dumps(fetch_students()).encode(),
+            'equipment': app.json.dumps(fetch_equipment()).encode(),
+            'damage-summary': app.json.dumps(reports.damage_summary()).encode(),
+            'overdue-loans': app.json.dumps(reports.overdue_loans()).encode(),
+        }
+    raw_total = sum(len(body) for body in payloads.values())
+    print(f"Payloads ({rows} rows): " + ', '.join(f"{name} {len(body) / 1024:.0f} KiB" for name, body in payloads.items()))
+    bytes_per_second = bandwidth_mbps * 1_000_000 / 8
+    print(f"Uncompressed transfer at {bandwidth_mbps:g} Mbps: {raw_total / bytes_per_second * 1000:.1f} ms\n")
+    
+    available = [name for name, module in (('gzip', True), ('br', compression.brotli), ('zstd', compression.zstandard))
+                 if module]
+    for name in available:
+        codec_class, levels = LEVELS[name]
+        print(f"{name:<6}{'level':>6}{'size':>12}{'ratio':>8}{'cpu':>10}{'MB/s':>9}{'cpu+wire':>11}")
+        results = []
+        for level in levels:
+            codec = codec_class(level)
+            cpu = 0.0
+            size = 0
+            for body in payloads.values():
+                elapsed, compressed = best_of(repeat, lambda: codec.compress(body))
+                cpu += elapsed
+                size += len(compressed)
+            total = cpu + size / bytes_per_second
+            results.append((total, level))
+            print(f"{'':<6}{level:>6}{size / 1024:>10.0f}KiB{raw_total / size:>7.1f}x{cpu * 1000:>8.1f}ms"
+                  f"{raw_total / cpu / 1_000_000:>9.0f}{total * 1000:>9.1f}ms")
+        print(f"{'':<6}best level at {bandwidth_mbps:g} Mbps: {min(results)[1]}\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--bandwidth-mbps', type=float, default=50,
+                        help='Client bandwidth used to weigh CPU time against bytes on the wire')
+    args = parser.parse_args()
+    run(args.rows, args.repeat, args.bandwidth_mbps)
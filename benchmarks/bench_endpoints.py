@@ -0,0 +1,235 @@
+"""Endpoint benchmark suite.
+
+Generates a dataset at each scale factor, then drives the hot routes through
+the Flask test client and records p50/p95 latency, SQL statement count and
+peak Python memory per route. Results are written as JSON so runs can be
+compared release to release:
+
+    python benchmarks/bench_endpoints.py --scales 0.01,0.05 --iterations 20
+    python benchmarks/bench_endpoints.py --compare benchmarks/results/bench-20260101-120000.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db, Student, Equipment, Loan  # noqa: E402
+from generate_dataset import generate_dataset  # noqa: E402
+
+ADMIN = {'username': 'admin0', 'password': 'password123'}
+
+
+class StatementCounter:
+    """Counts SQL statements issued through an engine"""
+    
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+    
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+class BenchContext:
+    """IDs and state shared between route definitions"""
+    
+    def __init__(self, needed):
+        due = date.today() + timedelta(days=7)
+        self.date_due = due.isoformat()
+        self.available = [row[0] for row in db.session.execute(
+            db.select(Equipment.id).where(Equipment.availability_status == 'Available').limit(needed))]
+        self.students = [row[0] for row in db.session.execute(
+            db.select(Student.id).where(Student.status == 'active').limit(needed))]
+        self.active_loans = [row[0] for row in db.session.execute(
+            db.select(Loan.id).where(Loan.status == 'Borrowed').limit(needed))]
+        self.busiest_student = db.session.execute(
+            db.select(Loan.student_id).group_by(Loan.student_id)
+            .order_by(db.func.count(Loan.id).desc()).limit(1)).scalar()
+        self.checked_out = []
+    
+    def checkout(self):
+        return {'json': {
+            'student_id': self.students[len(self.checked_out) % len(self.students)],
+            'equipment_id': self.available.pop(),
+            'date_due': self.date_due
+        }}
+    
+    def returning(self):
+        loan_id = self.checked_out.pop() if self.checked_out else self.active_loans.pop()
+        return f'/api/loans/{loan_id}/return'
+
+
+def routes(ctx):
+    """(name, method, path, request kwargs) - path/kwargs may be callables"""
+    return [
+        ('login', 'POST', '/api/auth/login', lambda: {'json': ADMIN}),
+        ('checkout', 'POST', '/api/loans/checkout', ctx.checkout),
+        ('return', 'POST', ctx.returning, None),
+        ('loans', 'GET', '/api/loans', None),
+        ('loans_active', 'GET', '/api/loans/active', None),
+        ('loans_overdue', 'GET', '/api/loans/overdue', None),
+        ('dashboard', 'GET', ['/api/equipment', '/api/loans', '/api/loans/overdue'], None),
+        ('search_equipment', 'GET', '/api/search/equipment?q=Dell&page=1&per_page=20', None),
+        ('search_students', 'GET', '/api/search/students?q=santos&page=1&per_page=20', None),
+        ('search_loans', 'GET', '/api/search/loans?status=Borrowed&page=1&per_page=20', None),
+        ('search_loans_overdue', 'GET', '/api/search/loans?overdue_only=true&page=1&per_page=20', None),
+        ('report_equipment_usage', 'GET', '/api/reports/equipment-usage', None),
+        ('report_most_borrowed', 'GET', '/api/reports/most-borrowed', None),
+        ('report_user_activity', 'GET', lambda: f'/api/reports/user-activity/{ctx.busiest_student}', None),
+        ('report_damage_summary', 'GET', '/api/reports/damage-summary', None),
+        ('report_overdue_loans', 'GET', '/api/reports/overdue-loans', None),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def call(client, method, path, kwargs, ctx):
+    paths = path if isinstance(path, list) else [path() if callable(path) else path]
+    statuses = []
+    for p in paths:
+        resp = client.open(p, method=method, **(kwargs() if callable(kwargs) else (kwargs or {})))
+        statuses.append(resp.status_code)
+        if p == '/api/loans/checkout' and resp.status_code == 201:
+            ctx.checked_out.append(resp.get_json()['loan']['id'])
+    return max(statuses)
+
+
+def bench_route(client, counter, ctx, route, iterations):
+    name, method, path, kwargs = route
+    latencies, queries, statuses = [], [], set()
+    
+    for _ in range(iterations):
+        counter.count = 0
+        started = time.perf_counter()
+        statuses.add(call(client, method, path, kwargs, ctx))
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+    
+    # Separate pass for memory so tracemalloc overhead doesn't skew latency
+    tracemalloc.start()
+    call(client, method, path, kwargs, ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'status': sorted(statuses),
+        'iterations': iterations
+    }
+
+
+def run_scale(scale, iterations, seed, database_url):
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'bench-{scale}.db')
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'DEBUG': False,
+        'PROPAGATE_EXCEPTIONS': False
+    })
+    counts = generate_dataset(scale=scale, seed=seed, drop=True, app=app)
+    
+    results = {}
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+        # Checkout and return each need a fresh row per call (+1 for the memory pass)
+        ctx = BenchContext(needed=iterations * 2 + 2)
+        client = app.test_client()
+        client.post('/api/auth/login', json=ADMIN)
+        
+        for route in routes(ctx):
+            results[route[0]] = stats = bench_route(client, counter, ctx, route, iterations)
+            print(f"  {route[0]:<26}p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+                  f"{stats['queries']:>5} queries  {stats['peak_memory_kb']:>10.1f} KB  {stats['status']}")
+    return {'rows': counts, 'routes': results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline_path, threshold):
+    """Print p95 deltas against a previous run; returns False on regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    
+    ok = True
+    print(f"\nComparison against {baseline_path} (revision {baseline['meta'].get('revision')}):")
+    for scale, data in current['scales'].items():
+        old_routes = baseline['scales'].get(scale, {}).get('routes', {})
+        for route, stats in data['routes'].items():
+            old = old_routes.get(route)
+            if not old:
+                continue
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                ok = False
+            if stats['queries'] > old['queries']:
+                flag += f"  queries {old['queries']} -> {stats['queries']}"
+            print(f"  [{scale}] {route:<26}p95 {old['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms ({change:+.1f}%){flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='0.01,0.05', help='Comma-separated dataset scale factors')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Benchmark against this database (it will be dropped!)')
+    parser.add_argument('--output', help='Result file (default benchmarks/results/bench-<timestamp>.json)')
+    parser.add_argument('--compare', help='Previous result file to compare p95 latency against')
+    parser.add_argument('--threshold', type=float, default=20.0, help='p95 regression threshold in percent')
+    args = parser.parse_args()
+    
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'seed': args.seed
+        },
+        'scales': {}
+    }
+    for scale in args.scales.split(','):
+        print(f"\n=== scale {scale} ===")
+        results['scales'][scale] = run_scale(float(scale), args.iterations, args.seed, args.database_url)
+    
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"bench-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Login throughput benchmark.
+
+Fires concurrent POST /api/auth/login requests through the Flask test client
+and reports logins per second, overall and per CPU core.
+
+    python benchmarks/bench_login.py --threads 16 --seconds 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+
+
+def run(threads, seconds, method):
+    app = create_app('testing')
+    if method:
+        app.config['PASSWORD_HASH_METHOD'] = method
+
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', role='borrower')
+        user.set_password('benchpass')
+        db.session.add(user)
+        db.session.commit()
+
+    counts = [0] * threads
+    rejected = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(i):
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            resp = client.post('/api/auth/login', json={'username': 'bench', 'password': 'benchpass'})
+            if resp.status_code == 200:
+                counts[i] += 1
+            elif resp.status_code == 503:
+                rejected[i] += 1
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    total = sum(counts)
+    print(f"Hash method:        {app.config['PASSWORD_HASH_METHOD']}")
+    print(f"Hash workers:       {app.config['PASSWORD_HASH_WORKERS']}")
+    print(f"Client threads:     {threads}")
+    print(f"Successful logins:  {total} in {elapsed:.2f}s")
+    print(f"Rejected (503):     {sum(rejected)}")
+    print(f"Logins/sec:         {total / elapsed:.1f}")
+    print(f"Logins/sec/core:    {total / elapsed / cores:.1f} ({cores} cores)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--method', help='Override PASSWORD_HASH_METHOD')
+    args = parser.parse_args()
+    run(args.threads, args.seconds, args.method)
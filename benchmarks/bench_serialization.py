@@ -0,0 +1,84 @@
+"""List endpoint serialization benchmark.
+
+Compares the ORM path (query entities, ``to_dict()`` per row, stdlib JSON)
+against the column-projection path (``serializers.py`` rows + the app's JSON
+provider) on equipment and loan lists.
+
+    python benchmarks/bench_serialization.py --rows 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Student, Equipment, Loan  # noqa: E402
+from serializers import fetch_equipment, fetch_loans  # noqa: E402
+
+
+def seed(rows):
+    students = [{
+        'id': str(uuid4()), 'first_name': f'First{i}', 'last_name': f'Last{i}',
+        'program': 'Computer Science', 'year_level': 1 + i % 4,
+        'email': f'student{i}@example.com', 'status': 'active'
+    } for i in range(rows)]
+    equipment = [{
+        'id': str(uuid4()), 'name': f'Laptop {i}', 'model': 'ThinkPad T14',
+        'category': 'Laptop', 'serial_number': f'SN{i:08d}', 'condition': 'Good',
+        'availability_status': 'On Loan'
+    } for i in range(rows)]
+    today = date.today()
+    loans = [{
+        'id': str(uuid4()), 'student_id': students[i]['id'], 'equipment_id': equipment[i]['id'],
+        'date_borrowed': today - timedelta(days=i % 30), 'date_due': today + timedelta(days=7),
+        'status': 'Borrowed'
+    } for i in range(rows)]
+    db.session.execute(db.insert(Student), students)
+    db.session.execute(db.insert(Equipment), equipment)
+    db.session.execute(db.insert(Loan), loans)
+    db.session.commit()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        db.session.expunge_all()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(rows, repeat):
+    app = create_app('testing')
+    with app.app_context():
+        seed(rows)
+        cases = {
+            'equipment': (
+                lambda: json.dumps([e.to_dict() for e in Equipment.query.all()]),
+                lambda: app.json.dumps(fetch_equipment()),
+            ),
+            'loans': (
+                lambda: json.dumps([l.to_dict() for l in Loan.query.all()]),
+                lambda: app.json.dumps(fetch_loans()),
+            ),
+        }
+        print(f"{'list':<12}{'orm + to_dict':>16}{'projection':>14}{'speedup':>10}")
+        for name, (orm_path, fast_path) in cases.items():
+            orm_time = best_of(repeat, orm_path)
+            fast_time = best_of(repeat, fast_path)
+            print(f"{name:<12}{orm_time * 1000:>14.1f}ms{fast_time * 1000:>12.1f}ms{orm_time / fast_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
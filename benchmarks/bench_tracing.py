@@ -0,0 +1,121 @@
+"""Tracing overhead benchmark for the checkout path.
+
+Times POST /api/loans/checkout with tracing disabled, at the configured
+sample rate and at 100% sampling. Each mode runs in its own process against
+a fresh copy of the same generated database, and modes are interleaved over
+several rounds so drift affects them equally. Exits non-zero when overhead at
+the configured rate exceeds --max-overhead percent.
+
+    python benchmarks/bench_tracing.py --iterations 300 --rounds 5 --sample-rate 0.1
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN = {'username': 'admin0', 'password': 'password123'}
+
+
+def run_child(mode, database_path, iterations, sample_rate, trace_file):
+    from app import create_app
+    from models import db, Student, Equipment
+    
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database_path}',
+        'DEBUG': False,
+        'PROPAGATE_EXCEPTIONS': False,
+        'TRACING_ENABLED': mode != 'off',
+        'TRACE_SAMPLE_RATE': 1.0 if mode == 'full' else sample_rate,
+        'TRACE_FILE': trace_file
+    })
+    with app.app_context():
+        equipment_id = db.session.execute(
+            db.select(Equipment.id).where(Equipment.availability_status == 'Available').limit(1)).scalar()
+        student_id = db.session.execute(
+            db.select(Student.id).where(Student.status == 'active').limit(1)).scalar()
+    
+    client = app.test_client()
+    client.post('/api/auth/login', json=ADMIN)
+    payload = {'student_id': student_id, 'equipment_id': equipment_id,
+               'date_due': (date.today() + timedelta(days=7)).isoformat()}
+    
+    latencies = []
+    for i in range(iterations + 20):
+        started = time.perf_counter()
+        resp = client.post('/api/loans/checkout', json=payload)
+        elapsed = (time.perf_counter() - started) * 1000
+        if resp.status_code != 201:
+            raise SystemExit(f'checkout failed: {resp.status_code} {resp.get_data(as_text=True)}')
+        client.post(f"/api/loans/{resp.get_json()['loan']['id']}/return")
+        if i >= 20:  # warm-up
+            latencies.append(elapsed)
+    print(json.dumps(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--sample-rate', type=float, default=0.1)
+    parser.add_argument('--scale', type=float, default=0.01)
+    parser.add_argument('--max-overhead', type=float, default=2.0, help='Allowed overhead in percent')
+    parser.add_argument('--child', choices=['off', 'sampled', 'full'], help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    parser.add_argument('--trace-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child, args.database, args.iterations, args.sample_rate, args.trace_file)
+        return
+    
+    from generate_dataset import generate_dataset
+    workdir = tempfile.mkdtemp()
+    base = os.path.join(workdir, 'base.db')
+    generate_dataset(scale=args.scale, seed=42, config_name='testing',
+                     database_url=f'sqlite:///{base}', drop=True)
+    
+    modes = ['off', 'sampled', 'full']
+    latencies = {mode: [] for mode in modes}
+    try:
+        for round_number in range(args.rounds):
+            for mode in modes:
+                database = os.path.join(workdir, f'{mode}-{round_number}.db')
+                shutil.copy(base, database)
+                out = subprocess.run(
+                    [sys.executable, __file__, '--child', mode, '--database', database,
+                     '--iterations', str(args.iterations), '--sample-rate', str(args.sample_rate),
+                     '--trace-file', os.path.join(workdir, 'traces.jsonl')],
+                    capture_output=True, text=True, check=True).stdout
+                # Other output (boot/shutdown messages) can surround the result line
+                latencies[mode].extend(json.loads(next(l for l in out.splitlines() if l.startswith('['))))
+                os.remove(database)
+            print(f"  round {round_number + 1}/{args.rounds} done")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    baseline = statistics.median(latencies['off'])
+    print(f"\nCheckout latency ({args.iterations * args.rounds} requests per mode)")
+    overheads = {}
+    for mode in modes:
+        median = statistics.median(latencies[mode])
+        overheads[mode] = (median - baseline) / baseline * 100
+        label = {'off': 'tracing off', 'sampled': f'sample rate {args.sample_rate}', 'full': 'sample rate 1.0'}[mode]
+        print(f"  {label:<20}median {median:7.3f} ms  overhead {overheads[mode]:+6.2f}%")
+    
+    if overheads['sampled'] > args.max_overhead:
+        print(f"\nFAIL: overhead {overheads['sampled']:.2f}% exceeds {args.max_overhead}%")
+        sys.exit(1)
+    print(f"\nOK: overhead within {args.max_overhead}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Multi-process scheduler leader election check.
+
+Starts several worker processes against a shared SQLite file (or the database
+in --database-url), checks that exactly one of them runs the scheduler, kills
+the leader without letting it release the lease and measures how long it takes
+for another worker to take over.
+
+    python benchmarks/scheduler_failover.py --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker(database_url, ttl, interval, status):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['SCHEDULER_LEASE_TTL'] = str(ttl)
+    os.environ['SCHEDULER_HEARTBEAT_INTERVAL'] = str(interval)
+    sys.path.insert(0, ROOT)
+    
+    import scheduler
+    from app import create_app
+    
+    create_app('development')
+    while True:
+        status[os.getpid()] = scheduler.is_scheduler_leader()
+        time.sleep(0.2)
+
+
+def leaders(status, pids):
+    return [pid for pid in pids if status.get(pid)]
+
+
+def wait_for_single_leader(status, pids, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        current = leaders(status, pids)
+        if len(current) == 1:
+            return current[0]
+        time.sleep(0.1)
+    return None
+
+
+def create_schema(database_url):
+    # Create tables once up front so workers don't race on create_all()
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['SCHEDULER_ENABLED'] = 'False'
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    create_app('development')
+    del os.environ['SCHEDULER_ENABLED']
+
+
+def run(workers, ttl, interval, database_url):
+    create_schema(database_url)
+    ctx = multiprocessing.get_context('spawn')
+    manager = ctx.Manager()
+    status = manager.dict()
+    
+    procs = [ctx.Process(target=worker, args=(database_url, ttl, interval, status), daemon=True)
+             for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    pids = [proc.pid for proc in procs]
+    
+    ok = True
+    leader = wait_for_single_leader(status, pids, timeout=30)
+    if leader is None:
+        print(f"FAIL: expected one leader, got {leaders(status, pids)}")
+        return False
+    print(f"Leader elected: pid {leader}")
+    
+    # Make sure nobody else grabs it during steady state
+    time.sleep(interval * 3)
+    current = leaders(status, pids)
+    if current != [leader]:
+        print(f"FAIL: leadership not stable, leaders now {current}")
+        ok = False
+    
+    # Kill the leader hard so the lease has to expire
+    leader_proc = next(p for p in procs if p.pid == leader)
+    leader_proc.kill()
+    leader_proc.join()
+    status[leader] = False
+    killed_at = time.monotonic()
+    
+    survivors = [pid for pid in pids if pid != leader]
+    new_leader = wait_for_single_leader(status, survivors, timeout=ttl + interval * 4 + 10)
+    if new_leader is None:
+        print(f"FAIL: no failover, leaders now {leaders(status, survivors)}")
+        ok = False
+    else:
+        print(f"Failover to pid {new_leader} after {time.monotonic() - killed_at:.1f}s "
+              f"(lease TTL {ttl}s, heartbeat {interval}s)")
+    
+    for proc in procs:
+        if proc.is_alive():
+            proc.terminate()
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ttl', type=int, default=3)
+    parser.add_argument('--interval', type=int, default=1)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+    
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'leader_election.db')
+    
+    sys.exit(0 if run(args.workers, args.ttl, args.interval, database_url) else 1)
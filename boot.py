@@ -0,0 +1,146 @@
+"""Fast cold-start helpers for the application factory.
+
+In fast boot mode ``create_app`` skips ``db.create_all()`` when the
+``schema_version`` marker matches the fingerprint of the current models, and
+defers scheduler and mail setup until they are first needed. ``BootTimer``
+records how long each factory phase took so boot regressions are visible.
+
+``create_all`` only creates missing tables. Columns and indexes added to
+existing tables (such as ``deleted_at``) are backfilled once per deploy with
+``python boot.py``, not on every boot.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, SchemaVersion
+
+SCHEMA_KEY = 'schema'
+
+
+class BootTimer:
+    """Records elapsed time per create_app phase"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []
+    
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+    
+    def report(self, import_seconds=None):
+        report = {
+            'phases_ms': {phase: round(seconds * 1000, 2) for phase, seconds in self.phases},
+            'boot_ms': round((self.last - self.started) * 1000, 2)
+        }
+        if import_seconds is not None:
+            report['import_ms'] = round(import_seconds * 1000, 2)
+        return report
+    
+    def format(self, import_seconds=None):
+        report = self.report(import_seconds)
+        lines = ['Boot time breakdown:']
+        if 'import_ms' in report:
+            lines.append(f"  {'imports':<12}{report['import_ms']:>10.2f} ms")
+        for phase, ms in report['phases_ms'].items():
+            lines.append(f"  {phase:<12}{ms:>10.2f} ms")
+        lines.append(f"  {'total boot':<12}{report['boot_ms']:>10.2f} ms")
+        return '\n'.join(lines)
+
+
+@lru_cache(maxsize=1)
+def schema_fingerprint():
+    """Hash of every table and column definition known to the models"""
+    parts = []
+    for table in sorted(db.metadata.tables.values(), key=lambda t: t.name):
+        for column in table.columns:
+            parts.append(f"{table.name}.{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ''):
+            parts.append(f"{table.name}#{index.name}:{','.join(c.name for c in index.columns)}")
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def add_missing_columns():
+    """ALTER TABLE ADD COLUMN for nullable model columns the existing tables lack"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                print(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            except SQLAlchemyError:
+                # Another process may have added it since we inspected the table
+                if column.name not in {c['name'] for c in inspect(db.engine).get_columns(table.name)}:
+                    raise
+                continue
+            print(f"Added column {table.name}.{column.name}")
+
+
+def migrate_schema():
+    """create_all plus the columns and indexes it skips on tables that already exist (one-off, see __main__)"""
+    db.create_all()
+    add_missing_columns()
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine, checkfirst=True)
+
+
+def ensure_schema():
+    """Create tables only if the stored schema marker doesn't match (needs app context)"""
+    fingerprint = schema_fingerprint()
+    try:
+        marker = db.session.get(SchemaVersion, SCHEMA_KEY)
+        if marker is not None and marker.version == fingerprint:
+            return False
+    except SQLAlchemyError:
+        # Marker table doesn't exist yet
+        db.session.rollback()
+        marker = None
+    
+    db.create_all()
+    if marker is None:
+        marker = db.session.get(SchemaVersion, SCHEMA_KEY) or SchemaVersion(key=SCHEMA_KEY)
+        db.session.add(marker)
+    marker.version = fingerprint
+    marker.updated_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def defer_until_first_request(app, setup):
+    """Run setup(app) once, just before the first request is handled"""
+    lock = threading.Lock()
+    state = {'done': False}
+    
+    @app.before_request
+    def run_deferred_setup():
+        if state['done']:
+            return
+        with lock:
+            if not state['done']:
+                setup(app)
+                state['done'] = True
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app(os.getenv('FLASK_ENV', 'development'), {'SCHEDULER_ENABLED': False})
+    with app.app_context():
+        migrate_schema()
+        print("Schema is up to date")
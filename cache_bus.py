@@ -0,0 +1,554 @@
+"""In-process cache with cross-worker invalidation.
+
+Each worker keeps its own ``LocalCache``. Entries are tagged with the tables
+they were built from. Flask-SQLAlchemy session hooks record which tables
+(tags) and rows (``<table>:<id>`` keys) a transaction wrote. After the commit
+they evict those entries locally and publish the same eviction on the
+invalidation bus, and every other worker evicts its copy when the message
+arrives. Write paths in ``routes.py`` and ``auth_routes.py`` therefore need no
+explicit calls. Code that changes data outside the ORM can call
+``invalidate(keys=..., tags=...)`` after committing.
+
+Transports (CACHE_BUS_TRANSPORT):
+
+- ``postgres``: ``pg_notify`` / ``LISTEN`` on CACHE_BUS_CHANNEL.
+- ``table``: rows in ``cache_invalidations``. Listeners poll for versions
+  above the last one they saw, every CACHE_BUS_POLL_INTERVAL seconds. Use it
+  with SQLite.
+- ``redis``: PUBLISH/SUBSCRIBE over the Redis protocol at CACHE_BUS_REDIS_URL.
+  This works against Redis, or against the bundled stand-in:
+  ``python cache_bus.py serve 6380``.
+- ``auto`` (the default) picks ``postgres`` on PostgreSQL and ``table``
+  everywhere else.
+
+Delivery lag is recorded in the ``cache_invalidation_lag_seconds`` metric.
+``benchmarks/bench_cache_bus.py`` measures it across processes for each
+transport.
+"""
+import json
+import os
+import select
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from uuid import uuid4
+from sqlalchemy import event, text
+from models import db, CacheInvalidation
+import metrics
+
+# Tables whose writes never affect cached data
+IGNORED_TABLES = {'audit_logs', 'email_logs', 'change_events', 'cache_invalidations', 'scheduler_leases', 'schema_version',
+                  'sync_changes', 'kiosk_operations', 'report_snapshots', 'idempotency_keys'}
+
+MISSING = object()
+
+# Evicted keys/tags remembered for snapshot checks; a load that outlives this many evictions is not stored
+RECENT_EVICTIONS = 10000
+
+
+class LocalCache:
+    """Thread-safe TTL cache whose entries can be evicted by key or by tag"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}                 # key -> (value, expires_at, tags)
+        self.tagged = defaultdict(set)    # tag -> keys
+        self.sequence = 0                 # incremented by every evict()
+        self.recent = OrderedDict()       # key or tag -> sequence of its last eviction, oldest first
+        self.floor = 0                    # newest sequence forgotten from recent
+        self.listeners = []               # callbacks run with (keys, tags) after every eviction
+    
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry[1] is not None and entry[1] < time.monotonic():
+                self._drop(key)
+                return default
+            return entry[0]
+    
+    def snapshot(self, key, tags):
+        """Eviction sequence to pass to set() for a value that is about to be loaded"""
+        with self.lock:
+            return self.sequence
+    
+    def set(self, key, value, ttl=None, tags=(), snapshot=None):
+        """Store value unless key or one of its tags was evicted since snapshot was taken"""
+        with self.lock:
+            if snapshot is not None and (snapshot < self.floor or any(
+                    self.recent.get(name, 0) > snapshot for name in (key, *tags))):
+                return False
+            self._drop(key)
+            self.entries[key] = (value, time.monotonic() + ttl if ttl else None, tuple(tags))
+            for tag in tags:
+                self.tagged[tag].add(key)
+            return True
+    
+    def evict(self, keys=(), tags=()):
+        with self.lock:
+            self.sequence += 1
+            for name in (*keys, *tags):
+                self.recent.pop(name, None)
+                self.recent[name] = self.sequence
+            while len(self.recent) > RECENT_EVICTIONS:
+                self.floor = self.recent.popitem(last=False)[1]
+            for key in keys:
+                self._drop(key)
+            for tag in tags:
+                for key in list(self.tagged.pop(tag, ())):
+                    self._drop(key)
+        for listener in self.listeners:
+            try:
+                listener(keys, tags)
+            except Exception as e:
+                print(f"Error in cache eviction listener: {str(e)}")
+    
+    def add_listener(self, callback):
+        """Call callback(keys, tags) after each eviction, local or from another worker"""
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tagged.clear()
+            # Loads already in flight predate the clear and are not stored
+            self.sequence += 1
+            self.recent.clear()
+            self.floor = self.sequence
+    
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            for tag in entry[2]:
+                self.tagged[tag].discard(key)
+
+
+cache = LocalCache()
+bus = None
+_cache_enabled = True
+_default_ttl = 300
+_hooks_registered = False
+
+
+def get_or_load(key, loader, ttl=None, tags=()):
+    """Cached value for key, calling loader() on a miss"""
+    if not _cache_enabled:
+        return loader()
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        metrics.inc('cache_hits_total', {'cache': key.split(':', 1)[0]})
+        return value
+    metrics.inc('cache_misses_total', {'cache': key.split(':', 1)[0]})
+    snapshot = cache.snapshot(key, tags)
+    value = loader()
+    cache.set(key, value, ttl or _default_ttl, tags, snapshot)
+    return value
+
+
+def invalidate(keys=(), tags=()):
+    """Evict keys/tags in this worker and publish the eviction to the others"""
+    keys, tags = sorted(set(keys)), sorted(set(tags))
+    if not keys and not tags:
+        return
+    cache.evict(keys, tags)
+    if bus is not None:
+        bus.publish(keys, tags)
+
+
+# ===== TRANSPORTS =====
+
+class TableTransport:
+    """Shared table with an auto-incrementing version; listeners poll for newer rows"""
+    
+    name = 'table'
+    
+    def __init__(self, engine, interval=0.5, retention_seconds=600):
+        self.engine = engine
+        self.interval = interval
+        self.retention = timedelta(seconds=retention_seconds)
+        self.closed = threading.Event()
+    
+    def send(self, message):
+        with self.engine.begin() as conn:
+            conn.execute(db.insert(CacheInvalidation).values(message=message, created_at=datetime.utcnow()))
+    
+    def listen(self, callback):
+        table = CacheInvalidation.__table__
+        last = None
+        pruned_at = time.monotonic()
+        while not self.closed.wait(self.interval):
+            try:
+                with self.engine.connect() as conn:
+                    if last is None:
+                        # Start from the newest row; older evictions predate this worker's cache
+                        last = conn.execute(db.select(db.func.coalesce(db.func.max(table.c.version), 0))).scalar()
+                        continue
+                    rows = conn.execute(db.select(table.c.version, table.c.message)
+                                        .where(table.c.version > last).order_by(table.c.version)).all()
+                    if not rows and (conn.execute(db.select(db.func.max(table.c.version))).scalar() or 0) < last:
+                        # The table was pruned empty and its versions restarted (tables created before
+                        # sqlite_autoincrement): replay what is there, evicting twice is harmless
+                        last = 0
+                        continue
+                for version, message in rows:
+                    last = version
+                    callback(message)
+                if time.monotonic() - pruned_at > self.retention.total_seconds():
+                    pruned_at = time.monotonic()
+                    with self.engine.begin() as conn:
+                        conn.execute(db.delete(table).where(table.c.created_at < datetime.utcnow() - self.retention))
+            except Exception as e:
+                print(f"Error polling cache invalidations: {str(e)}")
+    
+    def close(self):
+        self.closed.set()
+
+
+class PostgresTransport:
+    """pg_notify to publish, LISTEN on a dedicated connection to receive"""
+    
+    name = 'postgres'
+    
+    def __init__(self, engine, channel='cache_invalidation'):
+        self.engine = engine
+        self.channel = channel
+        self.closed = threading.Event()
+    
+    def send(self, message):
+        with self.engine.begin() as conn:
+            conn.execute(text('SELECT pg_notify(:channel, :message)'), {'channel': self.channel, 'message': message})
+    
+    def listen(self, callback):
+        while not self.closed.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f'LISTEN "{self.channel}"')
+                while not self.closed.is_set():
+                    if select.select([conn], [], [], 5)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            callback(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Cache invalidation listener lost its connection: {str(e)}")
+                # Anything published while disconnected was missed
+                cache.clear()
+                self.closed.wait(1)
+            finally:
+                if raw is not None:
+                    raw.invalidate()
+    
+    def close(self):
+        self.closed.set()
+
+
+def encode_bulk(value):
+    data = value if isinstance(value, bytes) else str(value).encode()
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+def encode_command(*args):
+    """A command in Redis protocol (RESP) form"""
+    return b'*%d\r\n' % len(args) + b''.join(encode_bulk(arg) for arg in args)
+
+
+def encode_subscription(kind, channel, count):
+    return b'*3\r\n' + encode_bulk(kind) + encode_bulk(channel) + b':%d\r\n' % count
+
+
+def read_reply(stream):
+    """One RESP value from a buffered binary stream"""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('connection closed')
+    kind, body = line[:1], line[1:-2]
+    if kind == b'+':
+        return body.decode()
+    if kind == b'-':
+        raise ConnectionError(body.decode())
+    if kind == b':':
+        return int(body)
+    if kind == b'$':
+        length = int(body)
+        if length < 0:
+            return None
+        return stream.read(length + 2)[:-2]
+    if kind == b'*':
+        count = int(body)
+        return None if count < 0 else [read_reply(stream) for _ in range(count)]
+    raise ConnectionError(f'unexpected reply {line!r}')
+
+
+class RedisTransport:
+    """PUBLISH/SUBSCRIBE over the Redis protocol"""
+    
+    name = 'redis'
+    
+    def __init__(self, url='redis://127.0.0.1:6380/0', channel='cache_invalidation'):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or '127.0.0.1', parsed.port or 6379)
+        self.password = parsed.password
+        self.channel = channel
+        self.lock = threading.Lock()
+        self.publisher = None
+        self.closed = threading.Event()
+    
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=5)
+        stream = sock.makefile('rb')
+        if self.password:
+            sock.sendall(encode_command('AUTH', self.password))
+            read_reply(stream)
+        return sock, stream
+    
+    def send(self, message):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.publisher is None:
+                        self.publisher = self.connect()
+                    sock, stream = self.publisher
+                    sock.sendall(encode_command('PUBLISH', self.channel, message))
+                    read_reply(stream)
+                    return
+                except (OSError, ConnectionError):
+                    self.publisher = None
+                    if attempt:
+                        raise
+    
+    def listen(self, callback):
+        while not self.closed.is_set():
+            try:
+                sock, stream = self.connect()
+                sock.settimeout(None)
+                sock.sendall(encode_command('SUBSCRIBE', self.channel))
+                while not self.closed.is_set():
+                    reply = read_reply(stream)
+                    if isinstance(reply, list) and reply[0] == b'message':
+                        callback(reply[2].decode())
+            except (OSError, ConnectionError) as e:
+                print(f"Cache invalidation listener lost its connection: {str(e)}")
+                cache.clear()
+                self.closed.wait(1)
+    
+    def close(self):
+        self.closed.set()
+
+
+class RespPubSubServer(socketserver.ThreadingTCPServer):
+    """Minimal Redis stand-in supporting PING, PUBLISH, SUBSCRIBE and UNSUBSCRIBE"""
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, address):
+        super().__init__(address, RespHandler)
+        self.lock = threading.Lock()
+        self.channels = defaultdict(set)
+    
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        payload = encode_command('message', channel, message)
+        delivered = 0
+        for handler in subscribers:
+            try:
+                handler.write(payload)
+                delivered += 1
+            except OSError:
+                self.unsubscribe(handler, channel)
+        return delivered
+    
+    def unsubscribe(self, handler, channel):
+        with self.lock:
+            self.channels[channel].discard(handler)
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.subscribed = set()
+    
+    def write(self, data):
+        with self.write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+    
+    def handle(self):
+        try:
+            while True:
+                command = read_reply(self.rfile)
+                if not isinstance(command, list) or not command:
+                    self.write(b'-ERR protocol error\r\n')
+                    continue
+                name = command[0].decode().upper()
+                args = [arg.decode() for arg in command[1:]]
+                if name == 'PING':
+                    self.write(b'+PONG\r\n')
+                elif name == 'AUTH':
+                    self.write(b'+OK\r\n')
+                elif name == 'PUBLISH' and len(args) == 2:
+                    self.write(b':%d\r\n' % self.server.publish(args[0], args[1]))
+                elif name == 'SUBSCRIBE' and args:
+                    for channel in args:
+                        with self.server.lock:
+                            self.server.channels[channel].add(self)
+                        self.subscribed.add(channel)
+                        self.write(encode_subscription('subscribe', channel, len(self.subscribed)))
+                elif name == 'UNSUBSCRIBE':
+                    for channel in args or list(self.subscribed):
+                        self.server.unsubscribe(self, channel)
+                        self.subscribed.discard(channel)
+                        self.write(encode_subscription('unsubscribe', channel, len(self.subscribed)))
+                elif name == 'QUIT':
+                    self.write(b'+OK\r\n')
+                    return
+                else:
+                    self.write(f'-ERR unknown command {name}\r\n'.encode())
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            for channel in self.subscribed:
+                self.server.unsubscribe(self, channel)
+
+
+# ===== BUS =====
+
+class InvalidationBus:
+    """Publishes evictions through a transport and applies evictions from other workers"""
+    
+    def __init__(self, transport):
+        self.transport = transport
+        self.origin = uuid4().hex
+        self.thread = threading.Thread(target=transport.listen, args=(self.receive,),
+                                       name=f'cache-bus-{transport.name}', daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def publish(self, keys, tags):
+        message = json.dumps({'origin': self.origin, 'sent_at': time.time(), 'keys': keys, 'tags': tags})
+        try:
+            self.transport.send(message)
+        except Exception as e:
+            print(f"Error publishing cache invalidation: {str(e)}")
+    
+    def receive(self, message):
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return
+        if data.get('origin') == self.origin:
+            return
+        cache.evict(data.get('keys', ()), data.get('tags', ()))
+        metrics.observe('cache_invalidation_lag_seconds', max(0.0, time.time() - data.get('sent_at', time.time())),
+                        {'transport': self.transport.name})
+    
+    def close(self):
+        self.transport.close()
+
+
+def make_transport(config, engine):
+    kind = config.get('CACHE_BUS_TRANSPORT', 'auto')
+    channel = config.get('CACHE_BUS_CHANNEL', 'cache_invalidation')
+    if kind == 'auto':
+        kind = 'postgres' if engine.dialect.name == 'postgresql' else 'table'
+    if kind == 'postgres':
+        return PostgresTransport(engine, channel)
+    if kind == 'table':
+        return TableTransport(engine, config.get('CACHE_BUS_POLL_INTERVAL', 0.5))
+    if kind == 'redis':
+        return RedisTransport(config.get('CACHE_BUS_REDIS_URL', 'redis://127.0.0.1:6380/0'), channel)
+    raise ValueError(f'Unknown CACHE_BUS_TRANSPORT: {kind}')
+
+
+# ===== SESSION HOOKS =====
+
+def _pending(session):
+    return session.info.setdefault('cache_invalidation', (set(), set()))
+
+
+def _record_flush(session, flush_context):
+    keys, tags = _pending(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table is None or table in IGNORED_TABLES:
+            continue
+        tags.add(table)
+        ident = getattr(obj, 'id', None)
+        if ident is not None:
+            keys.add(f'{table}:{ident}')
+
+
+def _record_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is not None and table.name not in IGNORED_TABLES:
+        _pending(orm_execute_state.session)[1].add(table.name)
+
+
+def _publish_committed(session):
+    keys, tags = session.info.pop('cache_invalidation', (set(), set()))
+    if keys or tags:
+        invalidate(keys, tags)
+
+
+def _discard_pending(session, *args):
+    session.info.pop('cache_invalidation', None)
+
+
+def register_session_hooks():
+    global _hooks_registered
+    if _hooks_registered:
+        return
+    _hooks_registered = True
+    event.listen(db.session, 'after_flush', _record_flush)
+    event.listen(db.session, 'do_orm_execute', _record_bulk)
+    event.listen(db.session, 'after_commit', _publish_committed)
+    event.listen(db.session, 'after_rollback', _discard_pending)
+
+
+def init_cache_bus(app):
+    """Configure the local cache, hook commits and start this worker's bus listener"""
+    global bus, _cache_enabled, _default_ttl
+    _cache_enabled = app.config.get('CACHE_ENABLED', True)
+    _default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+    if not _cache_enabled:
+        return
+    
+    register_session_hooks()
+    if bus is not None or app.config.get('CACHE_BUS_TRANSPORT', 'auto') == 'none':
+        return
+    with app.app_context():
+        engine = db.engine
+    bus = InvalidationBus(make_transport(app.config, engine))
+    bus.start()
+
+
+def shutdown_cache_bus():
+    global bus
+    if bus is not None:
+        bus.close()
+        bus = None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 6380
+        server = RespPubSubServer(('127.0.0.1', port))
+        print(f"Cache bus stand-in listening on 127.0.0.1:{port} (pid {os.getpid()})")
+        server.serve_forever()
+    else:
+        print('usage: python cache_bus.py serve [port]')
@@ -0,0 +1,188 @@
+"""Response compression negotiated through ``Accept-Encoding``.
+
+gzip is always available. brotli (``br``) and zstd are used when the
+``brotli`` / ``zstandard`` packages are installed. Among the encodings the
+client accepts with the highest q-value, the server prefers zstd, then br,
+then gzip.
+
+Buffered responses of a compressible type (JSON, text, JavaScript, SVG) are
+compressed when their body is at least COMPRESSION_MIN_SIZE bytes. Smaller
+bodies cost more CPU than the bytes they would save. Streamed responses
+(generators, Server-Sent Events) are compressed chunk by chunk when
+COMPRESSION_STREAMING is on. Each chunk is flushed so the client receives it
+immediately.
+
+The gzip level defaults to 5, the level ``benchmarks/bench_compression.py``
+picked for the list and report payloads at 10-20 Mbps client bandwidth. Level
+2 wins at 50 Mbps and above, and levels above 7 cost two to three times the
+CPU for under 1% smaller bodies. The brotli and zstd defaults are their usual
+fast levels. Rerun the benchmark with those packages installed to tune them.
+Override any of them with COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+and COMPRESSION_ZSTD_LEVEL.
+"""
+import zlib
+from flask import request
+import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'application/javascript', 'image/svg+xml', 'application/xml'}
+
+
+class GzipCodec:
+    name = 'gzip'
+    
+    def __init__(self, level):
+        self.level = level
+    
+    def compress(self, data):
+        compressor = self.compressor()
+        return compressor.compress(data) + compressor.flush()
+    
+    def compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    
+    def stream(self, chunks):
+        compressor = self.compressor()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class BrotliCodec:
+    name = 'br'
+    
+    def __init__(self, quality):
+        self.quality = quality
+    
+    def compress(self, data):
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=self.quality)
+    
+    def stream(self, chunks):
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=self.quality)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+
+class ZstdCodec:
+    name = 'zstd'
+    
+    def __init__(self, level):
+        self.level = level
+    
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+    
+    def stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+
+def build_codecs(config):
+    """Available codecs in server preference order"""
+    codecs = []
+    if zstandard is not None:
+        codecs.append(ZstdCodec(config.get('COMPRESSION_ZSTD_LEVEL', 3)))
+    if brotli is not None:
+        codecs.append(BrotliCodec(config.get('COMPRESSION_BROTLI_QUALITY', 4)))
+    codecs.append(GzipCodec(config.get('COMPRESSION_GZIP_LEVEL', 5)))
+    return codecs
+
+
+def parse_accept_encoding(header):
+    """{encoding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def negotiate(codecs, header):
+    """The preferred codec among those the client accepts with the highest q, or None"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for codec in codecs:
+        q = accepted.get(codec.name, wildcard)
+        if q > best_q:
+            best, best_q = codec, q
+    return best
+
+
+def is_compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES or mimetype.endswith('+json')
+
+
+def encoded_chunks(chunks):
+    """Bytes from a response iterable, closing it when the client goes away"""
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield chunk.encode() if isinstance(chunk, str) else chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_compression(app):
+    """Compress responses after every other after_request hook has run"""
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+    codecs = build_codecs(app.config)
+    min_size = app.config.get('COMPRESSION_MIN_SIZE', 1024)
+    streaming = app.config.get('COMPRESSION_STREAMING', True)
+    
+    def compress_response(response):
+        if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+            return response
+        if 'Content-Encoding' in response.headers or response.direct_passthrough or not is_compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.is_streamed and not streaming:
+            return response
+        codec = negotiate(codecs, request.headers.get('Accept-Encoding'))
+        if codec is None:
+            return response
+        
+        if response.is_streamed:
+            response.response = codec.stream(encoded_chunks(response.response))
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < min_size:
+                return response
+            compressed = codec.compress(body)
+            if len(compressed) >= len(body):
+                return response
+            response.set_data(compressed)
+            metrics.inc('response_bytes_total', {'encoding': codec.name, 'stage': 'uncompressed'}, len(body))
+            metrics.inc('response_bytes_total', {'encoding': codec.name, 'stage': 'sent'}, len(compressed))
+        response.headers['Content-Encoding'] = codec.name
+        return response
+    
+    # after_request hooks run in reverse registration order: insert first so this one runs last
+    app.after_request_funcs.setdefault(None, []).insert(0, compress_response)
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -19,11 +20,127 @@ class Config:
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@equipmentloan.com')
     
+    # Fast boot: skip create_all() when the schema marker matches and defer
+    # scheduler/mail setup until first use. BOOT_REPORT prints a timing breakdown.
+    FAST_BOOT = os.getenv('FAST_BOOT', 'False').lower() in ['true', '1', 'yes']
+    BOOT_REPORT = os.getenv('BOOT_REPORT', 'False').lower() in ['true', '1', 'yes']
+    
+    # Request instrumentation (Server-Timing header, structured request log, slow-query log)
+    INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    REQUEST_LOG = os.getenv('REQUEST_LOG', 'True').lower() in ['true', '1', 'yes']
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'slow_queries.log')
+    
+    # Prometheus metrics (workers share METRICS_DIR; clear it on deploy)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+    
+    # Tracing (spans exported to a rotating JSONL file or an OTLP/JSON collector)
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.1))
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'jsonl')
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+    TRACE_FILE_MAX_BYTES = int(os.getenv('TRACE_FILE_MAX_BYTES', 10 * 1024 * 1024))
+    TRACE_FILE_BACKUPS = int(os.getenv('TRACE_FILE_BACKUPS', 5))
+    TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+    TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'equipment-loan')
+    
+    # On-demand profiling for admins (X-Profile header / sampling window)
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 1))
+    PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', 300))
+    
+    # Audit/email log retention (hot window, then archive tables, then compressed files)
+    LOG_HOT_MONTHS = int(os.getenv('LOG_HOT_MONTHS', 1))
+    LOG_RETENTION_MONTHS = int(os.getenv('LOG_RETENTION_MONTHS', 12))
+    LOG_ARCHIVE_DIR = os.getenv('LOG_ARCHIVE_DIR', 'log_archive')
+    
+    # Loan archival (returned loans older than this move to loan_history)
+    LOAN_ARCHIVE_AFTER_DAYS = int(os.getenv('LOAN_ARCHIVE_AFTER_DAYS', 365))
+    LOAN_ARCHIVE_BATCH_SIZE = int(os.getenv('LOAN_ARCHIVE_BATCH_SIZE', 1000))
+    
+    # Hard purge of soft-deleted students/equipment (off by default)
+    PURGE_DELETED_ENABLED = os.getenv('PURGE_DELETED_ENABLED', 'False').lower() in ['true', '1', 'yes']
+    PURGE_DELETED_AFTER_DAYS = int(os.getenv('PURGE_DELETED_AFTER_DAYS', 30))
+    PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 1000))
+    
+    # Server-Sent Events feed (/api/events)
+    EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', 1.0))
+    EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_STREAM_MAX_SECONDS = int(os.getenv('EVENTS_STREAM_MAX_SECONDS', 300))
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+    EVENTS_REPLAY_LIMIT = int(os.getenv('EVENTS_REPLAY_LIMIT', 1000))
+    EVENTS_RETENTION_HOURS = int(os.getenv('EVENTS_RETENTION_HOURS', 24))
+    
+    # In-process cache and cross-worker invalidation bus (auto, postgres, table, redis or none)
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))
+    CACHE_BUS_TRANSPORT = os.getenv('CACHE_BUS_TRANSPORT', 'auto')
+    CACHE_BUS_CHANNEL = os.getenv('CACHE_BUS_CHANNEL', 'cache_invalidation')
+    CACHE_BUS_REDIS_URL = os.getenv('CACHE_BUS_REDIS_URL', 'redis://127.0.0.1:6380/0')
+    CACHE_BUS_POLL_INTERVAL = float(os.getenv('CACHE_BUS_POLL_INTERVAL', 0.5))
+    
+    # Coalescing of identical concurrent requests to expensive read endpoints
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    SINGLE_FLIGHT_WAIT_SECONDS = int(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', 30))
+    
+    # Asynchronous report jobs: executor is 'thread' (local worker pool) or 'inline' (run in the request)
+    REPORT_JOB_EXECUTOR = os.getenv('REPORT_JOB_EXECUTOR', 'thread')
+    REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 2))
+    REPORT_SNAPSHOT_TTL = int(os.getenv('REPORT_SNAPSHOT_TTL', 300))
+    REPORT_JOB_TIMEOUT = int(os.getenv('REPORT_JOB_TIMEOUT', 600))
+    REPORT_JOB_MAX_WAIT = int(os.getenv('REPORT_JOB_MAX_WAIT', 30))
+    
+    # Typeahead prefix indexes: tables above AUTOCOMPLETE_MAX_ROWS fall back to database lookups
+    AUTOCOMPLETE_MAX_ROWS = int(os.getenv('AUTOCOMPLETE_MAX_ROWS', 50000))
+    AUTOCOMPLETE_MAX_LIMIT = int(os.getenv('AUTOCOMPLETE_MAX_LIMIT', 25))
+    
+    # Offline kiosk sync: batch limits, accepted clock skew and delta feed history
+    SYNC_MAX_OPERATIONS = int(os.getenv('SYNC_MAX_OPERATIONS', 500))
+    SYNC_MAX_CLOCK_SKEW = int(os.getenv('SYNC_MAX_CLOCK_SKEW', 300))
+    SYNC_CHANGES_LIMIT = int(os.getenv('SYNC_CHANGES_LIMIT', 1000))
+    SYNC_GAP_SECONDS = int(os.getenv('SYNC_GAP_SECONDS', 5))
+    SYNC_RETENTION_HOURS = int(os.getenv('SYNC_RETENTION_HOURS', 168))
+    
+    # Idempotency-Key responses are kept this long; unfinished claims are abandoned after LOCK_SECONDS
+    IDEMPOTENCY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_TTL_HOURS', 24))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 60))
+    
+    # Response compression (levels chosen with benchmarks/bench_compression.py)
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_STREAMING = os.getenv('COMPRESSION_STREAMING', 'True').lower() in ['true', '1', 'yes']
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 5))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+    COMPRESSION_ZSTD_LEVEL = int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3))
+    
+    # Maximum IDs accepted by ?ids= batch lookups
+    BATCH_MAX_IDS = int(os.getenv('BATCH_MAX_IDS', 200))
+    
+    # Late fines: default daily rate, overridden per category or year level (JSON maps)
+    FINE_DAILY_RATE = float(os.getenv('FINE_DAILY_RATE', 5.0))
+    FINE_RATES_BY_CATEGORY = json.loads(os.getenv('FINE_RATES_BY_CATEGORY', '{}'))
+    FINE_RATES_BY_YEAR_LEVEL = json.loads(os.getenv('FINE_RATES_BY_YEAR_LEVEL', '{}'))
+    # Flat fine per damage status on return, e.g. {"Major Damage": 50}
+    FINE_DAMAGE_AMOUNTS = json.loads(os.getenv('FINE_DAMAGE_AMOUNTS', '{}'))
+    
     # Secret key for sessions
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     
-    # Scheduler
+    # Scheduler (only the worker holding the DB lease runs the jobs)
     SCHEDULER_API_ENABLED = True
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    SCHEDULER_LEASE_TTL = int(os.getenv('SCHEDULER_LEASE_TTL', 60))
+    SCHEDULER_HEARTBEAT_INTERVAL = int(os.getenv('SCHEDULER_HEARTBEAT_INTERVAL', 20))
+    
+    # Password hashing (Werkzeug method string, e.g. scrypt:32768:8:1 or pbkdf2:sha256:600000)
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32))
+    PASSWORD_HASH_ADMISSION_TIMEOUT = float(os.getenv('PASSWORD_HASH_ADMISSION_TIMEOUT', 2.0))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -35,6 +152,11 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SCHEDULER_ENABLED = False
+    REQUEST_LOG = False
+    TRACING_ENABLED = False
+    CACHE_BUS_TRANSPORT = 'none'
+    REPORT_JOB_EXECUTOR = 'inline'
 
 class ProductionConfig(Config):
     """Production configuration"""
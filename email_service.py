@@ -1,9 +1,28 @@
+from flask import current_app
 from flask_mail import Mail, Message
 from models import db, EmailLog
+from instrumentation import timed
 from datetime import datetime
+import time
+import metrics
+from tracing import span
 
 mail = Mail()
 
+def deliver(msg):
+    """Send a message, initializing Flask-Mail on first use if boot deferred it"""
+    if 'mail' not in current_app.extensions:
+        mail.init_app(current_app)
+    started = time.perf_counter()
+    try:
+        with timed('email'), span('mail.send', recipients=len(msg.recipients or [])):
+            mail.send(msg)
+    except Exception:
+        metrics.inc('email_send_failures_total')
+        raise
+    finally:
+        metrics.observe('email_send_duration_seconds', time.perf_counter() - started)
+
 def send_checkout_email(student_email, student_name, equipment_name, due_date, loan_id):
     """Send checkout confirmation email to student"""
     try:
@@ -24,7 +43,7 @@ IT Equipment Loan System
         """
         
         msg = Message(subject=subject, recipients=[student_email], body=body)
-        mail.send(msg)
+        deliver(msg)
         
         # Log the email
         email_log = EmailLog(
@@ -73,7 +92,7 @@ IT Equipment Loan System
         """
         
         msg = Message(subject=subject, recipients=[student_email], body=body)
-        mail.send(msg)
+        deliver(msg)
         
         # Log the email
         email_log = EmailLog(
@@ -98,7 +117,7 @@ IT Equipment Loan System
         db.session.commit()
         return False
 
-def send_return_confirmation(student_email, student_name, equipment_name, loan_id, damage_status=None, late_fine=0, days_late=0):
+def send_return_confirmation(student_email, student_name, equipment_name, loan_id, damage_status=None, late_fine=0, days_late=0, daily_rate=5.0):
     """Send return confirmation email with optional damage and fine info"""
     try:
         subject = f"Equipment Return Confirmed - {equipment_name}"
@@ -122,7 +141,7 @@ DAMAGE ASSESSMENT:
             body += f"""
 LATE RETURN CHARGES:
 - Days Late: {days_late}
-- Late Fine: ${late_fine:.2f} @ $5.00/day
+- Late Fine: ${late_fine:.2f} @ ${daily_rate:.2f}/day
 """
         
         body += """
@@ -133,7 +152,7 @@ IT Equipment Loan System
         """
         
         msg = Message(subject=subject, recipients=[student_email], body=body)
-        mail.send(msg)
+        deliver(msg)
         
         email_log = EmailLog(
             loan_id=loan_id,
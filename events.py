@@ -0,0 +1,246 @@
+"""Server-Sent Events feed of equipment and loan changes.
+
+Write paths call ``publish()`` (or the ``publish_loan`` / ``publish_availability``
+helpers) before they commit. That adds a ``change_events`` row in the same
+transaction, so an event exists exactly when its change does. Every worker
+runs one ``EventBroker`` thread. While at least one client is connected, the
+thread polls the table for new rows and fans them out to that worker's
+``/api/events`` streams. All workers read the same table, so a change
+committed in any worker reaches clients connected to every worker.
+
+Every stream starts with a ``ready`` event whose id is the newest event
+already sent or stored, so a stream that closes without delivering anything
+still gives the client an id to resume from. Clients reconnect with
+``Last-Event-ID`` (EventSource does this automatically) and are sent the
+rows they missed. When a client has missed more than EVENTS_REPLAY_LIMIT
+rows, or sends an ID newer than any stored row, it gets a ``reset`` event and
+should reload instead. Streams close after EVENTS_STREAM_MAX_SECONDS so
+long-lived connections are handed back to the worker pool. Each open stream
+occupies one worker thread, so run gunicorn with ``--worker-class gthread``
+(or gevent) when many dashboards are open.
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from flask_login import login_required
+from models import db, ChangeEvent, Loan
+
+events_bp = Blueprint('events', __name__, url_prefix='/api')
+
+# Seconds to wait for a skipped id to commit before treating it as rolled back
+GAP_TIMEOUT = 5.0
+
+broker = None
+
+
+def publish(event_type, **payload):
+    """Add a change event to the current transaction (streamed once the caller commits)"""
+    if not current_app.config.get('EVENTS_ENABLED', True):
+        return
+    db.session.add(ChangeEvent(event_type=event_type, payload=payload))
+
+
+def publish_loan(event_type, loan):
+    publish(event_type, loan_id=loan.id, student_id=loan.student_id, equipment_id=loan.equipment_id,
+            date_due=loan.date_due.isoformat() if loan.date_due else None, status=loan.status)
+
+
+def publish_availability(equipment):
+    publish('equipment.availability', equipment_id=equipment.id, name=equipment.name,
+            serial_number=equipment.serial_number, availability_status=equipment.availability_status)
+
+
+def publish_newly_overdue(today):
+    """Publish loan.overdue for loans that became overdue today (needs app context); caller commits"""
+    loans = Loan.query.filter(Loan.status == 'Borrowed', Loan.date_due == today - timedelta(days=1)).all()
+    for loan in loans:
+        publish_loan('loan.overdue', loan)
+    return len(loans)
+
+
+def prune_events(config, now=None):
+    """Delete events older than EVENTS_RETENTION_HOURS; returns rows deleted (needs app context)"""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=config.get('EVENTS_RETENTION_HOURS', 24))
+    deleted = db.session.execute(db.delete(ChangeEvent).where(ChangeEvent.created_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
+
+
+def replay(after_id, limit):
+    """Events with id > after_id, oldest first; None when more than limit were missed or after_id is unknown"""
+    if after_id > (db.session.query(db.func.max(ChangeEvent.id)).scalar() or 0):
+        # Ids from before the table was recreated or its ids restarted; the client cannot catch up
+        return None
+    rows = ChangeEvent.query.filter(ChangeEvent.id > after_id).order_by(ChangeEvent.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        return None
+    return [row.to_dict() for row in rows]
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['event_type']}\ndata: {json.dumps(event['payload'], default=str)}\n\n"
+
+
+class Subscriber:
+    """One connected stream: a bounded queue, dropped when the client falls behind"""
+    
+    def __init__(self, size):
+        self.queue = queue.Queue(maxsize=size)
+        self.dropped = False
+
+
+class EventBroker(threading.Thread):
+    """Polls change_events and fans new rows out to this worker's subscribers"""
+    
+    def __init__(self, app, interval, queue_size):
+        super().__init__(name='event-broker', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        # Highest id below which every row has been delivered, plus delivered ids above it
+        self.floor = None
+        self.seen = set()
+        self.gap_since = None
+    
+    def subscribe(self):
+        """Register a stream (needs app context); rows committed from now on are delivered to it"""
+        subscriber = Subscriber(self.queue_size)
+        with self.lock:
+            if self.floor is None:
+                self.floor = db.session.query(db.func.coalesce(db.func.max(ChangeEvent.id), 0)).scalar()
+            self.subscribers.add(subscriber)
+        self.wakeup.set()
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+    
+    def dispatch(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+    
+    def advance(self, now):
+        """Move the floor over delivered ids, waiting GAP_TIMEOUT on ids not yet committed"""
+        while self.seen:
+            if self.floor + 1 in self.seen:
+                self.floor += 1
+                self.seen.discard(self.floor)
+                self.gap_since = None
+            elif self.gap_since is None:
+                self.gap_since = now
+                break
+            elif now - self.gap_since > GAP_TIMEOUT:
+                self.floor = min(self.seen) - 1
+                self.gap_since = None
+            else:
+                break
+    
+    def poll(self):
+        rows = ChangeEvent.query.filter(ChangeEvent.id > self.floor).order_by(ChangeEvent.id).limit(500).all()
+        if not rows and (db.session.query(db.func.max(ChangeEvent.id)).scalar() or 0) < self.floor:
+            # The table was pruned empty and its ids restarted (tables created before sqlite_autoincrement)
+            self.floor = 0
+            self.seen.clear()
+            return
+        for row in rows:
+            if row.id not in self.seen:
+                self.seen.add(row.id)
+                self.dispatch(row.to_dict())
+        self.advance(time.monotonic())
+    
+    def run(self):
+        while True:
+            with self.lock:
+                idle = not self.subscribers
+                if idle:
+                    # Nothing to deliver; the next subscribe() starts from the newest row
+                    self.floor = None
+                    self.seen.clear()
+                    self.wakeup.clear()
+            if idle:
+                self.wakeup.wait()
+                continue
+            try:
+                with self.app.app_context():
+                    self.poll()
+                    db.session.remove()
+            except Exception as e:
+                print(f"Error polling change events: {str(e)}")
+            time.sleep(self.interval)
+
+
+@events_bp.route('/events', methods=['GET'])
+@login_required
+def stream_events():
+    """SSE stream of equipment availability, loan and reservation changes"""
+    config = current_app.config
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    subscriber = broker.subscribe()
+    backlog = []
+    if last_id and last_id.isdigit():
+        backlog = replay(int(last_id), config.get('EVENTS_REPLAY_LIMIT', 1000))
+    # Id the browser resumes from even if this stream delivers nothing before it closes
+    if backlog:
+        resume_id = backlog[-1]['id']
+    elif backlog is not None and last_id and last_id.isdigit():
+        resume_id = int(last_id)
+    else:
+        resume_id = db.session.query(db.func.coalesce(db.func.max(ChangeEvent.id), 0)).scalar()
+    
+    heartbeat = config.get('EVENTS_HEARTBEAT_SECONDS', 15)
+    deadline = time.monotonic() + config.get('EVENTS_STREAM_MAX_SECONDS', 300)
+    
+    def generate():
+        try:
+            yield f"retry: {config.get('EVENTS_RETRY_MS', 3000)}\n\n"
+            if backlog is None:
+                yield 'event: reset\ndata: {}\n\n'
+                replayed = set()
+            else:
+                replayed = {event['id'] for event in backlog}
+                for event in backlog:
+                    yield format_event(event)
+            yield f"id: {resume_id}\nevent: ready\ndata: {{}}\n\n"
+            
+            while not subscriber.dropped and time.monotonic() < deadline:
+                try:
+                    event = subscriber.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event['id'] not in replayed:
+                    yield format_event(event)
+        finally:
+            broker.unsubscribe(subscriber)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def init_events(app):
+    """Register /api/events and start this worker's broker thread"""
+    global broker
+    if not app.config.get('EVENTS_ENABLED', True):
+        return
+    
+    app.register_blueprint(events_bp)
+    if broker is None:
+        broker = EventBroker(app, app.config.get('EVENTS_POLL_INTERVAL', 1.0), app.config.get('EVENTS_QUEUE_SIZE', 100))
+        broker.start()
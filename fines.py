@@ -0,0 +1,105 @@
+"""Fine policy and the persisted fine ledger.
+
+The daily late-fine rate for a loan is resolved when it is checked out and
+stored on ``loans.fine_rate``: an equipment-category rate wins, then a
+student year-level rate, then FINE_DAILY_RATE. A nightly job accrues the
+outstanding fine of every overdue loan into ``loans.accrued_fine`` with a
+single UPDATE (filling in ``fine_rate`` for loans created before rates were
+stored). Returns write a ``ReturnDetail`` row with the final late and damage
+fines, so reports can SUM stored amounts instead of recomputing per loan.
+
+    python fines.py     # run the accrual now
+"""
+import json
+import os
+from datetime import datetime
+from models import db, Loan, Equipment, Student, ReturnDetail
+
+
+class FinePolicy:
+    """Late and damage fine amounts from app config"""
+    
+    def __init__(self, config):
+        self.daily_rate = float(config.get('FINE_DAILY_RATE', 5.0))
+        self.category_rates = {k: float(v) for k, v in config.get('FINE_RATES_BY_CATEGORY', {}).items()}
+        self.year_level_rates = {int(k): float(v) for k, v in config.get('FINE_RATES_BY_YEAR_LEVEL', {}).items()}
+        self.damage_fines = {k: float(v) for k, v in config.get('FINE_DAMAGE_AMOUNTS', {}).items()}
+    
+    def rate_for(self, equipment, student):
+        """Daily late-fine rate for lending equipment to student"""
+        if equipment is not None and equipment.category in self.category_rates:
+            return self.category_rates[equipment.category]
+        if student is not None and student.year_level in self.year_level_rates:
+            return self.year_level_rates[student.year_level]
+        return self.daily_rate
+    
+    def rate_expression(self):
+        """SQL equivalent of rate_for() evaluated against loans rows"""
+        whens = []
+        if self.category_rates:
+            category = db.select(Equipment.category).where(Equipment.id == Loan.equipment_id).scalar_subquery()
+            whens += [(category == name, rate) for name, rate in self.category_rates.items()]
+        if self.year_level_rates:
+            year_level = db.select(Student.year_level).where(Student.id == Loan.student_id).scalar_subquery()
+            whens += [(year_level == level, rate) for level, rate in self.year_level_rates.items()]
+        if not whens:
+            return db.literal(self.daily_rate)
+        return db.case(*whens, else_=self.daily_rate)
+    
+    def damage_fine(self, damage_status):
+        return self.damage_fines.get(damage_status, 0.0)
+
+
+def days_overdue_expression(today):
+    """Whole days between loans.date_due and today, per dialect"""
+    if db.engine.dialect.name == 'sqlite':
+        return db.cast(db.func.julianday(today.isoformat()) - db.func.julianday(Loan.date_due), db.Integer)
+    return db.literal(today, db.Date) - Loan.date_due
+
+
+def accrue_fines(config, today=None):
+    """Set accrued_fine on every overdue loan with one UPDATE; returns rows updated (needs app context)"""
+    today = today or datetime.utcnow().date()
+    policy = FinePolicy(config)
+    rate = db.func.coalesce(Loan.fine_rate, policy.rate_expression())
+    updated = db.session.execute(
+        db.update(Loan)
+        .where(Loan.status == 'Borrowed', Loan.date_due < today)
+        .values(fine_rate=rate, accrued_fine=days_overdue_expression(today) * rate)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return updated
+
+
+def record_return(loan, equipment, student, config, damage_status='None', damage_notes=None,
+                  condition_on_return=None, returned_on=None):
+    """Final fines for a returned loan; adds its ReturnDetail to the session (caller commits)"""
+    returned_on = returned_on or datetime.utcnow().date()
+    policy = FinePolicy(config)
+    rate = loan.fine_rate if loan.fine_rate is not None else policy.rate_for(equipment, student)
+    days_late = max(0, (returned_on - loan.date_due).days)
+    late_fine = round(days_late * rate, 2)
+    damage_fine = policy.damage_fine(damage_status)
+    
+    loan.fine_rate = rate
+    loan.accrued_fine = late_fine
+    detail = ReturnDetail(
+        loan_id=loan.id,
+        damage_status=damage_status,
+        damage_notes=damage_notes,
+        condition_on_return=condition_on_return or (equipment.condition if equipment else None),
+        days_late=days_late,
+        late_fine=late_fine,
+        damage_fine=damage_fine,
+        total_fine=late_fine + damage_fine
+    )
+    db.session.add(detail)
+    return detail
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app(os.getenv('FLASK_ENV', 'development'), {'SCHEDULER_ENABLED': False})
+    with app.app_context():
+        print(json.dumps({'accrued_loans': accrue_fines(app.config)}))
@@ -67,6 +67,9 @@ export const equipmentService = {
   getById: (id) =>
     api.get(`/equipment/${id}`),
   
+  getMany: (ids) =>
+    api.get('/equipment', { params: { ids: ids.join(',') } }),
+  
   create: (data) =>
     api.post('/equipment', data),
   
@@ -88,6 +91,9 @@ export const studentService = {
   getById: (id) =>
     api.get(`/students/${id}`),
   
+  getMany: (ids) =>
+    api.get('/students', { params: { ids: ids.join(',') } }),
+  
   create: (data) =>
     api.post('/students', data),
   
@@ -109,6 +115,9 @@ export const loanService = {
   getById: (id) =>
     api.get(`/loans/${id}`),
   
+  getMany: (ids) =>
+    api.get('/loans', { params: { ids: ids.join(',') } }),
+  
   create: (data) =>
     api.post('/loans', data),
   
@@ -0,0 +1,381 @@
+# Synthetic dataset generator for load and performance testing.
+#
+# Produces production-like volumes with bulk inserts and a deterministic seed.
+# At --scale 1 that is 50k students, 20k devices and 2M historical loans
+# (plus reservations, damage logs, return details, email and audit logs).
+#
+#   python generate_dataset.py --scale 0.1 --drop
+#   python generate_dataset.py --scale 1 --database-url postgresql://... --drop
+
+import argparse
+import random
+from bisect import bisect_left
+from itertools import accumulate
+import time
+from datetime import date, datetime, timedelta
+from uuid import UUID
+
+from app import create_app, db # pyright: ignore[reportMissingImports]
+from models import (Student, Equipment, Loan, Staff, User, EmailLog, AuditLog, # pyright: ignore[reportMissingImports]
+                    ReturnDetail, DamageLog, Reservation)
+from password_hashing import hash_password # pyright: ignore[reportMissingImports]
+
+BASE_COUNTS = {
+    'students': 50_000,
+    'equipment': 20_000,
+    'loans': 2_000_000,
+    'reservations': 100_000,
+    'users': 2_000,
+}
+
+FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Angel', 'John', 'Grace', 'Paolo', 'Kristine',
+               'Miguel', 'Andrea', 'Carlo', 'Patricia', 'Rafael', 'Nicole', 'Luis', 'Camille', 'Joshua', 'Bea',
+               'Daniel', 'Sofia', 'Gabriel', 'Isabel', 'Adrian', 'Jasmine', 'Kevin', 'Trisha', 'Paul', 'Erika']
+LAST_NAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Ramos', 'Villanueva',
+              'Castillo', 'Aquino', 'Navarro', 'Domingo', 'Mercado', 'Soriano', 'Dela Cruz', 'Gonzales', 'Lopez', 'Perez']
+PROGRAMS = ['Computer Science', 'Information Technology', 'Software Engineering', 'Data Science',
+            'Civil Engineering', 'Mechanical Engineering', 'Electrical Engineering', 'Accounting', 'Finance',
+            'Business Administration', 'Psychology', 'Nursing', 'Architecture', 'Graphic Design',
+            'Secondary Education', '7th Grade', '8th Grade', '9th Grade', 'STEM Strand', 'ABM Strand']
+YEAR_LEVELS = [1, 2, 3, 4, 1, 2, 3, 4, 7, 8, 9, 10, 11, 12]
+EQUIPMENT_TYPES = [
+    # (category, name, model, weight)
+    ('Laptop', 'Dell Latitude 5440', 'Latitude 5440', 30),
+    ('Laptop', 'Lenovo ThinkPad T14', 'ThinkPad T14 Gen 4', 25),
+    ('Laptop', 'MacBook Air 13', 'MacBook Air M2', 10),
+    ('Tablet', 'iPad 10th Gen', 'iPad 10.9', 10),
+    ('Tablet', 'Samsung Galaxy Tab S9', 'SM-X710', 5),
+    ('Storage', 'External Hard Drive', 'WD Elements 2TB', 5),
+    ('Accessory', 'Wireless Mouse', 'Logitech M185', 5),
+    ('Accessory', 'USB-C Hub', 'Anker 7-in-1', 4),
+    ('Camera', 'DSLR Camera', 'Canon EOS 2000D', 3),
+    ('Projector', 'Portable Projector', 'Epson EF-12', 3),
+]
+ON_TIME_RATE = 0.87
+# Share of devices whose most recent loan was never returned
+OVERDUE_RATE = 0.05
+CONDITIONS = (['Excellent', 'Good', 'Fair', 'Poor'], [25, 50, 20, 5])
+LOAN_DAYS = ([1, 3, 7, 14], [20, 30, 35, 15])
+# Relative lending activity per month (academic year peaks, summer/holiday dips)
+MONTH_WEIGHTS = {1: 1.0, 2: 1.1, 3: 1.0, 4: 0.7, 5: 0.4, 6: 0.6, 7: 0.3, 8: 1.2, 9: 1.3, 10: 1.1, 11: 1.0, 12: 0.5}
+
+
+class DatasetGenerator:
+    """Generates and bulk-inserts a synthetic dataset"""
+    
+    def __init__(self, scale=1.0, seed=42, history_days=1095, batch_size=10_000):
+        self.rng = random.Random(seed)
+        self.counts = {name: max(1, int(count * scale)) for name, count in BASE_COUNTS.items()}
+        self.history_days = history_days
+        self.batch_size = batch_size
+        self.today = date.today()
+        self.start = self.today - timedelta(days=history_days)
+        self.buffers = {}
+        self.inserted = {}
+        self.student_ids = []
+        self.student_emails = []
+        self.student_weights = []
+        self.equipment = []
+        self.equipment_ids = []
+    
+    def uuid(self):
+        return str(UUID(int=self.rng.getrandbits(128), version=4))
+    
+    def add(self, model, row):
+        """Buffer a row and flush the model's batch when full"""
+        rows = self.buffers.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(model)
+    
+    def flush(self, model=None):
+        models = [model] if model is not None else list(self.buffers)
+        for m in models:
+            rows = self.buffers.get(m)
+            if rows:
+                db.session.execute(db.insert(m), rows)
+                db.session.commit()
+                self.inserted[m.__tablename__] = self.inserted.get(m.__tablename__, 0) + len(rows)
+                self.buffers[m] = []
+    
+    def timestamp(self, day):
+        """A datetime during opening hours on the given day"""
+        return datetime.combine(day, datetime.min.time()) + timedelta(
+            hours=self.rng.randint(8, 17), minutes=self.rng.randint(0, 59), seconds=self.rng.randint(0, 59))
+    
+    def generate_users(self):
+        # Hash once and reuse; scrypt per user would dominate the run time
+        password_hash = hash_password('password123')
+        for i in range(self.counts['users']):
+            role = 'admin' if i < 2 else ('staff' if i < 20 else 'borrower')
+            self.add(User, {
+                'id': self.uuid(),
+                'username': f'{role}{i}',
+                'email': f'{role}{i}@example.edu',
+                'password_hash': password_hash,
+                'first_name': self.rng.choice(FIRST_NAMES),
+                'last_name': self.rng.choice(LAST_NAMES),
+                'role': role,
+                'status': 'active' if self.rng.random() > 0.02 else 'disabled',
+                'created_at': self.timestamp(self.start + timedelta(days=self.rng.randrange(self.history_days)))
+            })
+        for i in range(max(2, self.counts['users'] // 200)):
+            self.add(Staff, {
+                'id': self.uuid(),
+                'name': f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                'email': f'staff{i}@it.example.edu',
+                'role': self.rng.choice(['approver', 'IT Technician', 'IT Manager'])
+            })
+        self.flush()
+    
+    def generate_students(self):
+        for i in range(self.counts['students']):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            student_id = self.uuid()
+            email = f"{first.lower()}.{last.lower().replace(' ', '')}.{i}@students.example.edu"
+            self.student_ids.append(student_id)
+            self.student_emails.append(email)
+            self.add(Student, {
+                'id': student_id,
+                'first_name': first,
+                'last_name': last,
+                'program': self.rng.choice(PROGRAMS),
+                'year_level': self.rng.choice(YEAR_LEVELS),
+                'email': email,
+                'status': 'active' if self.rng.random() > 0.05 else 'inactive',
+                'created_at': self.timestamp(self.start + timedelta(days=self.rng.randrange(self.history_days)))
+            })
+        self.flush()
+        # Some students borrow far more than others
+        self.student_weights = list(accumulate(self.rng.paretovariate(2.5) for _ in self.student_ids))
+    
+    def generate_equipment(self):
+        types = [t[:3] for t in EQUIPMENT_TYPES]
+        weights = [t[3] for t in EQUIPMENT_TYPES]
+        for i in range(self.counts['equipment']):
+            category, name, model = self.rng.choices(types, weights)[0]
+            row = {
+                'id': self.uuid(),
+                'name': f'{name} #{i + 1:05d}',
+                'model': model,
+                'category': category,
+                'serial_number': f'{category[:3].upper()}{i + 1:07d}',
+                'condition': self.rng.choices(*CONDITIONS)[0],
+                'availability_status': 'Available',
+                'created_at': self.timestamp(self.start)
+            }
+            self.equipment.append(row)
+            self.equipment_ids.append(row['id'])
+            self.add(Equipment, dict(row))
+        self.flush()
+    
+    def pick_student(self):
+        """Index of a student, weighted towards frequent borrowers"""
+        return bisect_left(self.student_weights, self.rng.random() * self.student_weights[-1])
+    
+    def active_day(self, day):
+        """Thin out borrowing in low-activity months"""
+        return self.rng.random() <= MONTH_WEIGHTS[day.month] / 1.3
+    
+    def generate_loans(self):
+        popularity = [self.rng.paretovariate(3) for _ in self.equipment]
+        total_popularity = sum(popularity)
+        # Oversample to make up for loans skipped in quiet months
+        kept_fraction = sum(MONTH_WEIGHTS.values()) / len(MONTH_WEIGHTS) / 1.3
+        
+        for device, weight in zip(self.equipment, popularity):
+            n_loans = max(1, round(self.counts['loans'] * weight / total_popularity / kept_fraction))
+            # Each loan gets its own time slot so a device is never lent out twice at once
+            slot = self.history_days / n_loans
+            for i in range(n_loans):
+                borrowed = self.start + timedelta(days=int(i * slot + self.rng.random() * slot * 0.2))
+                last = i == n_loans - 1
+                if borrowed > self.today or (not last and not self.active_day(borrowed)):
+                    continue
+                slot_end = min(self.start + timedelta(days=int((i + 1) * slot)), self.today)
+                self.generate_loan(device, borrowed, slot_end, last)
+        self.flush()
+        
+        # Reflect each device's final loan in its availability
+        changed = [{'id': d['id'], 'availability_status': d['availability_status'], 'condition': d['condition']}
+                   for d in self.equipment if d['availability_status'] != 'Available']
+        for i in range(0, len(changed), self.batch_size):
+            db.session.execute(db.update(Equipment), changed[i:i + self.batch_size])
+            db.session.commit()
+    
+    def generate_loan(self, device, borrowed, slot_end, last):
+        max_days = max(1, (slot_end - borrowed).days)
+        loan_days = min(self.rng.choices(*LOAN_DAYS)[0], max_days)
+        due = borrowed + timedelta(days=loan_days)
+        loan_id = self.uuid()
+        student = self.pick_student()
+        student_id = self.student_ids[student]
+        recipient = self.student_emails[student]
+        returned = None
+        roll = self.rng.random()
+        
+        if last and (due >= self.today or roll < OVERDUE_RATE):
+            # Still out: either not due yet or overdue (only the device's last loan)
+            status = 'Borrowed'
+        elif roll < ON_TIME_RATE:
+            returned = borrowed + timedelta(days=self.rng.randint(0, loan_days))
+            status = 'Returned'
+        else:
+            # Late return, but back before the device's next loan starts
+            late_days = 1 + int(self.rng.expovariate(1 / 4))
+            returned = max(due, min(due + timedelta(days=late_days), slot_end))
+            status = 'Returned'
+        
+        if returned and returned > self.today:
+            returned = self.today
+        
+        created_at = self.timestamp(borrowed)
+        self.add(Loan, {
+            'id': loan_id,
+            'student_id': student_id,
+            'equipment_id': device['id'],
+            'date_borrowed': borrowed,
+            'date_due': due,
+            'date_returned': returned,
+            'status': status,
+            'created_at': created_at
+        })
+        self.add(EmailLog, {
+            'id': self.uuid(), 'loan_id': loan_id, 'recipient_email': recipient,
+            'email_type': 'checkout_confirmation', 'sent_at': created_at,
+            'status': 'sent' if self.rng.random() > 0.01 else 'failed'
+        })
+        self.add(AuditLog, {
+            'id': self.uuid(), 'action': 'CREATE', 'table_name': 'loans', 'record_id': loan_id,
+            'details': {'student_id': student_id, 'equipment_id': device['id'], 'date_due': due.isoformat()},
+            'created_at': created_at
+        })
+        
+        if status == 'Borrowed':
+            device['availability_status'] = 'On Loan'
+            # One reminder per overdue day, as the daily sweep would have sent
+            for days_overdue in range(1, min((self.today - due).days, 30) + 1):
+                self.add(EmailLog, {
+                    'id': self.uuid(), 'loan_id': loan_id, 'recipient_email': recipient,
+                    'email_type': 'overdue_reminder',
+                    'sent_at': datetime.combine(due + timedelta(days=days_overdue), datetime.min.time()) + timedelta(hours=8),
+                    'status': 'sent'
+                })
+            return
+        
+        returned_at = self.timestamp(returned)
+        days_late = max(0, (returned - due).days)
+        self.add(EmailLog, {
+            'id': self.uuid(), 'loan_id': loan_id, 'recipient_email': recipient,
+            'email_type': 'return_confirmation', 'sent_at': returned_at, 'status': 'sent'
+        })
+        self.add(AuditLog, {
+            'id': self.uuid(), 'action': 'UPDATE', 'table_name': 'loans', 'record_id': loan_id,
+            'details': {'action': 'return', 'date_returned': returned.isoformat()},
+            'created_at': returned_at
+        })
+        
+        damage_roll = self.rng.random()
+        damage_status = 'None'
+        if damage_roll < 0.01:
+            damage_status = self.rng.choices(['Minor', 'Major', 'Lost'], [70, 25, 5])[0]
+            damage_type = 'Lost' if damage_status == 'Lost' else 'Damage'
+            resolved = self.rng.random() < 0.8 and returned < self.today - timedelta(days=14)
+            self.add(DamageLog, {
+                'id': self.uuid(), 'equipment_id': device['id'], 'student_id': student_id, 'loan_id': loan_id,
+                'damage_type': damage_type, 'description': f'{damage_status} damage reported on return',
+                'reported_by': 'staff1', 'status': 'Resolved' if resolved else self.rng.choice(['Open', 'In Repair']),
+                'repair_cost': round(self.rng.uniform(20, 300), 2) if damage_type == 'Damage' else 0,
+                'replacement_cost': round(self.rng.uniform(300, 1500), 2) if damage_type == 'Lost' else 0,
+                'created_at': returned_at,
+                'resolved_at': returned_at + timedelta(days=self.rng.randint(1, 14)) if resolved else None
+            })
+            if damage_type == 'Lost':
+                device['availability_status'] = 'Lost'
+                device['condition'] = 'Lost'
+        
+        if days_late or damage_status != 'None':
+            late_fine = days_late * 5.0
+            self.add(ReturnDetail, {
+                'id': self.uuid(), 'loan_id': loan_id, 'damage_status': damage_status,
+                'condition_on_return': device['condition'], 'days_late': days_late,
+                'late_fine': late_fine, 'damage_fine': 0.0, 'total_fine': late_fine,
+                'created_at': returned_at
+            })
+    
+    def generate_reservations(self):
+        statuses = (['Pending', 'Confirmed', 'Cancelled', 'Completed'], [10, 20, 15, 55])
+        for _ in range(self.counts['reservations']):
+            date_from = self.start + timedelta(days=self.rng.randrange(self.history_days + 60))
+            status = self.rng.choices(*statuses)[0]
+            if date_from > self.today and status == 'Completed':
+                status = 'Confirmed'
+            created = self.timestamp(min(date_from - timedelta(days=self.rng.randint(1, 14)), self.today))
+            self.add(Reservation, {
+                'id': self.uuid(),
+                'student_id': self.student_ids[self.pick_student()],
+                'equipment_id': self.rng.choice(self.equipment_ids),
+                'date_from': date_from,
+                'date_to': date_from + timedelta(days=self.rng.choice([1, 2, 3, 7])),
+                'status': status,
+                'notes': '',
+                'created_at': created,
+                'confirmed_at': created + timedelta(hours=2) if status in ('Confirmed', 'Completed') else None
+            })
+        self.flush()
+    
+    def run(self):
+        steps = [
+            ('users', self.generate_users),
+            ('students', self.generate_students),
+            ('equipment', self.generate_equipment),
+            ('loans', self.generate_loans),
+            ('reservations', self.generate_reservations),
+        ]
+        for name, step in steps:
+            started = time.perf_counter()
+            print(f"Generating {name}...")
+            step()
+            print(f"✓ {name} done in {time.perf_counter() - started:.1f}s")
+        return self.inserted
+
+
+def generate_dataset(scale=1.0, seed=42, config_name='development', database_url=None,
+                     drop=False, history_days=1095, batch_size=10_000, app=None):
+    """Generate a synthetic dataset; returns row counts per table"""
+    if app is None:
+        overrides = {'SCHEDULER_ENABLED': False}
+        if database_url:
+            overrides['SQLALCHEMY_DATABASE_URI'] = database_url
+        app = create_app(config_name, overrides)
+    
+    with app.app_context():
+        if drop:
+            db.drop_all()
+            db.create_all()
+        elif db.session.query(Student.id).first() is not None:
+            raise SystemExit('Database already has students; re-run with --drop to replace it')
+        
+        generator = DatasetGenerator(scale=scale, seed=seed, history_days=history_days, batch_size=batch_size)
+        started = time.perf_counter()
+        inserted = generator.run()
+        
+        print(f"\n✅ Dataset generated in {time.perf_counter() - started:.1f}s (scale={scale}, seed={seed})")
+        for table, count in sorted(inserted.items()):
+            print(f"  - {table:<16}{count:>12,}")
+        return inserted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a synthetic dataset for load testing')
+    parser.add_argument('--scale', type=float, default=1.0, help='1.0 = 50k students, 20k devices, 2M loans')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--config', default='development')
+    parser.add_argument('--database-url', help='Override SQLALCHEMY_DATABASE_URI')
+    parser.add_argument('--days', type=int, default=1095, help='Days of loan history')
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--drop', action='store_true', help='Drop and recreate all tables first')
+    args = parser.parse_args()
+    
+    generate_dataset(scale=args.scale, seed=args.seed, config_name=args.config, database_url=args.database_url,
+                     drop=args.drop, history_days=args.days, batch_size=args.batch_size)
@@ -0,0 +1,134 @@
+"""Idempotency-Key support for write endpoints.
+
+A client that sends ``Idempotency-Key: <unique value>`` with a POST can retry
+it safely. The first request claims the key in ``idempotency_keys`` and runs
+the view. Its response (any status below 500) is stored with the key. A retry
+with the same key gets that stored response back with
+``Idempotent-Replayed: true``, without running validation, emails or audit
+logging again. While the first request is still running, retries get 409 and
+``Retry-After``. A claim older than IDEMPOTENCY_LOCK_SECONDS without a
+response is treated as abandoned. Reusing a key for a different request body
+gets 422. A 5xx response or an exception releases the key so the client can
+retry. So does a 4xx from a view's catch-all error handler that called
+``release_on_error()``, because a locked database or failed commit is worth
+retrying. Only deliberate validation errors are stored and replayed.
+
+Keys are scoped to the caller, method and path, and they expire after
+IDEMPOTENCY_TTL_HOURS. The scheduler's log maintenance job prunes expired
+keys.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, current_app, g, jsonify, request
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+import metrics
+
+HEADER = 'Idempotency-Key'
+
+# Longest client key accepted (the stored key also carries the caller, method and path)
+MAX_KEY_LENGTH = 100
+
+
+def scoped_key(client_key):
+    caller = current_user.id if current_user.is_authenticated else 'anonymous'
+    return f'{caller}:{request.method}:{request.path}:{client_key}'
+
+
+def claim(key, request_hash, ttl, lock_timeout):
+    """(record, claimed): claims key for this request, or returns the existing claim"""
+    now = datetime.utcnow()
+    try:
+        db.session.add(IdempotencyKey(key=key, request_hash=request_hash, expires_at=now + ttl))
+        db.session.commit()
+        return None, True
+    except IntegrityError:
+        db.session.rollback()
+    record = db.session.get(IdempotencyKey, key)
+    abandoned = record is not None and record.response_status is None and record.created_at < now - lock_timeout
+    if record is None or record.expires_at < now or abandoned:
+        # Expired, or claimed by a request that never finished (worker killed): start over
+        db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.key == key))
+        db.session.commit()
+        return claim(key, request_hash, ttl, lock_timeout)
+    return record, False
+
+
+def release(key):
+    db.session.rollback()
+    db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.key == key))
+    db.session.commit()
+
+
+def release_on_error():
+    """Call from a view's catch-all except: its error response is not stored, so a retry runs again"""
+    g.idempotency_release = True
+
+
+def prune_keys(config, now=None):
+    """Delete expired idempotency keys; returns rows deleted (needs app context)"""
+    deleted = db.session.execute(
+        db.delete(IdempotencyKey).where(IdempotencyKey.expires_at < (now or datetime.utcnow()))
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def replay(record):
+    response = Response(record.response_body, status=record.response_status, content_type=record.content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key (place below @login_required)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get(HEADER)
+        if not client_key:
+            return view(*args, **kwargs)
+        if len(client_key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+        
+        labels = {'endpoint': request.endpoint or 'unmatched'}
+        key = scoped_key(client_key)
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        config = current_app.config
+        record, claimed = claim(key, request_hash, timedelta(hours=config.get('IDEMPOTENCY_TTL_HOURS', 24)),
+                                timedelta(seconds=config.get('IDEMPOTENCY_LOCK_SECONDS', 60)))
+        
+        if not claimed:
+            if record.request_hash != request_hash:
+                metrics.inc('idempotent_requests_total', {**labels, 'outcome': 'mismatch'})
+                return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+            if record.response_status is None:
+                metrics.inc('idempotent_requests_total', {**labels, 'outcome': 'in_progress'})
+                response = jsonify({'error': f'A request with this {HEADER} is still in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            metrics.inc('idempotent_requests_total', {**labels, 'outcome': 'replayed'})
+            return replay(record)
+        
+        g.idempotency_release = False
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            release(key)
+            raise
+        if response.status_code >= 500 or g.idempotency_release:
+            release(key)
+            return response
+        
+        # Drop anything an error path left uncommitted before storing the response
+        db.session.rollback()
+        db.session.execute(db.update(IdempotencyKey).where(IdempotencyKey.key == key).values(
+            response_status=response.status_code,
+            response_body=response.get_data(),
+            content_type=response.content_type
+        ))
+        db.session.commit()
+        metrics.inc('idempotent_requests_total', {**labels, 'outcome': 'stored'})
+        return response
+    return wrapper
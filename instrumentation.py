@@ -0,0 +1,173 @@
+"""Per-request SQL and timing instrumentation.
+
+Hooks SQLAlchemy's cursor events to count statements and time them, and lets
+other code time named sections (email, audit) with ``timed()``. After each
+request the totals are sent back as a ``Server-Timing`` header and written as
+one structured JSON log line. Statements slower than SLOW_QUERY_MS go to the
+slow-query log with normalized SQL and the application call site.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+THIS_FILE = os.path.abspath(__file__)
+
+request_logger = logging.getLogger('equipment_loan.requests')
+slow_query_logger = logging.getLogger('equipment_loan.slow_queries')
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_PLACEHOLDER = re.compile(r'%\([^)]+\)s|%s|:\w+|\$\d+')
+
+
+class RequestStats:
+    """Timing totals for the current request"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+        self.sections = {}
+    
+    def record_statement(self, elapsed_ms, statement):
+        self.statements += 1
+        self.db_ms += elapsed_ms
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = statement
+    
+    def record_section(self, name, elapsed_ms):
+        self.sections[name] = self.sections.get(name, 0.0) + elapsed_ms
+
+
+def current_stats():
+    """Stats for the current request, or None outside a request"""
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+@contextmanager
+def timed(section):
+    """Time a block and add it to the current request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_stats()
+        if stats is not None:
+            stats.record_section(section, (time.perf_counter() - started) * 1000)
+
+
+def normalize_sql(statement):
+    """Collapse whitespace and replace literals so similar statements group together"""
+    sql = _WHITESPACE.sub(' ', statement).strip()
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _IN_LIST.sub('(?...)', sql)
+
+
+def call_site():
+    """First stack frame in application code outside this module"""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(ROOT) and filename != THIS_FILE and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, ROOT)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _make_after_cursor_execute(slow_query_ms):
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        
+        stats = current_stats()
+        if stats is not None:
+            stats.record_statement(elapsed_ms, statement)
+        
+        if slow_query_ms is not None and elapsed_ms >= slow_query_ms:
+            slow_query_logger.warning(json.dumps({
+                'duration_ms': round(elapsed_ms, 2),
+                'sql': normalize_sql(statement),
+                'call_site': call_site(),
+                'endpoint': request.endpoint if has_request_context() else None
+            }))
+    return after_cursor_execute
+
+
+def server_timing_header(stats, total_ms):
+    parts = [f'db;dur={stats.db_ms:.2f};desc="{stats.statements} queries"']
+    for name, ms in stats.sections.items():
+        parts.append(f'{name};dur={ms:.2f}')
+    parts.append(f'total;dur={total_ms:.2f}')
+    return ', '.join(parts)
+
+
+def init_instrumentation(app):
+    """Register SQL event hooks and request timing handlers"""
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    
+    slow_query_ms = app.config.get('SLOW_QUERY_MS')
+    slow_query_log = app.config.get('SLOW_QUERY_LOG')
+    if slow_query_log and not slow_query_logger.handlers:
+        slow_query_logger.addHandler(logging.FileHandler(slow_query_log))
+        slow_query_logger.setLevel(logging.WARNING)
+        slow_query_logger.propagate = False
+    
+    if app.config.get('REQUEST_LOG') and not request_logger.handlers:
+        request_logger.addHandler(logging.StreamHandler(sys.stdout))
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _make_after_cursor_execute(slow_query_ms))
+    
+    @app.before_request
+    def start_request_stats():
+        g._request_stats = RequestStats()
+    
+    @app.after_request
+    def emit_request_stats(response):
+        stats = g.get('_request_stats')
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        response.headers['Server-Timing'] = server_timing_header(stats, total_ms)
+        
+        if request_logger.isEnabledFor(logging.INFO):
+            request_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(total_ms, 2),
+                'db_statements': stats.statements,
+                'db_ms': round(stats.db_ms, 2),
+                'slowest_ms': round(stats.slowest_ms, 2),
+                'slowest_sql': normalize_sql(stats.slowest_sql) if stats.slowest_sql else None,
+                'sections_ms': {name: round(ms, 2) for name, ms in stats.sections.items()}
+            }))
+        return response
@@ -0,0 +1,43 @@
+"""Faster JSON provider installed through Flask's ``app.json`` hook.
+
+Uses orjson when it is installed and falls back to the stdlib provider
+otherwise. Both paths serialize dates as ISO 8601 (matching what the
+``to_dict()`` methods already emit) and dataclasses as objects, so the row
+DTOs from ``serializers.py`` can be passed straight to ``jsonify``.
+"""
+import dataclasses
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson with a stdlib fallback"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        if dataclasses.is_dataclass(o) and not isinstance(o, type):
+            return {f.name: getattr(o, f.name) for f in dataclasses.fields(o)}
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            # e.g. integers wider than 64 bits; let the stdlib handle it
+            return super().dumps(obj, **kwargs)
@@ -0,0 +1,296 @@
+"""Offline kiosk sync: batched operation replay and a delta feed.
+
+``POST /api/sync/operations`` takes the operations a kiosk queued while
+offline, in the order they happened::
+
+    {"kiosk_id": "library-desk",
+     "operations": [
+        {"id": "<client uuid>", "type": "checkout", "at": "2026-10-19T09:12:00",
+         "serial_number": "CAM0000012", "student_id": "...", "date_due": "2026-10-26"},
+        {"id": "...", "type": "return", "at": "...", "serial_number": "..."},
+        {"id": "...", "type": "damage", "at": "...", "equipment_id": "...", "student_id": "...",
+         "damage_type": "Damage", "description": "Cracked lens"}]}
+
+Equipment is named by ``serial_number`` or ``equipment_id``. The whole batch is
+applied in one transaction. Each operation is checked against the state left
+by the operations before it. One that no longer fits (the equipment was lent
+out by another desk, or the loan was already returned) is reported as
+``conflict`` and skipped, and the rest still apply. Loans use the client's
+``at`` date as the borrow/return date, so fines match what the student was
+told at the desk. Every result is stored under the operation ID, and a batch
+resent after a dropped response gets the stored results back
+(``duplicate``).
+
+``GET /api/sync/changes?since=<version>`` returns the students and equipment
+changed after ``version``, the deleted IDs and the new ``version`` to send
+next time. Without ``since``, or when ``since`` is older than the retained
+history (SYNC_RETENTION_HOURS), the response is a full snapshot with
+``"reset": true``.
+"""
+from datetime import datetime, timedelta
+from uuid import uuid4
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import event
+from models import db, Student, Equipment, Loan, DamageLog, KioskOperation, SyncChange
+from decorators import borrower_required
+from events import publish, publish_availability
+from routes import open_loan, close_loan, notify_checkout, notify_return, log_audit
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+SYNCED_MODELS = {Student: 'students', Equipment: 'equipment'}
+
+_hooks_registered = False
+
+
+class OperationRejected(Exception):
+    """An operation that cannot be applied; status is 'conflict' or 'invalid'"""
+    
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+# ===== CHANGE TRACKING =====
+
+def _stamp_changes(session, flush_context, instances):
+    """Add a SyncChange for every student/equipment row this flush writes"""
+    changed = [obj for obj in session.new if type(obj) in SYNCED_MODELS]
+    changed += [obj for obj in session.dirty if type(obj) in SYNCED_MODELS and session.is_modified(obj)]
+    changed += [obj for obj in session.deleted if type(obj) in SYNCED_MODELS]
+    for obj in changed:
+        if obj.id is None:
+            obj.id = str(uuid4())
+        session.add(SyncChange(resource=SYNCED_MODELS[type(obj)], record_id=obj.id))
+
+
+def register_change_hooks():
+    global _hooks_registered
+    if _hooks_registered:
+        return
+    _hooks_registered = True
+    event.listen(db.session, 'before_flush', _stamp_changes)
+
+
+def prune_changes(config, now=None):
+    """Delete change stamps older than SYNC_RETENTION_HOURS; returns rows deleted (needs app context)"""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=config.get('SYNC_RETENTION_HOURS', 168))
+    deleted = db.session.execute(db.delete(SyncChange).where(SyncChange.created_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
+
+
+def changes_since(since, limit, gap_timeout):
+    """(students, equipment, deleted, version) for stamps after since, stopping before unsettled gaps"""
+    stamps = SyncChange.query.filter(SyncChange.version > since).order_by(SyncChange.version).limit(limit).all()
+    now = datetime.utcnow()
+    version = since
+    touched = {'students': set(), 'equipment': set()}
+    for stamp in stamps:
+        # A missing version may belong to a transaction that has not committed yet
+        if stamp.version != version + 1 and now - stamp.created_at < timedelta(seconds=gap_timeout):
+            break
+        version = stamp.version
+        touched[stamp.resource].add(stamp.record_id)
+    
+    rows = {}
+    deleted = {}
+    for model, name in SYNCED_MODELS.items():
+        ids = touched[name]
+        live = model.live().filter(model.id.in_(ids)).all() if ids else []
+        rows[name] = [row.to_dict() for row in live]
+        deleted[name] = sorted(ids - {row.id for row in live})
+    return rows['students'], rows['equipment'], deleted, version
+
+
+# ===== OPERATIONS =====
+
+def parse_timestamp(value, name):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None) if value else None
+    except (AttributeError, ValueError):
+        raise OperationRejected('invalid', f'{name} must be an ISO timestamp')
+
+
+def find_equipment(op):
+    if op.get('serial_number'):
+        equipment = Equipment.live().filter_by(serial_number=op['serial_number']).first()
+    else:
+        equipment = Equipment.get_live(op.get('equipment_id'))
+    if not equipment:
+        raise OperationRejected('invalid', 'Equipment not found')
+    return equipment
+
+
+def find_student(op):
+    student = Student.get_live(op.get('student_id'))
+    if not student:
+        raise OperationRejected('invalid', 'Student not found')
+    return student
+
+
+def apply_checkout(op, at):
+    student, equipment = find_student(op), find_equipment(op)
+    try:
+        date_due = datetime.strptime(op.get('date_due') or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise OperationRejected('invalid', 'date_due must be YYYY-MM-DD')
+    if date_due < at.date():
+        raise OperationRejected('invalid', 'date_due is before the checkout')
+    if equipment.availability_status != 'Available':
+        active = Loan.query.filter_by(equipment_id=equipment.id, status='Borrowed').first()
+        raise OperationRejected('conflict', 'Equipment is not available', equipment=equipment.to_dict(),
+                                active_loan=active.to_dict() if active else None)
+    loan = open_loan(student, equipment, date_due, borrowed_on=at.date())
+    return {'loan': loan.to_dict()}, lambda: notify_checkout(loan)
+
+
+def apply_return(op, at):
+    equipment = find_equipment(op)
+    loan = Loan.query.filter_by(equipment_id=equipment.id, status='Borrowed').first()
+    if not loan:
+        raise OperationRejected('conflict', 'Equipment is not on loan', equipment=equipment.to_dict())
+    if op.get('loan_id') and op['loan_id'] != loan.id:
+        raise OperationRejected('conflict', 'Equipment is on a different loan', active_loan=loan.to_dict())
+    if loan.date_borrowed > at.date():
+        raise OperationRejected('conflict', 'Equipment was lent out again after this return',
+                                active_loan=loan.to_dict())
+    detail = close_loan(loan, returned_on=at.date())
+    db.session.flush()
+    return {'loan': loan.to_dict(), 'fine': detail.to_dict()}, lambda: notify_return(loan, detail)
+
+
+def apply_damage(op, at):
+    student, equipment = find_student(op), find_equipment(op)
+    if op.get('damage_type') not in ('Damage', 'Lost'):
+        raise OperationRejected('invalid', 'damage_type must be Damage or Lost')
+    damage_log = DamageLog(
+        equipment_id=equipment.id,
+        student_id=student.id,
+        loan_id=op.get('loan_id'),
+        damage_type=op['damage_type'],
+        description=op.get('description', ''),
+        reported_by=current_user.username,
+        repair_cost=op.get('repair_cost', 0),
+        replacement_cost=op.get('replacement_cost', 0),
+        created_at=at
+    )
+    
+    # Update equipment status if lost
+    if op['damage_type'] == 'Lost':
+        equipment.availability_status = 'Lost'
+        equipment.condition = 'Lost'
+    else:
+        equipment.condition = 'Damaged'
+    
+    db.session.add(damage_log)
+    db.session.flush()
+    publish('damage_log.changed', damage_log_id=damage_log.id, equipment_id=damage_log.equipment_id,
+            damage_type=damage_log.damage_type, status=damage_log.status or 'Open')
+    if op['damage_type'] == 'Lost':
+        publish_availability(equipment)
+    return {'damage_log': damage_log.to_dict()}, lambda: log_audit(
+        'CREATE', 'DamageLog', damage_log.id, {'damage_type': damage_log.damage_type, 'kiosk_id': op.get('kiosk_id')})
+
+
+APPLIERS = {'checkout': apply_checkout, 'return': apply_return, 'damage': apply_damage}
+
+
+@sync_bp.route('/operations', methods=['POST'])
+@login_required
+@borrower_required
+def sync_operations():
+    """Apply an ordered batch of offline kiosk operations in one transaction"""
+    data = request.get_json() or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > current_app.config.get('SYNC_MAX_OPERATIONS', 500):
+        return jsonify({'error': f"At most {current_app.config.get('SYNC_MAX_OPERATIONS', 500)} operations per batch"}), 400
+    if not all(isinstance(op, dict) and op.get('id') for op in operations):
+        return jsonify({'error': 'Every operation needs an id'}), 400
+    
+    ids = [str(op['id']) for op in operations]
+    stored = {row.id: row for row in KioskOperation.query.filter(KioskOperation.id.in_(ids)).all()}
+    max_skew = timedelta(seconds=current_app.config.get('SYNC_MAX_CLOCK_SKEW', 300))
+    results = []
+    notifications = []
+    
+    try:
+        for op_id, op in zip(ids, operations):
+            previous = stored.get(op_id)
+            if previous is not None:
+                results.append({**previous.result, 'status': 'duplicate', 'original_status': previous.status})
+                continue
+            
+            at = None
+            try:
+                apply = APPLIERS.get(op.get('type'))
+                if apply is None:
+                    raise OperationRejected('invalid', f"type must be one of: {', '.join(APPLIERS)}")
+                at = parse_timestamp(op.get('at'), 'at') or datetime.utcnow()
+                if at > datetime.utcnow() + max_skew:
+                    raise OperationRejected('invalid', 'at is in the future')
+                details, notify = apply({**op, 'kiosk_id': data.get('kiosk_id')}, at)
+                notifications.append(notify)
+                status = 'applied'
+            except OperationRejected as e:
+                status = e.status
+                details = {'error': str(e), **e.details}
+            
+            result = {'id': op_id, 'type': op.get('type'), 'status': status, **details}
+            stored[op_id] = KioskOperation(id=op_id, kiosk_id=data.get('kiosk_id'), op_type=str(op.get('type')),
+                                           status=status, result=result, client_at=at)
+            db.session.add(stored[op_id])
+            results.append(result)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    
+    for notify in notifications:
+        notify()
+    
+    version = db.session.query(db.func.max(SyncChange.version)).scalar() or 0
+    return jsonify({'results': results, 'version': version}), 200
+
+
+# ===== DELTA FEED =====
+
+@sync_bp.route('/changes', methods=['GET'])
+@login_required
+def sync_changes():
+    """Students and equipment changed after ?since=<version> (full snapshot without it)"""
+    since = request.args.get('since', type=int)
+    config = current_app.config
+    horizon = (db.session.query(db.func.min(SyncChange.version)).scalar() or 1) - 1
+    latest = db.session.query(db.func.max(SyncChange.version)).scalar() or 0
+    
+    if since is None or since < horizon or since > latest:
+        return jsonify({
+            'reset': True,
+            'version': latest,
+            'students': [s.to_dict() for s in Student.live().all()],
+            'equipment': [e.to_dict() for e in Equipment.live().all()],
+            'deleted': {'students': [], 'equipment': []},
+            'has_more': False
+        }), 200
+    
+    limit = config.get('SYNC_CHANGES_LIMIT', 1000)
+    students, equipment, deleted, version = changes_since(since, limit, config.get('SYNC_GAP_SECONDS', 5))
+    return jsonify({
+        'reset': False,
+        'version': version,
+        'students': students,
+        'equipment': equipment,
+        'deleted': deleted,
+        'has_more': version < latest
+    }), 200
+
+
+def init_kiosk_sync(app):
+    """Register /api/sync and stamp student/equipment writes for the delta feed"""
+    app.register_blueprint(sync_bp)
+    register_change_hooks()
@@ -0,0 +1,172 @@
+"""DB-backed leader election for singleton background work.
+
+Every worker process runs a small elector thread, but only the process holding
+the lease runs the scheduler. On PostgreSQL the lease is a session-level
+advisory lock held on a dedicated connection (released automatically if the
+process or connection dies). Elsewhere (SQLite) it is a row in
+``scheduler_leases`` with an expiry that the leader keeps pushing forward.
+"""
+import os
+import socket
+import threading
+import zlib
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import text, update, insert, or_
+from sqlalchemy.exc import IntegrityError
+from models import SchedulerLease
+
+
+def make_holder_id():
+    """Identify this process for lease ownership"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+class AdvisoryLockLease:
+    """PostgreSQL advisory lock held on a dedicated connection"""
+    
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.name = name
+        self.key = zlib.crc32(name.encode()) & 0x7fffffff
+        self.conn = None
+    
+    def acquire(self):
+        self.conn = self.engine.connect()
+        try:
+            acquired = self.conn.execute(
+                text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}
+            ).scalar()
+            self.conn.commit()
+        except Exception:
+            self._close()
+            raise
+        if not acquired:
+            self._close()
+        return bool(acquired)
+    
+    def renew(self):
+        # The lock lives as long as the session; just make sure it's still alive
+        try:
+            self.conn.execute(text('SELECT 1'))
+            self.conn.commit()
+            return True
+        except Exception:
+            self._close()
+            raise
+    
+    def release(self):
+        if self.conn is None:
+            return
+        try:
+            self.conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.key})
+            self.conn.commit()
+        finally:
+            self._close()
+    
+    def _close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+class TableLease:
+    """Expiring lease row in scheduler_leases"""
+    
+    def __init__(self, engine, name, holder, ttl):
+        self.engine = engine
+        self.name = name
+        self.holder = holder
+        self.ttl = timedelta(seconds=ttl)
+        self.table = SchedulerLease.__table__
+    
+    def acquire(self):
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(self.table)
+                .where(self.table.c.name == self.name)
+                .where(or_(self.table.c.holder == self.holder, self.table.c.expires_at < now))
+                .values(holder=self.holder, acquired_at=now, expires_at=now + self.ttl)
+            )
+            if result.rowcount:
+                return True
+        
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(self.table).values(
+                    name=self.name, holder=self.holder, acquired_at=now, expires_at=now + self.ttl
+                ))
+            return True
+        except IntegrityError:
+            # Someone else holds an unexpired lease
+            return False
+    
+    def renew(self):
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(self.table)
+                .where(self.table.c.name == self.name, self.table.c.holder == self.holder)
+                .values(expires_at=datetime.utcnow() + self.ttl)
+            )
+            return result.rowcount == 1
+    
+    def release(self):
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(self.table)
+                .where(self.table.c.name == self.name, self.table.c.holder == self.holder)
+                .values(expires_at=datetime.utcnow())
+            )
+
+
+def create_lease(engine, name, ttl, holder=None):
+    """Pick the lease strategy for the engine's database"""
+    if engine.dialect.name == 'postgresql':
+        return AdvisoryLockLease(engine, name)
+    return TableLease(engine, name, holder or make_holder_id(), ttl)
+
+
+class LeaderElector(threading.Thread):
+    """Background thread that acquires, renews and fails over a lease"""
+    
+    def __init__(self, lease, on_elected, on_demoted, interval):
+        super().__init__(name=f'leader-elector-{lease.name}', daemon=True)
+        self.lease = lease
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.interval = interval
+        self.is_leader = False
+        self._stopped = threading.Event()
+    
+    def run(self):
+        wait = 0
+        while not self._stopped.wait(wait):
+            wait = self.interval
+            try:
+                held = self.lease.renew() if self.is_leader else self.lease.acquire()
+            except Exception as e:
+                print(f"Leader election error for {self.lease.name}: {str(e)}")
+                held = False
+            
+            if held and not self.is_leader:
+                self.is_leader = True
+                self.on_elected()
+            elif not held and self.is_leader:
+                self.is_leader = False
+                self.on_demoted()
+    
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive():
+            self.join(timeout=self.interval + 5)
+        if self.is_leader:
+            self.is_leader = False
+            self.on_demoted()
+            try:
+                self.lease.release()
+            except Exception as e:
+                print(f"Error releasing lease {self.lease.name}: {str(e)}")
@@ -6,7 +6,8 @@ from datetime import datetime, timedelta, timezone
 
 def load_sample_data():
     """Load sample data into the database"""
-    app = create_app('development')
+    # No scheduler needed for a one-off data load
+    app = create_app('development', {'SCHEDULER_ENABLED': False})
     
     with app.app_context():
         # Clear existing data (optional)
@@ -0,0 +1,138 @@
+"""Archival of closed loans to history tables.
+
+Returned loans older than LOAN_ARCHIVE_AFTER_DAYS are moved, in batches, from
+``loans`` into ``loan_history`` together with their ``return_details`` rows
+(into ``return_details_history``) and email logs (into ``email_logs_archive``).
+Loans referenced by a damage log stay live so the damage record keeps its
+foreign key.
+
+Reports call ``loans_source(since, until)``, which reads only the live table
+when the requested range starts after the newest archived loan and a UNION
+ALL of live and history rows otherwise. ``return_details_source`` does the
+same for return details (and the fines assessed on them).
+
+Runs nightly from the scheduler; can also be run by hand:
+
+    python loan_archive.py
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from models import db, Loan, LoanHistory, ReturnDetail, ReturnDetailHistory, EmailLog, EmailLogArchive, DamageLog
+from log_retention import ensure_partition, month_start, add_months
+
+LOAN_COLUMNS = ['id', 'student_id', 'equipment_id', 'date_borrowed', 'date_due', 'date_returned', 'status', 'created_at']
+RETURN_DETAIL_COLUMNS = [c.name for c in ReturnDetailHistory.__table__.columns]
+EMAIL_LOG_COLUMNS = [c.name for c in EmailLogArchive.__table__.columns]
+
+
+def archivable_loan_ids(cutoff, limit):
+    """IDs of returned loans older than cutoff that can be moved"""
+    return [row[0] for row in db.session.execute(
+        db.select(Loan.id).where(
+            Loan.status == 'Returned',
+            Loan.date_returned < cutoff,
+            ~db.exists().where(DamageLog.loan_id == Loan.id)
+        ).limit(limit)
+    )]
+
+
+def _ensure_email_partitions(loan_ids):
+    oldest, newest = db.session.execute(
+        db.select(db.func.min(EmailLog.sent_at), db.func.max(EmailLog.sent_at)).where(EmailLog.loan_id.in_(loan_ids))
+    ).one()
+    if oldest is None:
+        return
+    month = month_start(oldest)
+    while month <= month_start(newest):
+        ensure_partition(EmailLogArchive, month)
+        month = add_months(month, 1)
+
+
+def archive_batch(loan_ids):
+    """Move one batch of loans and their dependent rows in a single transaction"""
+    _ensure_email_partitions(loan_ids)
+    db.session.execute(db.insert(LoanHistory).from_select(
+        LOAN_COLUMNS, db.select(*[getattr(Loan, c) for c in LOAN_COLUMNS]).where(Loan.id.in_(loan_ids))))
+    db.session.execute(db.insert(ReturnDetailHistory).from_select(
+        RETURN_DETAIL_COLUMNS,
+        db.select(*[getattr(ReturnDetail, c) for c in RETURN_DETAIL_COLUMNS]).where(ReturnDetail.loan_id.in_(loan_ids))))
+    db.session.execute(db.insert(EmailLogArchive).from_select(
+        EMAIL_LOG_COLUMNS,
+        db.select(*[getattr(EmailLog, c) for c in EMAIL_LOG_COLUMNS]).where(EmailLog.loan_id.in_(loan_ids))))
+    
+    db.session.execute(db.delete(EmailLog).where(EmailLog.loan_id.in_(loan_ids)))
+    db.session.execute(db.delete(ReturnDetail).where(ReturnDetail.loan_id.in_(loan_ids)))
+    db.session.execute(db.delete(Loan).where(Loan.id.in_(loan_ids)))
+    db.session.commit()
+
+
+def archive_loans(config, today=None):
+    """Archive returned loans past the configured age; returns a summary (needs app context)"""
+    today = today or datetime.utcnow().date()
+    cutoff = today - timedelta(days=config.get('LOAN_ARCHIVE_AFTER_DAYS', 365))
+    batch_size = config.get('LOAN_ARCHIVE_BATCH_SIZE', 1000)
+    
+    archived = 0
+    while True:
+        loan_ids = archivable_loan_ids(cutoff, batch_size)
+        if not loan_ids:
+            break
+        archive_batch(loan_ids)
+        archived += len(loan_ids)
+    
+    return {
+        'archived_loans': archived,
+        'cutoff': cutoff.isoformat(),
+        'live_loans': db.session.query(db.func.count(Loan.id)).scalar(),
+        'history_loans': db.session.query(db.func.count(LoanHistory.id)).scalar()
+    }
+
+
+def history_horizon():
+    """date_borrowed of the newest archived loan, or None when nothing is archived"""
+    return db.session.query(db.func.max(LoanHistory.date_borrowed)).scalar()
+
+
+def needs_history(since=None):
+    """Whether a date range starting at since can include archived loans"""
+    horizon = history_horizon()
+    return horizon is not None and (since is None or since <= horizon)
+
+
+def loans_source(since=None, until=None):
+    """Subquery of loans borrowed in [since, until), unioned with history only when the range needs it"""
+    def branch(model):
+        query = db.select(*[getattr(model, c) for c in LOAN_COLUMNS])
+        if since:
+            query = query.where(model.date_borrowed >= since)
+        if until:
+            query = query.where(model.date_borrowed < until)
+        return query
+    
+    if needs_history(since):
+        return db.union_all(branch(Loan), branch(LoanHistory)).subquery('all_loans')
+    return branch(Loan).subquery('all_loans')
+
+
+def return_details_source(since=None, until=None):
+    """Subquery of return details created in [since, until), unioned with history only when the range needs it"""
+    def branch(model):
+        query = db.select(*[getattr(model, c) for c in RETURN_DETAIL_COLUMNS])
+        if since:
+            query = query.where(model.created_at >= datetime.combine(since, datetime.min.time()))
+        if until:
+            query = query.where(model.created_at < datetime.combine(until, datetime.min.time()))
+        return query
+    
+    newest_archived = db.session.query(db.func.max(ReturnDetailHistory.created_at)).scalar()
+    if newest_archived is not None and (since is None or datetime.combine(since, datetime.min.time()) <= newest_archived):
+        return db.union_all(branch(ReturnDetail), branch(ReturnDetailHistory)).subquery('all_return_details')
+    return branch(ReturnDetail).subquery('all_return_details')
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app(os.getenv('FLASK_ENV', 'development'), {'SCHEDULER_ENABLED': False})
+    with app.app_context():
+        print(json.dumps(archive_loans(app.config), indent=2))
@@ -0,0 +1,206 @@
+"""Monthly partitioning and retention for audit and email logs.
+
+The hot tables (``audit_logs``, ``email_logs``) keep only the current month
+plus LOG_HOT_MONTHS before it. Older months are moved into the archive tables,
+which are natively range-partitioned by month on PostgreSQL (one child table
+per month, created on demand) and plain indexed tables on SQLite.
+
+Months older than LOG_RETENTION_MONTHS are compacted: written to
+``<LOG_ARCHIVE_DIR>/<table>-<YYYY-MM>.jsonl.gz`` and then removed from the
+database (a partition DROP on PostgreSQL, a range DELETE elsewhere).
+
+Runs nightly from the scheduler; can also be run by hand:
+
+    python log_retention.py
+"""
+import base64
+import binascii
+import gzip
+import json
+import os
+from datetime import date, datetime
+from models import db, AuditLog, AuditLogArchive, EmailLog, EmailLogArchive
+
+# (hot model, archive model, timestamp column)
+LOG_TABLES = [
+    (AuditLog, AuditLogArchive, 'created_at'),
+    (EmailLog, EmailLogArchive, 'sent_at'),
+]
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bounds(month):
+    return datetime.combine(month, datetime.min.time()), datetime.combine(add_months(month, 1), datetime.min.time())
+
+
+def _months_before(model, column, cutoff):
+    """First day of each month with rows in model older than cutoff"""
+    oldest = db.session.query(db.func.min(getattr(model, column))).scalar()
+    if oldest is None:
+        return []
+    months = []
+    month = month_start(oldest)
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def _is_postgresql():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def partition_name(archive, month):
+    return f"{archive.__tablename__}_{month.strftime('%Y_%m')}"
+
+
+def ensure_partition(archive, month):
+    """Create the archive partition for a month on PostgreSQL (no-op elsewhere)"""
+    if not _is_postgresql():
+        return
+    start, end = _bounds(month)
+    db.session.execute(db.text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(archive, month)} PARTITION OF {archive.__tablename__} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+def archive_month(model, archive, column, month):
+    """Move one month of rows from the hot table into the archive; returns rows moved"""
+    start, end = _bounds(month)
+    timestamp = getattr(model, column)
+    columns = [c.name for c in archive.__table__.columns]
+    
+    ensure_partition(archive, month)
+    db.session.execute(db.insert(archive).from_select(
+        columns,
+        db.select(*[getattr(model, name) for name in columns]).where(timestamp >= start, timestamp < end)
+    ))
+    moved = db.session.execute(db.delete(model).where(timestamp >= start, timestamp < end)).rowcount
+    db.session.commit()
+    return moved
+
+
+def compact_month(archive, column, month, archive_dir):
+    """Write one archived month to a gzipped JSONL file and remove it from the database"""
+    start, end = _bounds(month)
+    timestamp = getattr(archive, column)
+    path = os.path.join(archive_dir, f"{archive.__tablename__.replace('_archive', '')}-{month.strftime('%Y-%m')}.jsonl.gz")
+    if os.path.exists(path):
+        # Late rows for a month already compacted get their own file
+        path = path.replace('.jsonl.gz', f"-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.jsonl.gz")
+    
+    rows = 0
+    tmp_path = f'{path}.tmp'
+    result = db.session.execute(
+        db.select(archive.__table__).where(timestamp >= start, timestamp < end).order_by(timestamp)
+        .execution_options(yield_per=1000))
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        for row in result:
+            f.write(json.dumps(dict(row._mapping), default=str) + '\n')
+            rows += 1
+    
+    if rows == 0:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    
+    if _is_postgresql():
+        db.session.execute(db.text(f'DROP TABLE IF EXISTS {partition_name(archive, month)}'))
+    else:
+        db.session.execute(db.delete(archive).where(timestamp >= start, timestamp < end))
+    db.session.commit()
+    return rows, path if rows else None
+
+
+def encode_cursor(created_at, log_id):
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{log_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError when malformed"""
+    try:
+        created_at, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(created_at), log_id
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def fetch_audit_logs(table_name=None, action=None, record_id=None, since=None, until=None,
+                     cursor=None, limit=100):
+    """Newest-first audit logs across the hot table and archive; returns (rows, next_cursor)
+    
+    Keyset pagination on (created_at, id). The hot table only holds rows newer
+    than the archive, so it is read first and the archive only when the page
+    isn't full yet.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    rows = []
+    for model in (AuditLog, AuditLogArchive):
+        query = model.query
+        if table_name:
+            query = query.filter(model.table_name == table_name)
+        if action:
+            query = query.filter(model.action == action)
+        if record_id:
+            query = query.filter(model.record_id == record_id)
+        if since:
+            query = query.filter(model.created_at >= since)
+        if until:
+            query = query.filter(model.created_at < until)
+        if after:
+            query = query.filter(db.tuple_(model.created_at, model.id) < after)
+        # One extra row tells us whether there is a next page
+        rows.extend(query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1 - len(rows)).all())
+        if len(rows) > limit:
+            break
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def run_log_maintenance(config, today=None):
+    """Archive months past the hot window and compact months past retention (needs app context)"""
+    today = today or datetime.utcnow().date()
+    current = month_start(today)
+    hot_cutoff = add_months(current, -config.get('LOG_HOT_MONTHS', 1))
+    retention_cutoff = add_months(current, -config.get('LOG_RETENTION_MONTHS', 12))
+    archive_dir = config.get('LOG_ARCHIVE_DIR', 'log_archive')
+    os.makedirs(archive_dir, exist_ok=True)
+    
+    summary = {}
+    for model, archive, column in LOG_TABLES:
+        moved = 0
+        for month in _months_before(model, column, hot_cutoff):
+            moved += archive_month(model, archive, column, month)
+        
+        compacted = []
+        for month in _months_before(archive, column, retention_cutoff):
+            rows, path = compact_month(archive, column, month, archive_dir)
+            if rows:
+                compacted.append({'month': month.strftime('%Y-%m'), 'rows': rows, 'file': path})
+        
+        summary[model.__tablename__] = {
+            'archived_rows': moved,
+            'compacted': compacted,
+            'hot_rows': db.session.query(db.func.count()).select_from(model).scalar()
+        }
+    return summary
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app(os.getenv('FLASK_ENV', 'development'), {'SCHEDULER_ENABLED': False})
+    with app.app_context():
+        print(json.dumps(run_log_maintenance(app.config), indent=2))
@@ -0,0 +1,300 @@
+"""Prometheus-format metrics with multi-process aggregation.
+
+Each worker process keeps its counters, histograms and gauges in memory and
+periodically writes them to ``<METRICS_DIR>/metrics-<pid>.json``. A scrape of
+``/metrics`` on any worker merges every process file: counters and histogram
+buckets are summed, "max" gauges (e.g. last-success timestamps) take the
+largest value, and "live" gauges (e.g. pool stats) are reported per pid for
+processes that are still running. Business gauges are read from the database
+at scrape time.
+
+Clear METRICS_DIR when deploying so counters from a previous release don't
+carry over.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from flask import Blueprint, Response, g, request
+from models import db, Loan, Equipment
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_INFO = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint, method and status'),
+    'email_send_duration_seconds': ('histogram', 'Time spent sending email through SMTP'),
+    'email_send_failures_total': ('counter', 'Emails that failed to send'),
+    'scheduler_job_duration_seconds': ('histogram', 'Scheduled job run time'),
+    'scheduler_job_failures_total': ('counter', 'Scheduled job runs that raised an error'),
+    'scheduler_job_last_success_timestamp_seconds': ('gauge', 'Unix time of the last successful job run'),
+    'db_pool_size': ('gauge', 'Configured connection pool size per worker'),
+    'db_pool_checked_out': ('gauge', 'Connections currently checked out per worker'),
+    'db_pool_overflow': ('gauge', 'Overflow connections currently open per worker'),
+    'active_loans': ('gauge', 'Loans currently borrowed'),
+    'overdue_loans': ('gauge', 'Borrowed loans past their due date'),
+    'available_equipment': ('gauge', 'Equipment currently available to borrow'),
+    'cache_hits_total': ('counter', 'In-process cache hits by cache'),
+    'cache_misses_total': ('counter', 'In-process cache misses by cache'),
+    'single_flight_requests_total': ('counter', 'Coalesced endpoint requests by outcome (miss, shared, hit, stale)'),
+    'cache_invalidation_lag_seconds': ('histogram', 'Time from publishing a cache eviction to another worker applying it'),
+    'report_job_duration_seconds': ('histogram', 'Report job run time by report and outcome'),
+    'autocomplete_index_build_seconds': ('histogram', 'Time to build an autocomplete prefix index'),
+    'scan_to_action_seconds': ('histogram', 'Time from a serial number scan to the checkout or return it led to'),
+    'response_bytes_total': ('counter', 'Compressed response bytes before (uncompressed) and after (sent) compression by encoding'),
+    'idempotent_requests_total': ('counter', 'Requests carrying an Idempotency-Key by outcome (stored, replayed, in_progress, mismatch)'),
+}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted((labels or {}).items())))
+
+
+class MetricsRegistry:
+    """In-process metric values, flushed to a per-process file"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.dirty = False
+    
+    def inc(self, name, labels=None, amount=1):
+        with self.lock:
+            key = _key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self.dirty = True
+    
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS):
+        with self.lock:
+            key = _key(name, labels)
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(hist['buckets']):
+                if value <= bound:
+                    hist['counts'][i] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+            self.dirty = True
+    
+    def set_gauge(self, name, value, labels=None, mode='max'):
+        with self.lock:
+            self.gauges[_key(name, labels)] = {'value': value, 'mode': mode}
+            self.dirty = True
+    
+    def snapshot(self):
+        with self.lock:
+            self.dirty = False
+            return {
+                'pid': os.getpid(),
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), hist] for (name, labels), hist in self.histograms.items()],
+                'gauges': [[name, list(labels), gauge] for (name, labels), gauge in self.gauges.items()],
+            }
+
+
+registry = MetricsRegistry()
+metrics_bp = Blueprint('metrics', __name__)
+_metrics_dir = None
+_flusher = None
+
+
+def inc(name, labels=None, amount=1):
+    registry.inc(name, labels, amount)
+
+
+def observe(name, value, labels=None):
+    registry.observe(name, value, labels)
+
+
+def set_gauge(name, value, labels=None, mode='max'):
+    registry.set_gauge(name, value, labels, mode)
+
+
+def observe_job(job, duration, success):
+    """Record a scheduled job run"""
+    observe('scheduler_job_duration_seconds', duration, {'job': job})
+    if success:
+        set_gauge('scheduler_job_last_success_timestamp_seconds', time.time(), {'job': job})
+    else:
+        inc('scheduler_job_failures_total', {'job': job})
+
+
+def flush():
+    """Write this process's metrics to its file in METRICS_DIR"""
+    if _metrics_dir is None:
+        return
+    path = os.path.join(_metrics_dir, f'metrics-{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def collect():
+    """Merge metrics from every process file"""
+    flush()
+    counters, histograms, gauges = {}, {}, {}
+    paths = [os.path.join(_metrics_dir, name) for name in os.listdir(_metrics_dir)
+             if name.startswith('metrics-') and name.endswith('.json')] if _metrics_dir else []
+    
+    for path in paths:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _pid_alive(data['pid'])
+        
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        
+        for name, labels, hist in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = {'buckets': hist['buckets'], 'counts': list(hist['counts']),
+                                   'sum': hist['sum'], 'count': hist['count']}
+            else:
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], hist['counts'])]
+                merged['sum'] += hist['sum']
+                merged['count'] += hist['count']
+        
+        for name, labels, gauge in data['gauges']:
+            labels = tuple(map(tuple, labels))
+            if gauge['mode'] == 'live':
+                if alive:
+                    gauges[(name, labels + (('pid', str(data['pid'])),))] = gauge['value']
+            else:
+                key = (name, labels)
+                gauges[key] = max(gauges.get(key, gauge['value']), gauge['value'])
+    
+    return counters, histograms, gauges
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def render(counters, histograms, gauges):
+    """Render merged metrics in the Prometheus text exposition format"""
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(f'{name}{_format_labels(labels)} {value}')
+    for (name, labels), hist in histograms.items():
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(hist['buckets'], hist['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels, {"le": bound})} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels, {"le": "+Inf"})} {hist["count"]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {hist["sum"]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {hist["count"]}')
+    for (name, labels), value in gauges.items():
+        by_name.setdefault(name, []).append(f'{name}{_format_labels(labels)} {value}')
+    
+    output = []
+    for name in sorted(by_name):
+        metric_type, help_text = METRIC_INFO.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {metric_type}')
+        output.extend(by_name[name])
+    return '\n'.join(output) + '\n'
+
+
+def business_gauges():
+    """Gauges computed from the database at scrape time"""
+    today = datetime.utcnow().date()
+    active = db.session.query(db.func.count(Loan.id)).filter(Loan.status == 'Borrowed').scalar()
+    overdue = db.session.query(db.func.count(Loan.id)).filter(
+        Loan.status == 'Borrowed', Loan.date_due < today).scalar()
+    available = db.session.query(db.func.count(Equipment.id)).filter(
+        Equipment.availability_status == 'Available', Equipment.deleted_at.is_(None)).scalar()
+    return {('active_loans', ()): active, ('overdue_loans', ()): overdue, ('available_equipment', ()): available}
+
+
+def sample_pool_stats(engine):
+    pool = engine.pool
+    for name, attr in (('db_pool_size', 'size'), ('db_pool_checked_out', 'checkedout'), ('db_pool_overflow', 'overflow')):
+        stat = getattr(pool, attr, None)
+        if callable(stat):
+            set_gauge(name, stat(), mode='live')
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    sample_pool_stats(db.engine)
+    counters, histograms, gauges = collect()
+    gauges.update(business_gauges())
+    return Response(render(counters, histograms, gauges), mimetype='text/plain; version=0.0.4')
+
+
+class _Flusher(threading.Thread):
+    """Writes dirty metrics to disk every interval"""
+    
+    def __init__(self, engine, interval):
+        super().__init__(name='metrics-flusher', daemon=True)
+        self.engine = engine
+        self.interval = interval
+    
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                sample_pool_stats(self.engine)
+                if registry.dirty:
+                    flush()
+            except Exception as e:
+                print(f"Error flushing metrics: {str(e)}")
+
+
+def init_metrics(app):
+    """Register /metrics, request latency tracking and the flusher thread"""
+    global _metrics_dir, _flusher
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    
+    _metrics_dir = app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'equipment_loan_metrics')
+    os.makedirs(_metrics_dir, exist_ok=True)
+    app.register_blueprint(metrics_bp)
+    
+    @app.before_request
+    def start_request_timer():
+        g._metrics_started = time.perf_counter()
+    
+    @app.after_request
+    def record_request_latency(response):
+        started = g.get('_metrics_started')
+        if started is not None and request.endpoint != 'metrics.metrics_endpoint':
+            observe('http_request_duration_seconds', time.perf_counter() - started, {
+                'endpoint': request.endpoint or 'unmatched',
+                'method': request.method,
+                'status': str(response.status_code)
+            })
+        return response
+    
+    if _flusher is None:
+        with app.app_context():
+            engine = db.engine
+        _flusher = _Flusher(engine, app.config.get('METRICS_FLUSH_INTERVAL', 5))
+        _flusher.start()
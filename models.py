@@ -2,10 +2,36 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from uuid import uuid4
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import hash_password, verify_password, needs_rehash
 
 db = SQLAlchemy()
 
+class SoftDeleteMixin:
+    """Rows are hidden by setting deleted_at; the purge job removes them later"""
+    deleted_at = db.Column(db.DateTime, index=True)
+    # Unique columns rewritten on soft delete so a new row can reuse the value
+    released_on_delete = ()
+    
+    @classmethod
+    def live(cls):
+        """Query excluding soft-deleted rows"""
+        return cls.query.filter(cls.deleted_at.is_(None))
+    
+    @classmethod
+    def get_live(cls, id):
+        """Row by primary key, or None if missing or soft-deleted"""
+        row = db.session.get(cls, id)
+        return row if row is not None and row.deleted_at is None else None
+    
+    def soft_delete(self):
+        self.deleted_at = datetime.utcnow()
+        suffix = f'#deleted-{self.id}'
+        for name in self.released_on_delete:
+            value = getattr(self, name)
+            if value:
+                length = getattr(type(self), name).type.length
+                setattr(self, name, value[:length - len(suffix)] + suffix)
+
 class User(UserMixin, db.Model):
     """User model for authentication (admin, staff, borrower)"""
     __tablename__ = 'users'
@@ -26,11 +52,15 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Check if the stored hash uses outdated hash parameters"""
+        return needs_rehash(self.password_hash)
     
     def is_admin(self):
         """Check if user is admin"""
@@ -63,8 +93,9 @@ class User(UserMixin, db.Model):
             'status': self.status
         }
 
-class Student(db.Model):
+class Student(SoftDeleteMixin, db.Model):
     __tablename__ = 'students'
+    released_on_delete = ('email',)
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid4()))
     first_name = db.Column(db.String(100), nullable=False)
@@ -92,8 +123,9 @@ class Student(db.Model):
             'status': self.status
         }
 
-class Equipment(db.Model):
+class Equipment(SoftDeleteMixin, db.Model):
     __tablename__ = 'equipment'
+    released_on_delete = ('serial_number',)
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid4()))
     name = db.Column(db.String(200), nullable=False)
@@ -122,6 +154,10 @@ class Equipment(db.Model):
 
 class Loan(db.Model):
     __tablename__ = 'loans'
+    __table_args__ = (
+        db.Index('ix_loans_status_date_due', 'status', 'date_due'),
+        db.Index('ix_loans_equipment_status', 'equipment_id', 'status'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid4()))
     student_id = db.Column(db.String(36), db.ForeignKey('students.id'), nullable=False)
@@ -131,6 +167,9 @@ class Loan(db.Model):
     date_returned = db.Column(db.Date)
     status = db.Column(db.String(20), default='Borrowed')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Daily late-fine rate fixed at checkout, and the fine accrued so far (see fines.py)
+    fine_rate = db.Column(db.Float)
+    accrued_fine = db.Column(db.Float, default=0.0)
     
     email_logs = db.relationship('EmailLog', backref='loan', lazy=True, cascade='all, delete-orphan')
     
@@ -175,7 +214,7 @@ class EmailLog(db.Model):
     loan_id = db.Column(db.String(36), db.ForeignKey('loans.id'), nullable=False)
     recipient_email = db.Column(db.String(120), nullable=False)
     email_type = db.Column(db.String(50), nullable=False)
-    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     status = db.Column(db.String(20), default='sent')
     
     def __repr__(self):
@@ -193,6 +232,10 @@ class EmailLog(db.Model):
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_logs_created_at_id', 'created_at', 'id'),
+        db.Index('ix_audit_logs_record', 'table_name', 'record_id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid4()))
     action = db.Column(db.String(100), nullable=False)
@@ -227,7 +270,7 @@ class ReturnDetail(db.Model):
     late_fine = db.Column(db.Float, default=0.0)
     damage_fine = db.Column(db.Float, default=0.0)
     total_fine = db.Column(db.Float, default=0.0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<ReturnDetail {self.loan_id}>'
@@ -321,3 +364,275 @@ class Reservation(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'confirmed_at': self.confirmed_at.isoformat() if self.confirmed_at else None
         }
+
+class SchedulerLease(db.Model):
+    """Lease row deciding which worker process runs the scheduled jobs"""
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False)
+    acquired_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} held by {self.holder}>'
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'holder': self.holder,
+            'acquired_at': self.acquired_at.isoformat() if self.acquired_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class SchemaVersion(db.Model):
+    """Marker recording which schema fingerprint the database was created with"""
+    __tablename__ = 'schema_version'
+    
+    key = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.String(64), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaVersion {self.key}={self.version}>'
+
+class ChangeEvent(db.Model):
+    """Change notification written with the change itself and streamed over /api/events"""
+    __tablename__ = 'change_events'
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ChangeEvent {self.id} {self.event_type}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class CacheInvalidation(db.Model):
+    """Cache eviction message for the table transport of the invalidation bus (see cache_bus.py)"""
+    __tablename__ = 'cache_invalidations'
+    # Never reuse a pruned version: listeners only read versions above the last one they saw
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<CacheInvalidation {self.version}>'
+
+class SyncChange(db.Model):
+    """Version stamp of a student or equipment write, read by the kiosk delta feed (see kiosk_sync.py)"""
+    __tablename__ = 'sync_changes'
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    resource = db.Column(db.String(20), nullable=False)  # students, equipment
+    record_id = db.Column(db.String(36), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<SyncChange {self.version} {self.resource}:{self.record_id}>'
+
+class KioskOperation(db.Model):
+    """Offline kiosk operation applied by /api/sync, kept so replayed batches get the same result"""
+    __tablename__ = 'kiosk_operations'
+    
+    id = db.Column(db.String(64), primary_key=True)  # generated by the kiosk
+    kiosk_id = db.Column(db.String(100))
+    op_type = db.Column(db.String(20), nullable=False)  # checkout, return, damage
+    status = db.Column(db.String(20), nullable=False)  # applied, conflict, invalid
+    result = db.Column(db.JSON)
+    client_at = db.Column(db.DateTime)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<KioskOperation {self.id} {self.op_type} {self.status}>'
+
+class IdempotencyKey(db.Model):
+    """Claimed Idempotency-Key and, once the request finished, its stored response (see idempotency.py)"""
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(255), primary_key=True)  # caller:method:path:client key
+    request_hash = db.Column(db.String(64), nullable=False)
+    response_status = db.Column(db.Integer)  # None while the first request is running
+    response_body = db.Column(db.LargeBinary)
+    content_type = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} {self.response_status}>'
+
+class ReportSnapshot(db.Model):
+    """Report job and, once done, its result snapshot (see report_jobs.py)"""
+    __tablename__ = 'report_snapshots'
+    __table_args__ = (
+        db.Index('ix_report_snapshots_lookup', 'report', 'params_key', 'status'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid4()))
+    report = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON)
+    params_key = db.Column(db.String(255), nullable=False)  # params as sorted JSON
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    requested_by = db.Column(db.String(36), db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    generated_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)
+    
+    def __repr__(self):
+        return f'<ReportSnapshot {self.report} {self.status}>'
+    
+    def to_dict(self, include_result=False):
+        data = {
+            'id': self.id,
+            'report': self.report,
+            'params': self.params,
+            'status': self.status,
+            'error': self.error,
+            'requested_by': self.requested_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'generated_at': self.generated_at.isoformat() if self.generated_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+class AuditLogArchive(db.Model):
+    """Audit log rows moved out of the hot table (monthly partitions on PostgreSQL)"""
+    __tablename__ = 'audit_logs_archive'
+    __table_args__ = (
+        db.Index('ix_audit_logs_archive_created_at_id', 'created_at', 'id'),
+        db.Index('ix_audit_logs_archive_record', 'table_name', 'record_id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'}
+    )
+    
+    # created_at is part of the key because PostgreSQL requires the partition column in it
+    id = db.Column(db.String(36), primary_key=True)
+    created_at = db.Column(db.DateTime, primary_key=True)
+    action = db.Column(db.String(100), nullable=False)
+    table_name = db.Column(db.String(100), nullable=False)
+    record_id = db.Column(db.String(36))
+    details = db.Column(db.JSON)
+    
+    def __repr__(self):
+        return f'<AuditLogArchive {self.action} on {self.table_name}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'action': self.action,
+            'table_name': self.table_name,
+            'record_id': self.record_id,
+            'details': self.details,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class EmailLogArchive(db.Model):
+    """Email log rows moved out of the hot table (monthly partitions on PostgreSQL)"""
+    __tablename__ = 'email_logs_archive'
+    __table_args__ = (
+        db.Index('ix_email_logs_archive_loan_id', 'loan_id'),
+        {'postgresql_partition_by': 'RANGE (sent_at)'}
+    )
+    
+    # No foreign key to loans: archived logs may outlive the loan rows
+    id = db.Column(db.String(36), primary_key=True)
+    sent_at = db.Column(db.DateTime, primary_key=True)
+    loan_id = db.Column(db.String(36), nullable=False)
+    recipient_email = db.Column(db.String(120), nullable=False)
+    email_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='sent')
+    
+    def __repr__(self):
+        return f'<EmailLogArchive {self.email_type} to {self.recipient_email}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'loan_id': self.loan_id,
+            'recipient_email': self.recipient_email,
+            'email_type': self.email_type,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'status': self.status
+        }
+
+class LoanHistory(db.Model):
+    """Returned loans moved out of the live loans table by the archival job"""
+    __tablename__ = 'loan_history'
+    
+    # No foreign keys: history outlives deleted students and equipment
+    id = db.Column(db.String(36), primary_key=True)
+    student_id = db.Column(db.String(36), nullable=False, index=True)
+    equipment_id = db.Column(db.String(36), nullable=False, index=True)
+    date_borrowed = db.Column(db.Date, nullable=False, index=True)
+    date_due = db.Column(db.Date, nullable=False)
+    date_returned = db.Column(db.Date)
+    status = db.Column(db.String(20), default='Returned')
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    student = db.relationship('Student', primaryjoin='foreign(LoanHistory.student_id) == Student.id', viewonly=True)
+    equipment = db.relationship('Equipment', primaryjoin='foreign(LoanHistory.equipment_id) == Equipment.id', viewonly=True)
+    
+    def __repr__(self):
+        return f'<LoanHistory {self.id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'student': self.student.to_dict() if self.student else None,
+            'equipment': self.equipment.to_dict() if self.equipment else None,
+            'date_borrowed': self.date_borrowed.isoformat() if self.date_borrowed else None,
+            'date_due': self.date_due.isoformat() if self.date_due else None,
+            'date_returned': self.date_returned.isoformat() if self.date_returned else None,
+            'status': self.status,
+            'archived': True
+        }
+
+class ReturnDetailHistory(db.Model):
+    """Return details of archived loans"""
+    __tablename__ = 'return_details_history'
+    
+    id = db.Column(db.String(36), primary_key=True)
+    loan_id = db.Column(db.String(36), nullable=False, unique=True)
+    damage_status = db.Column(db.String(50), default='None')
+    damage_notes = db.Column(db.Text)
+    condition_on_return = db.Column(db.String(50), default='Good')
+    days_late = db.Column(db.Integer, default=0)
+    late_fine = db.Column(db.Float, default=0.0)
+    damage_fine = db.Column(db.Float, default=0.0)
+    total_fine = db.Column(db.Float, default=0.0)
+    created_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ReturnDetailHistory {self.loan_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'loan_id': self.loan_id,
+            'damage_status': self.damage_status,
+            'damage_notes': self.damage_notes,
+            'condition_on_return': self.condition_on_return,
+            'days_late': self.days_late,
+            'late_fine': self.late_fine,
+            'damage_fine': self.damage_fine,
+            'total_fine': self.total_fine,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,95 @@
+"""Off-thread password hashing with admission control.
+
+Werkzeug's scrypt/PBKDF2 run inside hashlib, which releases the GIL, so a
+small thread pool gives real parallelism without tying up every request
+worker during a login storm. Requests that cannot get a hashing slot within
+the admission timeout are rejected with 503 instead of piling up.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context, jsonify
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+
+_executor = None
+_slots = None
+_admission_timeout = 2.0
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing pool is saturated"""
+
+
+def get_hash_method():
+    """Return the configured password hash method"""
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+    return DEFAULT_HASH_METHOD
+
+
+@lru_cache(maxsize=8)
+def _normalized_method(method):
+    """Expand a method spec (e.g. 'pbkdf2') to the prefix Werkzeug stores"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def _run(func, *args):
+    """Run func on the hashing pool, or inline if the pool isn't set up"""
+    if _executor is None:
+        return func(*args)
+
+    if not _slots.acquire(timeout=_admission_timeout):
+        raise HashingBusyError('Password hashing capacity exceeded')
+    try:
+        future = _executor.submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _run(generate_password_hash, password, get_hash_method())
+
+
+def verify_password(pwhash, password):
+    """Check a password against a stored hash"""
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True if the stored hash was made with different parameters than configured"""
+    if not pwhash or '$' not in pwhash:
+        return True
+    return pwhash.split('$', 1)[0] != _normalized_method(get_hash_method())
+
+
+def init_password_hashing(app):
+    """Create the hashing pool and register the saturation handler"""
+    global _executor, _slots, _admission_timeout
+
+    workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+    queue_size = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 32)
+    _admission_timeout = app.config.get('PASSWORD_HASH_ADMISSION_TIMEOUT', 2.0)
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pwhash')
+        _slots = threading.BoundedSemaphore(workers + queue_size)
+
+    @app.errorhandler(HashingBusyError)
+    def handle_hashing_busy(e):
+        response = jsonify({'error': 'Server is busy, please try again shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+
+def shutdown_password_hashing():
+    """Shutdown the hashing pool"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
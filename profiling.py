@@ -0,0 +1,226 @@
+"""On-demand profiling for admin users.
+
+Single request: send ``X-Profile: pstats`` (or ``?_profile=pstats``) to run
+that request under cProfile, or ``collapsed`` to sample its stack into a
+flamegraph-ready folded-stack file. The dump is stored in PROFILE_DIR and
+named in the ``X-Profile-File`` response header; add ``X-Profile-Return: 1``
+(or ``&_profile_return=1``) to get the profile back instead of the normal
+response body.
+
+Sampling window: ``POST /api/admin/profiles/sample`` with ``{"seconds": N}``
+samples every thread in this worker for N seconds and writes one collapsed
+file. Under gunicorn each worker samples only itself, so repeat the call or
+use a single worker when profiling.
+
+Both are guarded by ``admin_required``.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import Blueprint, current_app, g, jsonify, request, send_from_directory, Response
+from flask_login import login_required
+from decorators import admin_required
+
+profiling_bp = Blueprint('profiling', __name__)
+
+PROFILE_MODES = ('pstats', 'collapsed')
+
+_sampling_lock = threading.Lock()
+_active_sampler = None
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """Folded stack string (root first) for a frame"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler(threading.Thread):
+    """Samples thread stacks at a fixed interval into folded-stack counts"""
+    
+    def __init__(self, interval, thread_ids=None, duration=None):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.duration = duration
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.output = None
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        self.started_at = time.time()
+        deadline = time.monotonic() + self.duration if self.duration else None
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids and thread_id not in self.thread_ids):
+                    continue
+                self.stacks[collapse_stack(frame)] += 1
+            self.samples += 1
+            if deadline and time.monotonic() >= deadline:
+                break
+        if self.output:
+            with open(self.output, 'w') as f:
+                f.write(self.collapsed())
+    
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+    
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def profile_dir():
+    path = current_app.config.get('PROFILE_DIR', 'profiles')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _profile_filename(label, extension):
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in label)
+    return f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}-{safe}.{extension}"
+
+
+def requested_profile_mode():
+    mode = request.headers.get('X-Profile') or request.args.get('_profile')
+    return mode.lower() if mode else None
+
+
+@admin_required
+def _start_request_profile(mode):
+    if mode not in PROFILE_MODES:
+        return jsonify({'error': f"Unknown profile mode '{mode}' (use {', '.join(PROFILE_MODES)})"}), 400
+    if mode == 'pstats':
+        g._profiler = cProfile.Profile()
+        g._profiler.enable()
+    else:
+        interval = current_app.config.get('PROFILE_SAMPLE_INTERVAL_MS', 1) / 1000
+        g._profiler = StackSampler(interval, thread_ids={threading.get_ident()})
+        g._profiler.start()
+    g._profile_mode = mode
+    return None
+
+
+def _finish_request_profile(response):
+    profiler = g.pop('_profiler')
+    mode = g.pop('_profile_mode')
+    label = request.endpoint or 'unmatched'
+    
+    if mode == 'pstats':
+        profiler.disable()
+        filename = _profile_filename(label, 'prof')
+        profiler.dump_stats(os.path.join(profile_dir(), filename))
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(60)
+        body = report.getvalue()
+    else:
+        profiler.stop()
+        filename = _profile_filename(label, 'collapsed')
+        body = profiler.collapsed()
+        with open(os.path.join(profile_dir(), filename), 'w') as f:
+            f.write(body)
+    
+    if request.headers.get('X-Profile-Return') == '1' or request.args.get('_profile_return') == '1':
+        response = Response(body, mimetype='text/plain')
+    response.headers['X-Profile-File'] = filename
+    return response
+
+
+@profiling_bp.route('/sample', methods=['POST'])
+@login_required
+@admin_required
+def start_sampling():
+    """Sample every thread in this worker for N seconds"""
+    global _active_sampler
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 30))
+        interval_ms = float(data.get('interval_ms', 5))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    
+    max_seconds = current_app.config.get('PROFILE_MAX_SECONDS', 300)
+    if not 0 < seconds <= max_seconds:
+        return jsonify({'error': f'seconds must be between 0 and {max_seconds}'}), 400
+    if interval_ms < 1:
+        return jsonify({'error': 'interval_ms must be at least 1'}), 400
+    
+    with _sampling_lock:
+        if _active_sampler is not None and _active_sampler.is_alive():
+            return jsonify({'error': 'A sampling profile is already running'}), 409
+        filename = _profile_filename(f'sample-{os.getpid()}', 'collapsed')
+        _active_sampler = StackSampler(interval_ms / 1000, duration=seconds)
+        _active_sampler.output = os.path.join(profile_dir(), filename)
+        _active_sampler.start()
+    
+    return jsonify({'message': 'Sampling started', 'file': filename, 'seconds': seconds, 'pid': os.getpid()}), 202
+
+
+@profiling_bp.route('/sample', methods=['GET'])
+@login_required
+@admin_required
+def sampling_status():
+    """Status of the current or last sampling profile in this worker"""
+    if _active_sampler is None:
+        return jsonify({'running': False}), 200
+    return jsonify({
+        'running': _active_sampler.is_alive(),
+        'file': os.path.basename(_active_sampler.output),
+        'samples': _active_sampler.samples,
+        'started_at': datetime.utcfromtimestamp(_active_sampler.started_at).isoformat() if _active_sampler.started_at else None
+    }), 200
+
+
+@profiling_bp.route('', methods=['GET'])
+@login_required
+@admin_required
+def list_profiles():
+    """List stored profiles, newest first"""
+    path = profile_dir()
+    files = sorted(os.listdir(path), reverse=True)
+    return jsonify([{'file': name, 'size': os.path.getsize(os.path.join(path, name))} for name in files]), 200
+
+
+@profiling_bp.route('/<filename>', methods=['GET'])
+@login_required
+@admin_required
+def download_profile(filename):
+    """Download a stored profile"""
+    return send_from_directory(os.path.abspath(profile_dir()), filename, as_attachment=True)
+
+
+def init_profiling(app):
+    """Register the per-request profiling hook and the profile endpoints"""
+    if not app.config.get('PROFILING_ENABLED', True):
+        return
+    
+    app.register_blueprint(profiling_bp, url_prefix='/api/admin/profiles')
+    
+    @app.before_request
+    def start_request_profile():
+        mode = requested_profile_mode()
+        if mode:
+            return _start_request_profile(mode)
+    
+    @app.after_request
+    def finish_request_profile(response):
+        if g.get('_profiler') is not None:
+            return _finish_request_profile(response)
+        return response
@@ -0,0 +1,67 @@
+"""Background hard purge of soft-deleted students and equipment.
+
+Deleting a student or device through the API only sets ``deleted_at``. When
+PURGE_DELETED_ENABLED is on, the nightly job removes rows soft-deleted more
+than PURGE_DELETED_AFTER_DAYS ago together with their loans, email logs,
+return details, damage logs and reservations. Everything is deleted with
+set-based DELETE statements in batches of PURGE_BATCH_SIZE loans, committing
+between batches, so no ORM cascade loads history into memory.
+
+Archived loans in ``loan_history`` have no foreign keys and are kept.
+
+    python purge.py
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from models import db, Student, Equipment, Loan, EmailLog, ReturnDetail, DamageLog, Reservation
+
+# (soft-deletable model, foreign key column name on dependent tables)
+PURGEABLE = [
+    (Student, 'student_id'),
+    (Equipment, 'equipment_id'),
+]
+
+
+def purge_model(model, fk, cutoff, batch_size):
+    """Hard-delete rows of model soft-deleted before cutoff; returns (rows, loans) purged"""
+    doomed = db.select(model.id).where(model.deleted_at < cutoff).scalar_subquery()
+    
+    loans = 0
+    while True:
+        loan_ids = [row[0] for row in db.session.execute(
+            db.select(Loan.id).where(getattr(Loan, fk).in_(doomed)).limit(batch_size))]
+        if not loan_ids:
+            break
+        db.session.execute(db.delete(EmailLog).where(EmailLog.loan_id.in_(loan_ids)))
+        db.session.execute(db.delete(ReturnDetail).where(ReturnDetail.loan_id.in_(loan_ids)))
+        db.session.execute(db.delete(DamageLog).where(DamageLog.loan_id.in_(loan_ids)))
+        db.session.execute(db.delete(Loan).where(Loan.id.in_(loan_ids)))
+        db.session.commit()
+        loans += len(loan_ids)
+    
+    db.session.execute(db.delete(DamageLog).where(getattr(DamageLog, fk).in_(doomed)))
+    db.session.execute(db.delete(Reservation).where(getattr(Reservation, fk).in_(doomed)))
+    rows = db.session.execute(db.delete(model).where(model.deleted_at < cutoff)).rowcount
+    db.session.commit()
+    return rows, loans
+
+
+def purge_deleted(config, now=None):
+    """Purge soft-deleted rows past the grace period; returns a summary (needs app context)"""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=config.get('PURGE_DELETED_AFTER_DAYS', 30))
+    batch_size = config.get('PURGE_BATCH_SIZE', 1000)
+    
+    summary = {'cutoff': cutoff.isoformat()}
+    for model, fk in PURGEABLE:
+        rows, loans = purge_model(model, fk, cutoff, batch_size)
+        summary[model.__tablename__] = {'purged': rows, 'loans_purged': loans}
+    return summary
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app(os.getenv('FLASK_ENV', 'development'), {'SCHEDULER_ENABLED': False})
+    with app.app_context():
+        print(json.dumps(purge_deleted(app.config), indent=2))
@@ -0,0 +1,184 @@
+"""Asynchronous report jobs with stored result snapshots.
+
+``POST /api/report-jobs`` with ``{"report": "overdue-loans", "params": {...}}``
+queues a job and returns its ID (202). A worker pool in the accepting process
+(REPORT_JOB_EXECUTOR=thread) computes the report and stores the result on the
+``report_snapshots`` row along with ``generated_at``. Clients poll
+``GET /api/report-jobs/<id>`` (``?wait=N`` holds the request until the job
+finishes, up to REPORT_JOB_MAX_WAIT seconds) or listen for
+``report_job.finished`` on ``/api/events``.
+
+The same report with the same params within REPORT_SNAPSHOT_TTL is answered
+straight from the last snapshot (200). A request that matches a job already
+queued or running gets that job. Send ``"refresh": true`` to force a new
+run. REPORT_JOB_EXECUTOR=inline computes inside the POST request, which is
+useful for development.
+"""
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user, login_required
+from models import db, ReportSnapshot
+from events import publish
+from tracing import span
+import metrics
+import reports
+
+report_jobs_bp = Blueprint('report_jobs', __name__, url_prefix='/api/report-jobs')
+
+ReportSpec = namedtuple('ReportSpec', 'build params required')
+
+
+def _user_activity(params):
+    since, until = reports.parse_date_range(params)
+    return reports.user_activity(params['user_id'], since, until)
+
+
+REPORTS = {
+    'overdue-loans': ReportSpec(lambda params: reports.overdue_loans(), (), ()),
+    'damage-summary': ReportSpec(lambda params: reports.damage_summary(), (), ()),
+    'user-activity': ReportSpec(_user_activity, ('user_id', 'from', 'to'), ('user_id',)),
+}
+
+_executor = None
+
+
+def normalize_params(name, params):
+    """Known, non-empty params of a report as strings (raises ValueError)"""
+    spec = REPORTS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown report '{name}'. Available: {', '.join(sorted(REPORTS))}")
+    params = {key: str(value) for key, value in (params or {}).items() if key in spec.params and value not in (None, '')}
+    missing = [key for key in spec.required if key not in params]
+    if missing:
+        raise ValueError(f"Missing params for {name}: {', '.join(missing)}")
+    reports.parse_date_range(params)
+    return params
+
+
+def submit(name, params, requested_by=None, refresh=False):
+    """(job, created) for a report request, reusing a fresh snapshot or a pending job"""
+    config = current_app.config
+    params = normalize_params(name, params)
+    params_key = json.dumps(params, sort_keys=True)
+    now = datetime.utcnow()
+    same = (ReportSnapshot.report == name, ReportSnapshot.params_key == params_key)
+    
+    if not refresh:
+        fresh = ReportSnapshot.query.filter(*same, ReportSnapshot.status == 'done', ReportSnapshot.expires_at > now)\
+            .order_by(ReportSnapshot.generated_at.desc()).first()
+        if fresh is not None:
+            return fresh, False
+    pending = ReportSnapshot.query.filter(
+        *same, ReportSnapshot.status.in_(['queued', 'running']),
+        ReportSnapshot.created_at > now - timedelta(seconds=config.get('REPORT_JOB_TIMEOUT', 600))
+    ).first()
+    if pending is not None:
+        return pending, False
+    
+    job = ReportSnapshot(report=name, params=params, params_key=params_key, requested_by=requested_by)
+    db.session.add(job)
+    db.session.commit()
+    
+    app = current_app._get_current_object()
+    if _executor is not None:
+        _executor.submit(run_job, app, job.id)
+    else:
+        run_job(app, job.id)
+        db.session.refresh(job)
+    return job, True
+
+
+def run_job(app, job_id):
+    """Compute one queued job and store its snapshot"""
+    with app.app_context():
+        job = db.session.get(ReportSnapshot, job_id)
+        if job is None or job.status != 'queued':
+            return
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        
+        started = time.perf_counter()
+        try:
+            with span(f'report_job.{job.report}'):
+                result = REPORTS[job.report].build(job.params or {})
+            job.result = result
+            job.status = 'done'
+            job.generated_at = datetime.utcnow()
+            job.expires_at = job.generated_at + timedelta(seconds=app.config.get('REPORT_SNAPSHOT_TTL', 300))
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ReportSnapshot, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+            print(f"Report job {job_id} ({job.report}) failed: {str(e)}")
+        
+        publish('report_job.finished', job_id=job.id, report=job.report, status=job.status)
+        db.session.commit()
+        metrics.observe('report_job_duration_seconds', time.perf_counter() - started,
+                        {'report': job.report, 'status': job.status})
+
+
+def prune_snapshots(config, now=None):
+    """Delete expired snapshots and stale failed/abandoned jobs; returns rows deleted (needs app context)"""
+    now = now or datetime.utcnow()
+    stale = now - timedelta(seconds=max(config.get('REPORT_SNAPSHOT_TTL', 300), config.get('REPORT_JOB_TIMEOUT', 600)))
+    deleted = db.session.execute(db.delete(ReportSnapshot).where(db.or_(
+        ReportSnapshot.expires_at < now,
+        db.and_(ReportSnapshot.status != 'done', ReportSnapshot.created_at < stale)
+    ))).rowcount
+    db.session.commit()
+    return deleted
+
+
+@report_jobs_bp.route('', methods=['POST'])
+@login_required
+def create_report_job():
+    """Queue a report job, or return the current snapshot for the same request"""
+    data = request.get_json() or {}
+    try:
+        job, _ = submit(data.get('report'), data.get('params'), current_user.id, bool(data.get('refresh')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    status = 200 if job.status == 'done' else 202
+    response = jsonify(job.to_dict(include_result=job.status == 'done'))
+    response.headers['Location'] = f'/api/report-jobs/{job.id}'
+    return response, status
+
+
+@report_jobs_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def get_report_job(job_id):
+    """Job status, with the result once done (?wait=N long-polls until it finishes)"""
+    wait = min(request.args.get('wait', 0, type=float), current_app.config.get('REPORT_JOB_MAX_WAIT', 30))
+    deadline = time.monotonic() + wait
+    while True:
+        job = db.session.get(ReportSnapshot, job_id)
+        if job is None:
+            return jsonify({'error': 'Report job not found'}), 404
+        if job.status in ('done', 'failed') or time.monotonic() >= deadline:
+            break
+        db.session.expire(job)
+        time.sleep(0.25)
+    return jsonify(job.to_dict(include_result=True)), 200
+
+
+def init_report_jobs(app):
+    """Register /api/report-jobs and start the local worker pool"""
+    global _executor
+    app.register_blueprint(report_jobs_bp)
+    if app.config.get('REPORT_JOB_EXECUTOR', 'thread') == 'thread' and _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=app.config.get('REPORT_JOB_WORKERS', 2),
+                                       thread_name_prefix='report-job')
+
+
+def shutdown_report_jobs():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
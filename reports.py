@@ -0,0 +1,112 @@
+"""Report builders shared by the synchronous report endpoints and report jobs.
+
+Each builder takes plain keyword arguments, returns a JSON-serializable dict
+and needs an app context.
+"""
+from datetime import datetime, timedelta
+from models import db, Student, Loan, LoanHistory, DamageLog
+from loan_archive import needs_history
+
+
+class ReportNotFound(LookupError):
+    """Raised when a report's subject (e.g. the student) does not exist"""
+
+
+def parse_date_range(params):
+    """(since, until) from 'from' and 'to' params; to is inclusive (raises ValueError)"""
+    since = params.get('from')
+    until = params.get('to')
+    return (
+        datetime.fromisoformat(since).date() if since else None,
+        datetime.fromisoformat(until).date() + timedelta(days=1) if until else None
+    )
+
+
+def overdue_loans(today=None):
+    """Overdue loans with the fines accrued by the nightly job"""
+    today = today or datetime.utcnow().date()
+    overdue_filter = (Loan.status == 'Borrowed', Loan.date_due < today)
+    overdue = Loan.query.filter(*overdue_filter).all()
+    total_overdue, total_fines = db.session.query(
+        db.func.count(Loan.id), db.func.coalesce(db.func.sum(Loan.accrued_fine), 0.0)
+    ).filter(*overdue_filter).one()
+    
+    data = []
+    for loan in overdue:
+        days_overdue = (today - loan.date_due).days
+        data.append({
+            'loan_id': loan.id,
+            'student': loan.student.to_dict() if loan.student else None,
+            'equipment': loan.equipment.to_dict() if loan.equipment else None,
+            'date_borrowed': loan.date_borrowed.isoformat(),
+            'date_due': loan.date_due.isoformat(),
+            'days_overdue': days_overdue,
+            'daily_fine': loan.fine_rate,
+            'fine_amount': loan.accrued_fine or 0.0
+        })
+    
+    return {
+        'total_overdue': total_overdue,
+        'total_fines': total_fines,
+        'loans': data
+    }
+
+
+def damage_summary():
+    """Damage and loss totals with every damage log"""
+    damage_logs = DamageLog.query.all()
+    
+    total_damage = len([d for d in damage_logs if d.damage_type == 'Damage'])
+    total_lost = len([d for d in damage_logs if d.damage_type == 'Lost'])
+    total_cost = sum([d.repair_cost or 0 for d in damage_logs]) + \
+                sum([d.replacement_cost or 0 for d in damage_logs])
+    open_issues = len([d for d in damage_logs if d.status == 'Open'])
+    
+    return {
+        'total_damage_reports': total_damage,
+        'total_lost_items': total_lost,
+        'total_estimated_cost': total_cost,
+        'open_issues': open_issues,
+        'by_status': {
+            'Open': len([d for d in damage_logs if d.status == 'Open']),
+            'In Repair': len([d for d in damage_logs if d.status == 'In Repair']),
+            'Resolved': len([d for d in damage_logs if d.status == 'Resolved'])
+        },
+        'details': [d.to_dict() for d in damage_logs]
+    }
+
+
+def user_activity(user_id, since=None, until=None):
+    """A student's borrowing history and statistics for loans borrowed in [since, until)"""
+    student = Student.get_live(user_id)
+    if not student:
+        raise ReportNotFound('Student not found')
+    
+    loans = []
+    models = (Loan, LoanHistory) if needs_history(since) else (Loan,)
+    for model in models:
+        q = model.query.filter_by(student_id=user_id)
+        if since:
+            q = q.filter(model.date_borrowed >= since)
+        if until:
+            q = q.filter(model.date_borrowed < until)
+        loans.extend(q.all())
+    damage_logs = DamageLog.query.filter_by(student_id=user_id).all()
+    
+    total_borrowed = len(loans)
+    active_loans = len([l for l in loans if l.status == 'Borrowed'])
+    overdue_loans = len([l for l in loans if l.date_due < datetime.utcnow().date() and l.status == 'Borrowed'])
+    damage_count = len([d for d in damage_logs if d.damage_type == 'Damage'])
+    lost_count = len([d for d in damage_logs if d.damage_type == 'Lost'])
+    
+    return {
+        'student_id': user_id,
+        'student_name': f"{student.first_name} {student.last_name}",
+        'program': student.program,
+        'total_borrowed': total_borrowed,
+        'active_loans': active_loans,
+        'overdue_loans': overdue_loans,
+        'damage_count': damage_count,
+        'lost_count': lost_count,
+        'loans': [l.to_dict() for l in loans]
+    }
@@ -1,24 +1,86 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from models import db, Student, Equipment, Loan, Staff, AuditLog, Reservation, DamageLog, ReturnDetail
 from email_service import send_checkout_email, send_return_confirmation
 from decorators import staff_required, admin_required, borrower_required
+from serializers import fetch_students, fetch_equipment, fetch_loans, fetch_by_ids, Projection, FieldsetError
+from instrumentation import timed
+from tracing import span
+from log_retention import fetch_audit_logs
+from loan_archive import loans_source, return_details_source
+from fines import FinePolicy, record_return
+from events import publish, publish_loan, publish_availability
+from cache_bus import get_or_load
+from single_flight import single_flight
+from idempotency import idempotent, release_on_error
+import reports
+import metrics
+import time
 import uuid
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+def requested_ids():
+    """Unique IDs from ?ids=a,b,c (or repeated ?ids=) in request order, or None when absent"""
+    values = request.args.getlist('ids')
+    if not values:
+        return None
+    ids = list(dict.fromkeys(i.strip() for value in values for i in value.split(',') if i.strip()))
+    limit = current_app.config.get('BATCH_MAX_IDS', 200)
+    if len(ids) > limit:
+        raise ValueError(f'At most {limit} ids per request')
+    return ids
+
+@api_bp.errorhandler(FieldsetError)
+def handle_fieldset_error(e):
+    return jsonify({'error': str(e)}), 400
+
+def fetcher(resource, default):
+    """Row fetcher for this request: a sparse Projection with ?fields=/?include=, else default"""
+    projection = Projection.from_args(resource, request.args)
+    return projection.fetch if projection is not None else default
+
+def fetch_detail(resource, model, record_id, *criteria):
+    """One record as a dict (sparse with ?fields=/?include=), or None when missing"""
+    projection = Projection.from_args(resource, request.args)
+    if projection is not None:
+        return projection.fetch_one(model.id == record_id, *criteria)
+    record = db.session.execute(db.select(model).where(model.id == record_id, *criteria)).scalar()
+    return record.to_dict() if record else None
+
+def paginate_projection(projection, page, per_page, *criteria, order_by=None):
+    """(items, total, pages) for one page of a sparse Projection"""
+    total = projection.count(*criteria)
+    items = projection.fetch(*criteria, order_by=order_by, limit=per_page, offset=(page - 1) * per_page)
+    return items, total, -(-total // per_page)
+
+def batch_lookup(fetch, id_column, *criteria):
+    """Response for ?ids= lookups, or None when the request has no ids parameter"""
+    try:
+        ids = requested_ids()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if ids is None:
+        return None
+    items, missing = fetch_by_ids(fetch, id_column, ids, *criteria)
+    return jsonify({'items': items, 'missing': missing}), 200
+
 # ===== STUDENTS ENDPOINTS =====
 
 @api_bp.route('/students', methods=['GET'])
 def get_students():
-    """Get all students"""
-    students = Student.query.all()
-    return jsonify([s.to_dict() for s in students]), 200
+    """Get all students, or a batch of them with ?ids="""
+    fetch = fetcher('students', fetch_students)
+    batch = batch_lookup(fetch, Student.id, Student.deleted_at.is_(None))
+    if batch is not None:
+        return batch
+    return jsonify(fetch(Student.deleted_at.is_(None))), 200
 
 @api_bp.route('/students', methods=['POST'])
 @login_required
 @staff_required
+@idempotent
 def create_student():
     """Create a new student (staff/admin only)"""
     try:
@@ -35,6 +97,9 @@ def create_student():
             if not ((7 <= year_level <= 12) or (1 <= year_level <= 4)):
                 return jsonify({'error': 'Invalid year level. Use 7-9 (Junior High), 10-12 (Senior High), or 1-4 (College)'}), 400
         
+        if Student.query.filter_by(email=data['email']).first():
+            return jsonify({'error': 'A student with this email already exists'}), 409
+        
         student = Student(
             first_name=data['first_name'],
             last_name=data['last_name'],
@@ -53,31 +118,48 @@ def create_student():
         return jsonify(student.to_dict()), 201
     except Exception as e:
         db.session.rollback()
+        release_on_error()
         return jsonify({'error': str(e)}), 400
 
 @api_bp.route('/students/<student_id>', methods=['GET'])
 def get_student(student_id):
     """Get a specific student"""
-    student = Student.query.get(student_id)
+    student = fetch_detail('students', Student, student_id, Student.deleted_at.is_(None))
     if not student:
         return jsonify({'error': 'Student not found'}), 404
-    return jsonify(student.to_dict()), 200
+    return jsonify(student), 200
 
 # ===== EQUIPMENT ENDPOINTS =====
 
 @api_bp.route('/equipment', methods=['GET'])
 def get_equipment():
-    """Get all equipment with pagination support"""
+    """Get all equipment with pagination support, or a batch of them with ?ids="""
+    projection = Projection.from_args('equipment', request.args)
+    fetch = projection.fetch if projection is not None else fetch_equipment
+    batch = batch_lookup(fetch, Equipment.id, Equipment.deleted_at.is_(None))
+    if batch is not None:
+        return batch
+    
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     
     # If no pagination params provided, return all for backward compatibility
     if not request.args.get('page'):
-        equipment = Equipment.query.all()
-        return jsonify([e.to_dict() for e in equipment]), 200
+        return jsonify(fetch(Equipment.deleted_at.is_(None))), 200
+    
+    if projection is not None:
+        items, total, pages = paginate_projection(projection, page, per_page, Equipment.deleted_at.is_(None),
+                                                  order_by=Equipment.id)
+        return jsonify({
+            'items': items,
+            'total': total,
+            'pages': pages,
+            'current_page': page,
+            'per_page': per_page
+        }), 200
     
     # Return paginated data
-    paginated = Equipment.query.paginate(page=page, per_page=per_page)
+    paginated = Equipment.live().paginate(page=page, per_page=per_page)
     return jsonify({
         'items': [e.to_dict() for e in paginated.items],
         'total': paginated.total,
@@ -89,6 +171,7 @@ def get_equipment():
 @api_bp.route('/equipment', methods=['POST'])
 @login_required
 @staff_required
+@idempotent
 def create_equipment():
     """Create new equipment (staff/admin only)"""
     try:
@@ -97,6 +180,9 @@ def create_equipment():
         if not data.get('name'):
             return jsonify({'error': 'Equipment name is required'}), 400
         
+        if data.get('serial_number') and Equipment.query.filter_by(serial_number=data['serial_number']).first():
+            return jsonify({'error': 'Equipment with this serial number already exists'}), 409
+        
         equipment = Equipment(
             name=data['name'],
             model=data.get('model'),
@@ -107,6 +193,8 @@ def create_equipment():
         )
         
         db.session.add(equipment)
+        db.session.flush()
+        publish_availability(equipment)
         db.session.commit()
         
         log_audit('CREATE', 'equipment', equipment.id, {'equipment': data})
@@ -114,21 +202,21 @@ def create_equipment():
         return jsonify(equipment.to_dict()), 201
     except Exception as e:
         db.session.rollback()
+        release_on_error()
         return jsonify({'error': str(e)}), 400
 
 @api_bp.route('/equipment/available', methods=['GET'])
 def get_available_equipment():
     """Get only available equipment"""
-    equipment = Equipment.query.filter_by(availability_status='Available').all()
-    return jsonify([e.to_dict() for e in equipment]), 200
+    return jsonify(fetcher('equipment', fetch_equipment)(Equipment.availability_status == 'Available', Equipment.deleted_at.is_(None))), 200
 
 @api_bp.route('/equipment/<equipment_id>', methods=['GET'])
 def get_equipment_detail(equipment_id):
     """Get specific equipment details"""
-    equipment = Equipment.query.get(equipment_id)
+    equipment = fetch_detail('equipment', Equipment, equipment_id, Equipment.deleted_at.is_(None))
     if not equipment:
         return jsonify({'error': 'Equipment not found'}), 404
-    return jsonify(equipment.to_dict()), 200
+    return jsonify(equipment), 200
 
 @api_bp.route('/equipment/<equipment_id>', methods=['PUT'])
 @login_required
@@ -136,7 +224,7 @@ def get_equipment_detail(equipment_id):
 def update_equipment(equipment_id):
     """Update equipment (staff/admin only)"""
     try:
-        equipment = Equipment.query.get(equipment_id)
+        equipment = Equipment.get_live(equipment_id)
         if not equipment:
             return jsonify({'error': 'Equipment not found'}), 404
         
@@ -156,6 +244,7 @@ def update_equipment(equipment_id):
         if 'availability_status' in data:
             equipment.availability_status = data['availability_status']
         
+        publish_availability(equipment)
         db.session.commit()
         
         log_audit('UPDATE', 'equipment', equipment.id, {'updated_fields': data})
@@ -172,19 +261,24 @@ def update_equipment(equipment_id):
 @login_required
 @staff_required
 def delete_equipment(equipment_id):
-    """Delete equipment (staff/admin only)"""
+    """Delete equipment (staff/admin only)
+    
+    Soft delete: the row and its loan history stay until the purge job removes them.
+    """
     try:
-        equipment = Equipment.query.get(equipment_id)
+        equipment = Equipment.get_live(equipment_id)
         if not equipment:
             return jsonify({'error': 'Equipment not found'}), 404
         
         # Check if equipment is on loan
-        active_loans = Loan.query.filter_by(equipment_id=equipment_id, status='Borrowed').all()
-        if active_loans:
+        on_loan = db.session.query(db.exists().where(
+            Loan.equipment_id == equipment_id, Loan.status == 'Borrowed')).scalar()
+        if on_loan:
             return jsonify({'error': 'Cannot delete equipment that is currently on loan'}), 400
         
         equipment_name = equipment.name
-        db.session.delete(equipment)
+        equipment.soft_delete()
+        publish('equipment.deleted', equipment_id=equipment.id)
         db.session.commit()
         
         log_audit('DELETE', 'equipment', equipment_id, {'name': equipment_name})
@@ -198,9 +292,95 @@ def delete_equipment(equipment_id):
 
 # ===== LOANS ENDPOINTS =====
 
+def open_loan(student, equipment, date_due, borrowed_on=None):
+    """Add a loan for available equipment and mark it on loan (caller commits)"""
+    loan = Loan(
+        student_id=student.id,
+        equipment_id=equipment.id,
+        date_borrowed=borrowed_on or datetime.utcnow().date(),
+        date_due=date_due,
+        status='Borrowed',
+        fine_rate=FinePolicy(current_app.config).rate_for(equipment, student)
+    )
+    
+    # Update equipment status
+    equipment.availability_status = 'On Loan'
+    
+    db.session.add(loan)
+    db.session.flush()
+    publish_loan('loan.created', loan)
+    publish_availability(equipment)
+    return loan
+
+def notify_checkout(loan):
+    """Confirmation email and audit entry for a committed checkout"""
+    student, equipment = loan.student, loan.equipment
+    
+    # Send confirmation email
+    send_checkout_email(
+        student_email=student.email,
+        student_name=f"{student.first_name} {student.last_name}",
+        equipment_name=equipment.name,
+        due_date=loan.date_due.strftime('%Y-%m-%d'),
+        loan_id=loan.id
+    )
+    
+    # Log action
+    log_audit('CREATE', 'loans', loan.id, {
+        'student_id': student.id,
+        'equipment_id': equipment.id,
+        'date_due': loan.date_due.isoformat()
+    })
+
+def checkout_loan(student, equipment, date_due):
+    """Lend available equipment to a student: commit, email and audit the new loan"""
+    loan = open_loan(student, equipment, date_due)
+    db.session.commit()
+    notify_checkout(loan)
+    return loan
+
+def close_loan(loan, returned_on=None):
+    """Mark a loan returned, free its equipment and persist the final fine (caller commits)"""
+    loan.date_returned = returned_on or datetime.utcnow().date()
+    loan.status = 'Returned'
+    
+    # Update equipment status
+    equipment = Equipment.query.get(loan.equipment_id)
+    equipment.availability_status = 'Available'
+    
+    # Persist final fines
+    detail = record_return(loan, equipment, loan.student, current_app.config, returned_on=loan.date_returned)
+    publish_loan('loan.returned', loan)
+    publish_availability(equipment)
+    return detail
+
+def notify_return(loan, detail):
+    """Confirmation email and audit entry for a committed return"""
+    # Send return confirmation email
+    send_return_confirmation(
+        student_email=loan.student.email,
+        student_name=f"{loan.student.first_name} {loan.student.last_name}",
+        equipment_name=loan.equipment.name,
+        loan_id=loan.id,
+        late_fine=detail.late_fine,
+        days_late=detail.days_late,
+        daily_rate=loan.fine_rate
+    )
+    
+    # Log action
+    log_audit('UPDATE', 'loans', loan.id, {'action': 'return', 'date_returned': loan.date_returned.isoformat()})
+
+def return_loan(loan):
+    """Return a borrowed loan: commit, email and audit the return"""
+    detail = close_loan(loan)
+    db.session.commit()
+    notify_return(loan, detail)
+    return detail
+
 @api_bp.route('/loans/checkout', methods=['POST'])
 @login_required
 @borrower_required
+@idempotent
 def checkout_equipment():
     """Create a new loan (checkout equipment)"""
     try:
@@ -212,12 +392,12 @@ def checkout_equipment():
             return jsonify({'error': f'Missing required fields: {", ".join(required)}'}), 400
         
         # Check if student exists
-        student = Student.query.get(data['student_id'])
+        student = Student.get_live(data['student_id'])
         if not student:
             return jsonify({'error': 'Student not found'}), 404
         
         # Check if equipment exists
-        equipment = Equipment.query.get(data['equipment_id'])
+        equipment = Equipment.get_live(data['equipment_id'])
         if not equipment:
             return jsonify({'error': 'Equipment not found'}), 404
         
@@ -225,36 +405,7 @@ def checkout_equipment():
         if equipment.availability_status != 'Available':
             return jsonify({'error': 'Equipment is not available'}), 400
         
-        # Create loan
-        loan = Loan(
-            student_id=data['student_id'],
-            equipment_id=data['equipment_id'],
-            date_borrowed=datetime.utcnow().date(),
-            date_due=datetime.strptime(data['date_due'], '%Y-%m-%d').date(),
-            status='Borrowed'
-        )
-        
-        # Update equipment status
-        equipment.availability_status = 'On Loan'
-        
-        db.session.add(loan)
-        db.session.commit()
-        
-        # Send confirmation email
-        send_checkout_email(
-            student_email=student.email,
-            student_name=f"{student.first_name} {student.last_name}",
-            equipment_name=equipment.name,
-            due_date=loan.date_due.strftime('%Y-%m-%d'),
-            loan_id=loan.id
-        )
-        
-        # Log action
-        log_audit('CREATE', 'loans', loan.id, {
-            'student_id': data['student_id'],
-            'equipment_id': data['equipment_id'],
-            'date_due': data['date_due']
-        })
+        loan = checkout_loan(student, equipment, datetime.strptime(data['date_due'], '%Y-%m-%d').date())
         
         return jsonify({
             'message': 'Equipment checked out successfully',
@@ -263,31 +414,36 @@ def checkout_equipment():
         
     except Exception as e:
         db.session.rollback()
+        release_on_error()
         return jsonify({'error': str(e)}), 400
 
 @api_bp.route('/loans', methods=['GET'])
 def get_loans():
-    """Get all loans"""
-    loans = Loan.query.all()
-    return jsonify([l.to_dict() for l in loans]), 200
+    """Get all loans, or a batch of them with ?ids="""
+    fetch = fetcher('loans', fetch_loans)
+    batch = batch_lookup(fetch, Loan.id)
+    if batch is not None:
+        return batch
+    return jsonify(fetch()), 200
 
 @api_bp.route('/loans/active', methods=['GET'])
 def get_active_loans():
     """Get only active loans"""
-    loans = Loan.query.filter_by(status='Borrowed').all()
-    return jsonify([l.to_dict() for l in loans]), 200
+    return jsonify(fetcher('loans', fetch_loans)(Loan.status == 'Borrowed')), 200
 
 @api_bp.route('/loans/overdue', methods=['GET'])
+@single_flight()
 def get_overdue_loans():
     """Get overdue loans"""
     today = datetime.utcnow().date()
-    overdue_loans = Loan.query.filter(
+    overdue_loans = fetcher('loans', fetch_loans)(
         Loan.status == 'Borrowed',
         Loan.date_due < today
-    ).all()
-    return jsonify([l.to_dict() for l in overdue_loans]), 200
+    )
+    return jsonify(overdue_loans), 200
 
 @api_bp.route('/loans/<loan_id>/return', methods=['POST'])
+@idempotent
 def return_equipment(loan_id):
     """Return equipment"""
     try:
@@ -298,43 +454,118 @@ def return_equipment(loan_id):
         if loan.status == 'Returned':
             return jsonify({'error': 'Equipment already returned'}), 400
         
-        # Update loan
-        loan.date_returned = datetime.utcnow().date()
-        loan.status = 'Returned'
-        
-        # Update equipment status
-        equipment = Equipment.query.get(loan.equipment_id)
-        equipment.availability_status = 'Available'
-        
-        db.session.commit()
-        
-        # Send return confirmation email
-        send_return_confirmation(
-            student_email=loan.student.email,
-            student_name=f"{loan.student.first_name} {loan.student.last_name}",
-            equipment_name=equipment.name,
-            loan_id=loan.id
-        )
-        
-        # Log action
-        log_audit('UPDATE', 'loans', loan.id, {'action': 'return', 'date_returned': loan.date_returned.isoformat()})
+        detail = return_loan(loan)
         
         return jsonify({
             'message': 'Equipment returned successfully',
-            'loan': loan.to_dict()
+            'loan': loan.to_dict(),
+            'fine': detail.to_dict()
         }), 200
         
     except Exception as e:
         db.session.rollback()
+        release_on_error()
         return jsonify({'error': str(e)}), 400
 
 @api_bp.route('/loans/<loan_id>', methods=['GET'])
 def get_loan_detail(loan_id):
     """Get loan details"""
-    loan = Loan.query.get(loan_id)
+    loan = fetch_detail('loans', Loan, loan_id)
     if not loan:
         return jsonify({'error': 'Loan not found'}), 404
-    return jsonify(loan.to_dict()), 200
+    return jsonify(loan), 200
+
+# ===== SCAN ENDPOINTS =====
+
+def scan_state(equipment):
+    """Equipment with its active loan and today's reservations, as shown after a scan"""
+    today = datetime.utcnow().date()
+    active_loan = Loan.query.filter_by(equipment_id=equipment.id, status='Borrowed').first()
+    reservations = Reservation.query.filter(
+        Reservation.equipment_id == equipment.id,
+        Reservation.status.in_(['Pending', 'Confirmed']),
+        Reservation.date_from <= today,
+        Reservation.date_to >= today
+    ).all()
+    return {
+        'equipment': equipment.to_dict(),
+        'active_loan': active_loan.to_dict() if active_loan else None,
+        'reservations': [r.to_dict() for r in reservations],
+        'scanned_at': time.time()
+    }
+
+def parse_scanned_at(data):
+    """The echoed scanned_at as a float, or None when missing or unparsable (it only feeds a metric)"""
+    try:
+        return float(data['scanned_at']) if data.get('scanned_at') else None
+    except (TypeError, ValueError):
+        return None
+
+def observe_scan_latency(scanned_at, action):
+    """Record the time from the scan lookup to the completed action (when the client echoes scanned_at)"""
+    if scanned_at is not None:
+        metrics.observe('scan_to_action_seconds', max(0.0, time.time() - scanned_at), {'action': action})
+
+@api_bp.route('/scan/<serial>', methods=['GET'])
+@login_required
+def scan_equipment(serial):
+    """Resolve a scanned serial number to the equipment, its active loan and today's reservations"""
+    equipment = Equipment.live().filter_by(serial_number=serial).first()
+    if not equipment:
+        return jsonify({'error': 'Equipment not found'}), 404
+    return jsonify(scan_state(equipment)), 200
+
+@api_bp.route('/scan/<serial>', methods=['POST'])
+@login_required
+@borrower_required
+@idempotent
+def scan_action(serial):
+    """Checkout or return scanned equipment by serial number
+    
+    Body: {"action": "checkout", "student_id", "date_due"} or {"action": "return"}.
+    Echo "scanned_at" from the GET response to record scan-to-action latency.
+    """
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        if action not in ('checkout', 'return'):
+            return jsonify({'error': 'action must be checkout or return'}), 400
+        scanned_at = parse_scanned_at(data)
+        
+        equipment = Equipment.live().filter_by(serial_number=serial).first()
+        if not equipment:
+            return jsonify({'error': 'Equipment not found'}), 404
+        
+        if action == 'checkout':
+            if not all(field in data for field in ('student_id', 'date_due')):
+                return jsonify({'error': 'Missing required fields: student_id, date_due'}), 400
+            student = Student.get_live(data['student_id'])
+            if not student:
+                return jsonify({'error': 'Student not found'}), 404
+            if equipment.availability_status != 'Available':
+                return jsonify({'error': 'Equipment is not available'}), 400
+            loan = checkout_loan(student, equipment, datetime.strptime(data['date_due'], '%Y-%m-%d').date())
+            observe_scan_latency(scanned_at, action)
+            return jsonify({
+                'message': 'Equipment checked out successfully',
+                'loan': loan.to_dict()
+            }), 201
+        
+        loan = Loan.query.filter_by(equipment_id=equipment.id, status='Borrowed').first()
+        if not loan:
+            return jsonify({'error': 'Equipment is not on loan'}), 400
+        detail = return_loan(loan)
+        observe_scan_latency(scanned_at, action)
+        return jsonify({
+            'message': 'Equipment returned successfully',
+            'loan': loan.to_dict(),
+            'fine': detail.to_dict()
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        release_on_error()
+        return jsonify({'error': str(e)}), 400
 
 # ===== STAFF ENDPOINTS =====
 
@@ -345,6 +576,7 @@ def get_staff():
     return jsonify([s.to_dict() for s in staff]), 200
 
 @api_bp.route('/staff', methods=['POST'])
+@idempotent
 def create_staff():
     """Create new staff member"""
     try:
@@ -367,6 +599,7 @@ def create_staff():
         return jsonify(staff.to_dict()), 201
     except Exception as e:
         db.session.rollback()
+        release_on_error()
         return jsonify({'error': str(e)}), 400
 
 # ===== SEARCH & FILTERING ENDPOINTS =====
@@ -383,7 +616,7 @@ def search_equipment():
         per_page = int(request.args.get('per_page', 10))
         
         # Start with all equipment
-        q = Equipment.query
+        q = Equipment.live()
         
         # Apply search query
         if query:
@@ -426,7 +659,7 @@ def search_students():
         per_page = int(request.args.get('per_page', 10))
         
         # Start with all students
-        q = Student.query
+        q = Student.live()
         
         # Apply search query
         if query:
@@ -501,10 +734,13 @@ def search_loans():
 @api_bp.route('/filters/categories', methods=['GET'])
 def get_categories():
     """Get all unique equipment categories for filtering"""
-    categories = db.session.query(Equipment.category).distinct().filter(
-        Equipment.category.isnot(None)
-    ).order_by(Equipment.category).all()
-    return jsonify([cat[0] for cat in categories if cat[0]]), 200
+    def load():
+        categories = db.session.query(Equipment.category).distinct().filter(
+            Equipment.category.isnot(None),
+            Equipment.deleted_at.is_(None)
+        ).order_by(Equipment.category).all()
+        return [cat[0] for cat in categories if cat[0]]
+    return jsonify(get_or_load('filters:categories', load, tags=('equipment',))), 200
 
 @api_bp.route('/filters/conditions', methods=['GET'])
 def get_conditions():
@@ -515,10 +751,13 @@ def get_conditions():
 @api_bp.route('/filters/programs', methods=['GET'])
 def get_programs():
     """Get all unique student programs for filtering"""
-    programs = db.session.query(Student.program).distinct().filter(
-        Student.program.isnot(None)
-    ).order_by(Student.program).all()
-    return jsonify([prog[0] for prog in programs if prog[0]]), 200
+    def load():
+        programs = db.session.query(Student.program).distinct().filter(
+            Student.program.isnot(None),
+            Student.deleted_at.is_(None)
+        ).order_by(Student.program).all()
+        return [prog[0] for prog in programs if prog[0]]
+    return jsonify(get_or_load('filters:programs', load, tags=('students',))), 200
 
 # ===== STUDENT EDIT/DELETE ENDPOINTS =====
 
@@ -528,7 +767,7 @@ def get_programs():
 def update_student(student_id):
     """Update student (staff/admin only)"""
     try:
-        student = Student.query.get(student_id)
+        student = Student.get_live(student_id)
         if not student:
             return jsonify({'error': 'Student not found'}), 404
         
@@ -564,19 +803,23 @@ def update_student(student_id):
 @login_required
 @staff_required
 def delete_student(student_id):
-    """Delete student (staff/admin only)"""
+    """Delete student (staff/admin only)
+    
+    Soft delete: the row and its loan history stay until the purge job removes them.
+    """
     try:
-        student = Student.query.get(student_id)
+        student = Student.get_live(student_id)
         if not student:
             return jsonify({'error': 'Student not found'}), 404
         
         # Check if student has active loans
-        active_loans = Loan.query.filter_by(student_id=student_id, status='Borrowed').all()
-        if active_loans:
+        has_active_loans = db.session.query(db.exists().where(
+            Loan.student_id == student_id, Loan.status == 'Borrowed')).scalar()
+        if has_active_loans:
             return jsonify({'error': 'Cannot delete student with active loans'}), 400
         
         student_name = f"{student.first_name} {student.last_name}"
-        db.session.delete(student)
+        student.soft_delete()
         db.session.commit()
         
         log_audit('DELETE', 'students', student_id, {'name': student_name})
@@ -592,6 +835,7 @@ def delete_student(student_id):
 
 @api_bp.route('/loans/<loan_id>/return-with-damage', methods=['POST'])
 @login_required
+@idempotent
 def return_equipment_with_damage(loan_id):
     """Return equipment with damage assessment and fine calculation"""
     try:
@@ -607,10 +851,7 @@ def return_equipment_with_damage(loan_id):
         damage_notes = data.get('damage_notes', '')
         new_condition = data.get('new_condition', 'Good')
         
-        # Calculate late fine (e.g., $5 per day overdue)
         today = datetime.utcnow().date()
-        days_late = max(0, (today - loan.date_due).days)
-        late_fine = days_late * 5.00
         
         # Update loan
         loan.date_returned = today
@@ -627,6 +868,14 @@ def return_equipment_with_damage(loan_id):
             else:
                 equipment.condition = new_condition
         
+        # Persist late and damage fines
+        detail = record_return(loan, equipment, loan.student, current_app.config,
+                               damage_status=damage_status, damage_notes=damage_notes,
+                               condition_on_return=new_condition, returned_on=today)
+        days_late, late_fine = detail.days_late, detail.late_fine
+        publish_loan('loan.returned', loan)
+        publish_availability(equipment)
+        
         db.session.commit()
         
         # Send return confirmation with damage/fine info
@@ -637,7 +886,8 @@ def return_equipment_with_damage(loan_id):
             loan_id=loan.id,
             damage_status=damage_status,
             late_fine=late_fine,
-            days_late=days_late
+            days_late=days_late,
+            daily_rate=loan.fine_rate
         )
         
         # Log action
@@ -648,7 +898,9 @@ def return_equipment_with_damage(loan_id):
             'damage_notes': damage_notes,
             'new_condition': new_condition,
             'days_late': days_late,
-            'late_fine': late_fine
+            'late_fine': late_fine,
+            'damage_fine': detail.damage_fine,
+            'total_fine': detail.total_fine
         })
         
         return jsonify({
@@ -659,12 +911,15 @@ def return_equipment_with_damage(loan_id):
                 'damage_notes': damage_notes,
                 'new_condition': new_condition,
                 'days_late': days_late,
-                'late_fine': late_fine
+                'late_fine': late_fine,
+                'damage_fine': detail.damage_fine,
+                'total_fine': detail.total_fine
             }
         }), 200
         
     except Exception as e:
         db.session.rollback()
+        release_on_error()
         return jsonify({'error': str(e)}), 400
 
 # ===== UTILITY ENDPOINTS =====
@@ -672,14 +927,15 @@ def return_equipment_with_damage(loan_id):
 def log_audit(action, table_name, record_id, details):
     """Log an audit entry"""
     try:
-        audit_log = AuditLog(
-            action=action,
-            table_name=table_name,
-            record_id=record_id,
-            details=details
-        )
-        db.session.add(audit_log)
-        db.session.commit()
+        with timed('audit'), span('log_audit', action=action, table=table_name):
+            audit_log = AuditLog(
+                action=action,
+                table_name=table_name,
+                record_id=record_id,
+                details=details
+            )
+            db.session.add(audit_log)
+            db.session.commit()
     except Exception as e:
         print(f"Error logging audit: {str(e)}")
 
@@ -690,14 +946,37 @@ def health_check():
 
 @api_bp.route('/audit-logs', methods=['GET'])
 def get_audit_logs():
-    """Get audit logs"""
-    logs = AuditLog.query.order_by(AuditLog.created_at.desc()).limit(100).all()
-    return jsonify([l.to_dict() for l in logs]), 200
+    """Get audit logs, newest first
+    
+    Filters: table, action, record_id, since, until (ISO dates). Pass the
+    X-Next-Cursor response header back as ?cursor= for the next page.
+    """
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+        logs, next_cursor = fetch_audit_logs(
+            table_name=request.args.get('table'),
+            action=request.args.get('action'),
+            record_id=request.args.get('record_id'),
+            since=datetime.fromisoformat(since) if since else None,
+            until=datetime.fromisoformat(until) if until else None,
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify([l.to_dict() for l in logs])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
 
 # ==================== RESERVATIONS ====================
 
 @api_bp.route('/reservations', methods=['POST'])
 @login_required
+@idempotent
 def create_reservation():
     """Create a new reservation"""
     data = request.get_json()
@@ -707,12 +986,12 @@ def create_reservation():
         return jsonify({'error': 'Missing required fields'}), 400
     
     # Check if student exists
-    student = Student.query.get(data['student_id'])
+    student = Student.get_live(data['student_id'])
     if not student:
         return jsonify({'error': 'Student not found'}), 404
     
     # Check if equipment exists
-    equipment = Equipment.query.get(data['equipment_id'])
+    equipment = Equipment.get_live(data['equipment_id'])
     if not equipment:
         return jsonify({'error': 'Equipment not found'}), 404
     
@@ -744,6 +1023,9 @@ def create_reservation():
     )
     
     db.session.add(reservation)
+    db.session.flush()
+    publish('reservation.changed', reservation_id=reservation.id, equipment_id=reservation.equipment_id,
+            status=reservation.status or 'Pending')
     db.session.commit()
     
     # Log audit
@@ -760,16 +1042,21 @@ def get_reservations():
     student_id = request.args.get('student_id')
     equipment_id = request.args.get('equipment_id')
     
-    query = Reservation.query
-    
+    criteria = []
     if status:
-        query = query.filter_by(status=status)
+        criteria.append(Reservation.status == status)
     if student_id:
-        query = query.filter_by(student_id=student_id)
+        criteria.append(Reservation.student_id == student_id)
     if equipment_id:
-        query = query.filter_by(equipment_id=equipment_id)
+        criteria.append(Reservation.equipment_id == equipment_id)
     
-    query = query.order_by(Reservation.created_at.desc())
+    projection = Projection.from_args('reservations', request.args)
+    if projection is not None:
+        items, total, pages = paginate_projection(projection, page, 20, *criteria,
+                                                  order_by=Reservation.created_at.desc())
+        return jsonify({'data': items, 'total': total, 'pages': pages}), 200
+    
+    query = Reservation.query.filter(*criteria).order_by(Reservation.created_at.desc())
     reservations = query.paginate(page=page, per_page=20)
     
     return jsonify({
@@ -782,10 +1069,10 @@ def get_reservations():
 @login_required
 def get_reservation(reservation_id):
     """Get specific reservation"""
-    reservation = Reservation.query.get(reservation_id)
+    reservation = fetch_detail('reservations', Reservation, reservation_id)
     if not reservation:
         return jsonify({'error': 'Reservation not found'}), 404
-    return jsonify(reservation.to_dict()), 200
+    return jsonify(reservation), 200
 
 @api_bp.route('/reservations/<reservation_id>', methods=['PUT'])
 @login_required
@@ -806,6 +1093,8 @@ def update_reservation(reservation_id):
     if 'notes' in data:
         reservation.notes = data['notes']
     
+    publish('reservation.changed', reservation_id=reservation.id, equipment_id=reservation.equipment_id,
+            status=reservation.status)
     db.session.commit()
     log_audit('UPDATE', 'Reservation', reservation_id, {'status': data.get('status')})
     
@@ -821,6 +1110,8 @@ def delete_reservation(reservation_id):
         return jsonify({'error': 'Reservation not found'}), 404
     
     db.session.delete(reservation)
+    publish('reservation.changed', reservation_id=reservation.id, equipment_id=reservation.equipment_id,
+            status='Deleted')
     db.session.commit()
     log_audit('DELETE', 'Reservation', reservation_id, {'action': 'Reservation deleted'})
     
@@ -831,6 +1122,7 @@ def delete_reservation(reservation_id):
 @api_bp.route('/damage-logs', methods=['POST'])
 @login_required
 @staff_required
+@idempotent
 def create_damage_log():
     """Create damage log entry"""
     data = request.get_json()
@@ -839,8 +1131,8 @@ def create_damage_log():
         return jsonify({'error': 'Missing required fields'}), 400
     
     # Verify references
-    equipment = Equipment.query.get(data['equipment_id'])
-    student = Student.query.get(data['student_id'])
+    equipment = Equipment.get_live(data['equipment_id'])
+    student = Student.get_live(data['student_id'])
     
     if not equipment or not student:
         return jsonify({'error': 'Equipment or Student not found'}), 404
@@ -864,6 +1156,11 @@ def create_damage_log():
         equipment.condition = 'Damaged'
     
     db.session.add(damage_log)
+    db.session.flush()
+    publish('damage_log.changed', damage_log_id=damage_log.id, equipment_id=damage_log.equipment_id,
+            damage_type=damage_log.damage_type, status=damage_log.status or 'Open')
+    if data['damage_type'] == 'Lost':
+        publish_availability(equipment)
     db.session.commit()
     
     log_audit('CREATE', 'DamageLog', damage_log.id, {'damage_type': data['damage_type']})
@@ -879,16 +1176,21 @@ def get_damage_logs():
     damage_type = request.args.get('damage_type')
     equipment_id = request.args.get('equipment_id')
     
-    query = DamageLog.query
-    
+    criteria = []
     if status:
-        query = query.filter_by(status=status)
+        criteria.append(DamageLog.status == status)
     if damage_type:
-        query = query.filter_by(damage_type=damage_type)
+        criteria.append(DamageLog.damage_type == damage_type)
     if equipment_id:
-        query = query.filter_by(equipment_id=equipment_id)
+        criteria.append(DamageLog.equipment_id == equipment_id)
     
-    query = query.order_by(DamageLog.created_at.desc())
+    projection = Projection.from_args('damage_logs', request.args)
+    if projection is not None:
+        items, total, pages = paginate_projection(projection, page, 20, *criteria,
+                                                  order_by=DamageLog.created_at.desc())
+        return jsonify({'data': items, 'total': total, 'pages': pages}), 200
+    
+    query = DamageLog.query.filter(*criteria).order_by(DamageLog.created_at.desc())
     logs = query.paginate(page=page, per_page=20)
     
     return jsonify({
@@ -918,6 +1220,8 @@ def update_damage_log(log_id):
     if 'replacement_cost' in data:
         log.replacement_cost = data['replacement_cost']
     
+    publish('damage_log.changed', damage_log_id=log.id, equipment_id=log.equipment_id,
+            damage_type=log.damage_type, status=log.status)
     db.session.commit()
     log_audit('UPDATE', 'DamageLog', log_id, {'status': data.get('status')})
     
@@ -925,129 +1229,128 @@ def update_damage_log(log_id):
 
 # ==================== REPORTING ====================
 
+# Tables the cached loan reports are built from
+REPORT_TAGS = ('loans', 'loan_history', 'equipment')
+
+def report_date_range():
+    """(since, until) from the ?from= and ?to= report params; to is inclusive"""
+    return reports.parse_date_range(request.args)
+
 @api_bp.route('/reports/equipment-usage', methods=['GET'])
 @login_required
+@single_flight(max_age=30, stale_while_revalidate=300, tags=REPORT_TAGS)
 def equipment_usage_report():
-    """Equipment usage statistics"""
-    equipment_stats = db.session.query(
-        Equipment.id,
-        Equipment.name,
-        db.func.count(Loan.id).label('total_loans'),
-        db.func.count(db.case([(Loan.status == 'Borrowed', 1)])).label('active_loans')
-    ).outerjoin(Loan).group_by(Equipment.id, Equipment.name).all()
+    """Equipment usage statistics (optional ?from=&to= on date borrowed)"""
+    try:
+        since, until = report_date_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    data = [{
-        'equipment_id': stat[0],
-        'equipment_name': stat[1],
-        'total_loans': stat[2],
-        'active_loans': stat[3]
-    } for stat in equipment_stats]
+    def load():
+        loans = loans_source(since, until)
+        equipment_stats = db.session.query(
+            Equipment.id,
+            Equipment.name,
+            db.func.count(loans.c.id).label('total_loans'),
+            db.func.count(db.case((loans.c.status == 'Borrowed', 1))).label('active_loans')
+        ).outerjoin(loans, loans.c.equipment_id == Equipment.id).group_by(Equipment.id, Equipment.name).all()
+        
+        return [{
+            'equipment_id': stat[0],
+            'equipment_name': stat[1],
+            'total_loans': stat[2],
+            'active_loans': stat[3]
+        } for stat in equipment_stats]
     
+    data = get_or_load(f'reports:equipment-usage:{since}:{until}', load, tags=REPORT_TAGS)
     return jsonify(data), 200
 
 @api_bp.route('/reports/most-borrowed', methods=['GET'])
 @login_required
+@single_flight(max_age=30, stale_while_revalidate=300, tags=REPORT_TAGS)
 def most_borrowed_report():
-    """Most borrowed equipment report"""
+    """Most borrowed equipment report (optional ?from=&to= on date borrowed)"""
     limit = request.args.get('limit', 10, type=int)
+    try:
+        since, until = report_date_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    most_borrowed = db.session.query(
-        Equipment.id,
-        Equipment.name,
-        Equipment.category,
-        db.func.count(Loan.id).label('loan_count')
-    ).join(Loan).group_by(Equipment.id, Equipment.name, Equipment.category)\
-     .order_by(db.func.count(Loan.id).desc()).limit(limit).all()
-    
-    data = [{
-        'equipment_id': item[0],
-        'equipment_name': item[1],
-        'category': item[2],
-        'loan_count': item[3]
-    } for item in most_borrowed]
+    def load():
+        loans = loans_source(since, until)
+        most_borrowed = db.session.query(
+            Equipment.id,
+            Equipment.name,
+            Equipment.category,
+            db.func.count(loans.c.id).label('loan_count')
+        ).join(loans, loans.c.equipment_id == Equipment.id).group_by(Equipment.id, Equipment.name, Equipment.category)\
+         .order_by(db.func.count(loans.c.id).desc()).limit(limit).all()
+        
+        return [{
+            'equipment_id': item[0],
+            'equipment_name': item[1],
+            'category': item[2],
+            'loan_count': item[3]
+        } for item in most_borrowed]
     
+    data = get_or_load(f'reports:most-borrowed:{since}:{until}:{limit}', load, tags=REPORT_TAGS)
     return jsonify(data), 200
 
 @api_bp.route('/reports/user-activity/<user_id>', methods=['GET'])
 @login_required
 def user_activity_report(user_id):
-    """Get user borrowing history and statistics"""
-    student = Student.query.get(user_id)
-    if not student:
-        return jsonify({'error': 'Student not found'}), 404
-    
-    loans = Loan.query.filter_by(student_id=user_id).all()
-    damage_logs = DamageLog.query.filter_by(student_id=user_id).all()
-    
-    total_borrowed = len(loans)
-    active_loans = len([l for l in loans if l.status == 'Borrowed'])
-    overdue_loans = len([l for l in loans if l.date_due < datetime.utcnow().date() and l.status == 'Borrowed'])
-    damage_count = len([d for d in damage_logs if d.damage_type == 'Damage'])
-    lost_count = len([d for d in damage_logs if d.damage_type == 'Lost'])
-    
-    return jsonify({
-        'student_id': user_id,
-        'student_name': f"{student.first_name} {student.last_name}",
-        'program': student.program,
-        'total_borrowed': total_borrowed,
-        'active_loans': active_loans,
-        'overdue_loans': overdue_loans,
-        'damage_count': damage_count,
-        'lost_count': lost_count,
-        'loans': [l.to_dict() for l in loans]
-    }), 200
+    """Get user borrowing history and statistics (optional ?from=&to= on date borrowed)"""
+    try:
+        since, until = report_date_range()
+        return jsonify(reports.user_activity(user_id, since, until)), 200
+    except reports.ReportNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @api_bp.route('/reports/damage-summary', methods=['GET'])
 @login_required
 def damage_summary_report():
     """Damage and loss report summary"""
-    damage_logs = DamageLog.query.all()
-    
-    total_damage = len([d for d in damage_logs if d.damage_type == 'Damage'])
-    total_lost = len([d for d in damage_logs if d.damage_type == 'Lost'])
-    total_cost = sum([d.repair_cost or 0 for d in damage_logs]) + \
-                sum([d.replacement_cost or 0 for d in damage_logs])
-    open_issues = len([d for d in damage_logs if d.status == 'Open'])
-    
-    return jsonify({
-        'total_damage_reports': total_damage,
-        'total_lost_items': total_lost,
-        'total_estimated_cost': total_cost,
-        'open_issues': open_issues,
-        'by_status': {
-            'Open': len([d for d in damage_logs if d.status == 'Open']),
-            'In Repair': len([d for d in damage_logs if d.status == 'In Repair']),
-            'Resolved': len([d for d in damage_logs if d.status == 'Resolved'])
-        },
-        'details': [d.to_dict() for d in damage_logs]
-    }), 200
+    return jsonify(reports.damage_summary()), 200
 
 @api_bp.route('/reports/overdue-loans', methods=['GET'])
 @login_required
+@single_flight(max_age=10, stale_while_revalidate=60, tags=('loans', 'students', 'equipment'))
 def overdue_loans_report():
-    """Get overdue loans report"""
+    """Get overdue loans report (fines as accrued by the nightly job)"""
+    return jsonify(reports.overdue_loans()), 200
+
+@api_bp.route('/reports/fines', methods=['GET'])
+@login_required
+@single_flight()
+def fines_report():
+    """Outstanding and assessed fine totals (optional ?from=&to= on return date)"""
+    try:
+        since, until = report_date_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     today = datetime.utcnow().date()
-    overdue = Loan.query.filter(
-        Loan.status == 'Borrowed',
-        Loan.date_due < today
-    ).all()
+    outstanding_loans, outstanding = db.session.query(
+        db.func.count(Loan.id), db.func.coalesce(db.func.sum(Loan.accrued_fine), 0.0)
+    ).filter(Loan.status == 'Borrowed', Loan.date_due < today).one()
     
-    data = []
-    for loan in overdue:
-        days_overdue = (today - loan.date_due).days
-        data.append({
-            'loan_id': loan.id,
-            'student': loan.student.to_dict() if loan.student else None,
-            'equipment': loan.equipment.to_dict() if loan.equipment else None,
-            'date_borrowed': loan.date_borrowed.isoformat(),
-            'date_due': loan.date_due.isoformat(),
-            'days_overdue': days_overdue,
-            'daily_fine': 5.0,
-            'fine_amount': days_overdue * 5.0
-        })
+    # Includes return details moved to history by the loan archive
+    details = return_details_source(since, until)
+    fined_returns, late_fines, damage_fines, total_fines = db.session.query(
+        db.func.count(details.c.id),
+        db.func.coalesce(db.func.sum(details.c.late_fine), 0.0),
+        db.func.coalesce(db.func.sum(details.c.damage_fine), 0.0),
+        db.func.coalesce(db.func.sum(details.c.total_fine), 0.0)
+    ).filter(details.c.total_fine > 0).one()
     
     return jsonify({
-        'total_overdue': len(data),
-        'total_fines': sum([item['fine_amount'] for item in data]),
-        'loans': data
+        'outstanding': {'loans': outstanding_loans, 'amount': outstanding},
+        'assessed': {
+            'returns': fined_returns,
+            'late_fines': late_fines,
+            'damage_fines': damage_fines,
+            'total_fines': total_fines
+        }
     }), 200
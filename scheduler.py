@@ -2,10 +2,24 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
 from models import db, Loan, Equipment
 from email_service import send_overdue_reminder
+from leader_election import create_lease, LeaderElector
+import metrics
+import time
+from tracing import traced
+from log_retention import run_log_maintenance
+from loan_archive import archive_loans
+from purge import purge_deleted
+from fines import accrue_fines
+from events import publish_newly_overdue, prune_events
+from report_jobs import prune_snapshots
+from kiosk_sync import prune_changes
+from idempotency import prune_keys
 
-scheduler = BackgroundScheduler()
+scheduler = None
+elector = None
 app_context = None
 
+@traced('scheduler.check_overdue_loans')
 def check_overdue_loans():
     """Check for overdue loans and send reminder emails"""
     global app_context
@@ -15,6 +29,7 @@ def check_overdue_loans():
         
     with app_context.app_context():
         print(f"[{datetime.now()}] Running overdue loan check...")
+        started = time.perf_counter()
         
         try:
             # Find all active loans where due date has passed
@@ -46,28 +61,192 @@ def check_overdue_loans():
                 print(f"Processed {len(overdue_loans)} overdue loans")
             else:
                 print("No overdue loans found")
+            metrics.observe_job('check_overdue_loans', time.perf_counter() - started, success=True)
                 
         except Exception as e:
             print(f"Error in check_overdue_loans: {str(e)}")
+            metrics.observe_job('check_overdue_loans', time.perf_counter() - started, success=False)
 
-def init_scheduler(app):
-    """Initialize the APScheduler"""
+@traced('scheduler.maintain_logs')
+def maintain_logs():
+    """Move old audit/email logs to the archive and compact months past retention"""
     global app_context
-    app_context = app
+    if not app_context:
+        print("App context not available for scheduler")
+        return
     
+    with app_context.app_context():
+        started = time.perf_counter()
+        try:
+            summary = run_log_maintenance(app_context.config)
+            for table, result in summary.items():
+                print(f"Log maintenance {table}: archived {result['archived_rows']} rows, "
+                      f"compacted {len(result['compacted'])} months, {result['hot_rows']} rows hot")
+            print(f"Pruned {prune_events(app_context.config)} change events")
+            print(f"Pruned {prune_snapshots(app_context.config)} report snapshots")
+            print(f"Pruned {prune_changes(app_context.config)} sync change stamps")
+            print(f"Pruned {prune_keys(app_context.config)} expired idempotency keys")
+            metrics.observe_job('maintain_logs', time.perf_counter() - started, success=True)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in maintain_logs: {str(e)}")
+            metrics.observe_job('maintain_logs', time.perf_counter() - started, success=False)
+
+@traced('scheduler.archive_loans')
+def archive_old_loans():
+    """Move returned loans past LOAN_ARCHIVE_AFTER_DAYS into the history tables"""
+    global app_context
+    if not app_context:
+        print("App context not available for scheduler")
+        return
+    
+    with app_context.app_context():
+        started = time.perf_counter()
+        try:
+            summary = archive_loans(app_context.config)
+            print(f"Loan archival: moved {summary['archived_loans']} loans returned before {summary['cutoff']}, "
+                  f"{summary['live_loans']} live")
+            metrics.observe_job('archive_loans', time.perf_counter() - started, success=True)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in archive_old_loans: {str(e)}")
+            metrics.observe_job('archive_loans', time.perf_counter() - started, success=False)
+
+@traced('scheduler.purge_deleted')
+def purge_deleted_rows():
+    """Hard-delete students and equipment soft-deleted past the grace period"""
+    global app_context
+    if not app_context:
+        print("App context not available for scheduler")
+        return
+    
+    with app_context.app_context():
+        started = time.perf_counter()
+        try:
+            summary = purge_deleted(app_context.config)
+            print(f"Purge: {summary['students']['purged']} students, {summary['equipment']['purged']} equipment, "
+                  f"{summary['students']['loans_purged'] + summary['equipment']['loans_purged']} loans")
+            metrics.observe_job('purge_deleted', time.perf_counter() - started, success=True)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in purge_deleted_rows: {str(e)}")
+            metrics.observe_job('purge_deleted', time.perf_counter() - started, success=False)
+
+@traced('scheduler.accrue_fines')
+def accrue_fines_job():
+    """Recompute accrued fines for all overdue loans in one statement"""
+    global app_context
+    if not app_context:
+        print("App context not available for scheduler")
+        return
+    
+    with app_context.app_context():
+        started = time.perf_counter()
+        try:
+            updated = accrue_fines(app_context.config)
+            newly_overdue = publish_newly_overdue(datetime.utcnow().date())
+            db.session.commit()
+            print(f"Fine accrual: {updated} overdue loans updated, {newly_overdue} newly overdue")
+            metrics.observe_job('accrue_fines', time.perf_counter() - started, success=True)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in accrue_fines_job: {str(e)}")
+            metrics.observe_job('accrue_fines', time.perf_counter() - started, success=False)
+
+def start_jobs():
+    """Start the scheduler thread (called when this process becomes leader)"""
+    global scheduler
+    scheduler = BackgroundScheduler()
     scheduler.add_job(
         func=check_overdue_loans,
         trigger="cron",
         hour=8,
         minute=0,
+        id="check_overdue_loans",
         name="check_overdue_loans",
         misfire_grace_time=900
     )
+    scheduler.add_job(
+        func=accrue_fines_job,
+        trigger="cron",
+        hour=0,
+        minute=5,
+        id="accrue_fines",
+        name="accrue_fines",
+        misfire_grace_time=3600
+    )
+    scheduler.add_job(
+        func=maintain_logs,
+        trigger="cron",
+        hour=2,
+        minute=30,
+        id="maintain_logs",
+        name="maintain_logs",
+        misfire_grace_time=3600
+    )
+    scheduler.add_job(
+        func=archive_old_loans,
+        trigger="cron",
+        hour=3,
+        minute=0,
+        id="archive_loans",
+        name="archive_loans",
+        misfire_grace_time=3600
+    )
+    if app_context is not None and app_context.config.get('PURGE_DELETED_ENABLED'):
+        scheduler.add_job(
+            func=purge_deleted_rows,
+            trigger="cron",
+            hour=3,
+            minute=30,
+            id="purge_deleted",
+            name="purge_deleted",
+            misfire_grace_time=3600
+        )
     
     scheduler.start()
-    print("Scheduler started - Daily overdue check at 8:00 AM")
+    print("Scheduler started - Daily overdue check at 8:00 AM, fine accrual at 12:05 AM, log maintenance at 2:30 AM, loan archival at 3:00 AM")
+
+def stop_jobs():
+    """Stop the scheduler thread (called when this process loses leadership)"""
+    global scheduler
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=False)
+        print("Scheduler stopped - leadership released")
+    scheduler = None
+
+def is_scheduler_leader():
+    """Check if this process currently runs the scheduled jobs"""
+    return elector is not None and elector.is_leader
+
+def init_scheduler(app):
+    """Initialize the APScheduler behind a DB-backed leader lease"""
+    global app_context, elector
+    app_context = app
+    
+    if not app.config.get('SCHEDULER_ENABLED', True):
+        print("Scheduler disabled by configuration")
+        return
+    
+    if elector is not None:
+        elector.stop()
+    
+    with app.app_context():
+        lease = create_lease(db.engine, 'check_overdue_loans', app.config.get('SCHEDULER_LEASE_TTL', 60))
+    
+    elector = LeaderElector(
+        lease,
+        on_elected=start_jobs,
+        on_demoted=stop_jobs,
+        interval=app.config.get('SCHEDULER_HEARTBEAT_INTERVAL', 20)
+    )
+    elector.start()
 
 def shutdown_scheduler():
-    """Shutdown the scheduler"""
-    scheduler.shutdown()
+    """Shutdown the scheduler and give up the lease"""
+    global elector
+    if elector is not None:
+        elector.stop()
+        elector = None
+    stop_jobs()
     print("Scheduler shutdown")
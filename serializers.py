@@ -0,0 +1,220 @@
+"""Column-projection fast path for list endpoints.
+
+Selecting ORM entities and calling ``to_dict()`` per row pays for identity-map
+bookkeeping and attribute instrumentation on every row. The helpers here select
+only the columns a response needs, as plain tuples, and map them into slotted
+dataclasses whose fields mirror the matching ``Model.to_dict()`` keys. The JSON
+provider in ``json_provider.py`` serializes these rows directly.
+
+``Projection`` handles the ``?fields=`` / ``?include=`` request parameters: it
+selects only the requested columns and outer-joins only the relations that are
+embedded, producing plain dicts keyed like ``to_dict()``.
+"""
+from dataclasses import dataclass, field, fields
+from datetime import date
+from typing import Optional
+from models import db, Student, Equipment, Loan, Reservation, DamageLog
+
+
+@dataclass(slots=True)
+class StudentRow:
+    id: str
+    first_name: str
+    last_name: str
+    program: Optional[str]
+    year_level: Optional[int]
+    email: str
+    status: Optional[str]
+
+
+@dataclass(slots=True)
+class EquipmentRow:
+    id: str
+    name: str
+    model: Optional[str]
+    category: Optional[str]
+    serial_number: Optional[str]
+    condition: Optional[str]
+    availability_status: Optional[str]
+
+
+@dataclass(slots=True)
+class LoanRow:
+    id: str
+    student: Optional[StudentRow]
+    equipment: Optional[EquipmentRow]
+    date_borrowed: Optional[date]
+    date_due: Optional[date]
+    date_returned: Optional[date]
+    status: Optional[str]
+
+
+def columns_for(model, row_class):
+    """Model columns matching the fields of a row dataclass, in field order"""
+    return tuple(getattr(model, f.name) for f in fields(row_class))
+
+
+STUDENT_COLUMNS = columns_for(Student, StudentRow)
+EQUIPMENT_COLUMNS = columns_for(Equipment, EquipmentRow)
+LOAN_COLUMNS = (Loan.id, Loan.date_borrowed, Loan.date_due, Loan.date_returned, Loan.status)
+
+
+def fetch_students(*criteria, order_by=None):
+    """Return StudentRow objects matching the given filter criteria"""
+    stmt = db.select(*STUDENT_COLUMNS).where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    return [StudentRow(*row) for row in db.session.execute(stmt)]
+
+
+def fetch_equipment(*criteria, order_by=None):
+    """Return EquipmentRow objects matching the given filter criteria"""
+    stmt = db.select(*EQUIPMENT_COLUMNS).where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    return [EquipmentRow(*row) for row in db.session.execute(stmt)]
+
+
+def fetch_loans(*criteria, order_by=None):
+    """Return LoanRow objects (with embedded student/equipment) in one joined query"""
+    stmt = db.select(*LOAN_COLUMNS, *STUDENT_COLUMNS, *EQUIPMENT_COLUMNS)\
+        .select_from(Loan)\
+        .outerjoin(Student, Loan.student_id == Student.id)\
+        .outerjoin(Equipment, Loan.equipment_id == Equipment.id)\
+        .where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+
+    loan_end = len(LOAN_COLUMNS)
+    student_end = loan_end + len(STUDENT_COLUMNS)
+
+    rows = []
+    for row in db.session.execute(stmt):
+        loan_id, date_borrowed, date_due, date_returned, status = row[:loan_end]
+        student = StudentRow(*row[loan_end:student_end]) if row[loan_end] is not None else None
+        equipment = EquipmentRow(*row[student_end:]) if row[student_end] is not None else None
+        rows.append(LoanRow(loan_id, student, equipment, date_borrowed, date_due, date_returned, status))
+    return rows
+
+
+def row_id(row):
+    return row['id'] if isinstance(row, dict) else row.id
+
+
+def fetch_by_ids(fetch, id_column, ids, *criteria):
+    """Rows for ids in one IN query, in request order; returns (rows, missing ids)"""
+    found = {row_id(row): row for row in fetch(id_column.in_(ids), *criteria)}
+    return [found[i] for i in ids if i in found], [i for i in ids if i not in found]
+
+
+class FieldsetError(ValueError):
+    """Raised for unknown names in ?fields= or ?include="""
+
+
+@dataclass(frozen=True)
+class Resource:
+    """Column-backed to_dict() keys of a model, and the relations it can embed"""
+    model: type
+    fields: tuple
+    # relation name -> (resource name, foreign key column)
+    relations: dict = field(default_factory=dict)
+
+
+RESOURCES = {
+    'students': Resource(Student, tuple(f.name for f in fields(StudentRow))),
+    'equipment': Resource(Equipment, tuple(f.name for f in fields(EquipmentRow))),
+    'loans': Resource(
+        Loan,
+        ('id', 'date_borrowed', 'date_due', 'date_returned', 'status'),
+        {'student': ('students', Loan.student_id), 'equipment': ('equipment', Loan.equipment_id)}
+    ),
+    'reservations': Resource(
+        Reservation,
+        ('id', 'student_id', 'equipment_id', 'date_from', 'date_to', 'status', 'notes', 'created_at', 'confirmed_at'),
+        {'student': ('students', Reservation.student_id), 'equipment': ('equipment', Reservation.equipment_id)}
+    ),
+    'damage_logs': Resource(
+        DamageLog,
+        ('id', 'equipment_id', 'student_id', 'loan_id', 'damage_type', 'description', 'reported_by', 'status',
+         'repair_cost', 'replacement_cost', 'created_at', 'resolved_at'),
+        {'student': ('students', DamageLog.student_id), 'equipment': ('equipment', DamageLog.equipment_id)}
+    ),
+}
+
+
+def split_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class Projection:
+    """Columns and joined relations for one ?fields= / ?include= combination.
+
+    With neither parameter a resource keeps its full to_dict() shape. ``fields``
+    lists columns and/or relation names; ``include`` adds relations to embed;
+    ``fields[<relation>]`` narrows an embedded relation. ``id`` is always returned.
+    """
+
+    def __init__(self, name, fields=None, include=None, nested=None):
+        self.name = name
+        self.resource = resource = RESOURCES[name]
+        nested = nested or {}
+
+        requested = list(fields) if fields is not None else list(resource.fields)
+        if fields is None and include is None:
+            requested += resource.relations
+        requested += (include or []) + list(nested)
+        unknown = [n for n in requested if n not in resource.fields and n not in resource.relations]
+        if unknown:
+            raise FieldsetError(f"Unknown field(s) for {name}: {', '.join(unknown)}")
+
+        requested = list(dict.fromkeys(requested))
+        self.fields = ['id'] + [n for n in requested if n in resource.fields and n != 'id']
+        self.embeds = {
+            relation: Projection(resource.relations[relation][0], nested.get(relation), include=[])
+            for relation in requested if relation in resource.relations
+        }
+
+    @classmethod
+    def from_args(cls, name, args):
+        """Projection for request args, or None when they don't ask for one"""
+        nested = {key[len('fields['):-1]: split_names(value) for key, value in args.items()
+                  if key.startswith('fields[') and key.endswith(']')}
+        if 'fields' not in args and 'include' not in args and not nested:
+            return None
+        fields = split_names(args['fields']) if 'fields' in args else None
+        include = split_names(args['include']) if 'include' in args else None
+        return cls(name, fields, include, nested)
+
+    def statement(self, *criteria):
+        model = self.resource.model
+        stmt = db.select(*[getattr(model, n) for n in self.fields]).select_from(model)
+        for relation, sub in self.embeds.items():
+            target = db.aliased(sub.resource.model, name=relation)
+            stmt = stmt.add_columns(*[getattr(target, n) for n in sub.fields])\
+                .outerjoin(target, self.resource.relations[relation][1] == target.id)
+        return stmt.where(*criteria)
+
+    def row_to_dict(self, row):
+        end = len(self.fields)
+        item = dict(zip(self.fields, row[:end]))
+        for relation, sub in self.embeds.items():
+            start, end = end, end + len(sub.fields)
+            item[relation] = dict(zip(sub.fields, row[start:end])) if row[start] is not None else None
+        return item
+
+    def fetch(self, *criteria, order_by=None, limit=None, offset=None):
+        """Dicts for rows matching criteria"""
+        stmt = self.statement(*criteria)
+        if order_by is not None:
+            stmt = stmt.order_by(order_by)
+        if limit is not None:
+            stmt = stmt.limit(limit).offset(offset or 0)
+        return [self.row_to_dict(row) for row in db.session.execute(stmt)]
+
+    def fetch_one(self, *criteria):
+        rows = self.fetch(*criteria, limit=1)
+        return rows[0] if rows else None
+
+    def count(self, *criteria):
+        model = self.resource.model
+        return db.session.execute(db.select(db.func.count()).select_from(model).where(*criteria)).scalar()
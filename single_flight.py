@@ -0,0 +1,149 @@
+"""Request coalescing for expensive read endpoints.
+
+``@single_flight()`` makes identical concurrent requests share one run of the
+view. Requests are identical when they have the same normalized path, query
+arguments and caller role. The first request computes the response, and the
+others wait for it (up to SINGLE_FLIGHT_WAIT_SECONDS) and receive a copy.
+
+With ``max_age`` and/or ``stale_while_revalidate`` the last 200 response is
+kept in the shared local cache, tagged with the tables it was built from, so
+writes evict it through the invalidation bus. For ``max_age`` seconds it is
+served as-is. For a further ``stale_while_revalidate`` seconds it is served
+immediately while a single background run refreshes it. The
+``X-Single-Flight`` header reports miss, shared, hit or stale.
+
+Coalescing happens within each worker process.
+"""
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from flask import Response, copy_current_request_context, current_app, request
+from flask_login import current_user
+from cache_bus import cache
+import metrics
+
+CapturedResponse = namedtuple('CapturedResponse', 'body status headers computed_at')
+
+# Response headers worth replaying to requests that share a result
+REPLAYED_HEADERS = ('Content-Type', 'X-Next-Cursor')
+
+
+class Flight:
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its result"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+    
+    def in_flight(self, key):
+        with self.lock:
+            return key in self.flights
+    
+    def do(self, key, fn, wait=30):
+        """(result, shared) of fn(), joining a call already running for key"""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        
+        if not leader:
+            if flight.done.wait(wait):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result, True
+            # The leader is taking too long; don't queue behind it forever
+            return fn(), False
+        
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+
+group = SingleFlight()
+
+
+def request_key():
+    """Normalized path, sorted query arguments and the caller's role"""
+    path = request.path.rstrip('/') or '/'
+    args = '&'.join(f'{name}={value}' for name, values in sorted(request.args.lists()) if name != '_'
+                    for value in sorted(values))
+    role = getattr(current_user, 'role', None) if current_user.is_authenticated else 'anonymous'
+    return f'flight:{path}?{args}#{role}'
+
+
+def capture(rv):
+    response = current_app.make_response(rv)
+    headers = [(name, response.headers[name]) for name in REPLAYED_HEADERS if name in response.headers]
+    return CapturedResponse(response.get_data(), response.status_code, headers, time.time())
+
+
+def replay(captured, outcome):
+    response = Response(captured.body, status=captured.status, headers=captured.headers)
+    response.headers['X-Single-Flight'] = outcome
+    if outcome in ('hit', 'stale'):
+        response.headers['Age'] = str(int(time.time() - captured.computed_at))
+    metrics.inc('single_flight_requests_total', {'endpoint': request.endpoint or 'unmatched', 'outcome': outcome})
+    return response
+
+
+def single_flight(max_age=0, stale_while_revalidate=0, tags=()):
+    """Coalesce identical concurrent requests to the decorated view (place below @login_required)"""
+    window = max_age + stale_while_revalidate
+    
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('SINGLE_FLIGHT_ENABLED', True):
+                return view(*args, **kwargs)
+            
+            key = request_key()
+            wait = current_app.config.get('SINGLE_FLIGHT_WAIT_SECONDS', 30)
+            # Stored results rely on cache invalidation, which CACHE_ENABLED turns off
+            keep = window and current_app.config.get('CACHE_ENABLED', True)
+            
+            def compute():
+                # A write that evicts key/tags while the view runs leaves its result unstored
+                snapshot = cache.snapshot(key, tags) if keep else None
+                captured = capture(view(*args, **kwargs))
+                if keep and captured.status == 200:
+                    cache.set(key, captured, ttl=window, tags=tags, snapshot=snapshot)
+                return captured
+            
+            if keep:
+                last = cache.get(key)
+                if last is not None:
+                    age = time.time() - last.computed_at
+                    if age <= max_age:
+                        return replay(last, 'hit')
+                    if not group.in_flight(key):
+                        @copy_current_request_context
+                        def revalidate():
+                            try:
+                                group.do(key, compute, wait)
+                            except Exception as e:
+                                print(f"Error revalidating {key}: {str(e)}")
+                        threading.Thread(target=revalidate, name='single-flight-revalidate', daemon=True).start()
+                    return replay(last, 'stale')
+            
+            captured, shared = group.do(key, compute, wait)
+            return replay(captured, 'shared' if shared else 'miss')
+        return wrapper
+    return decorator
@@ -13,6 +13,34 @@ async function initCheckout() {
     
     // Form submission
     document.getElementById('checkout-form').addEventListener('submit', handleCheckout);
+    
+    // Keep the equipment list in sync with checkouts and returns elsewhere
+    if (window.EventSource) {
+        const source = new EventSource('/api/events');
+        source.addEventListener('equipment.availability', event => updateEquipmentOption(JSON.parse(event.data)));
+        source.addEventListener('equipment.deleted', event => removeEquipmentOption(JSON.parse(event.data)));
+    }
+}
+
+function updateEquipmentOption(change) {
+    const select = document.getElementById('equipment');
+    const existing = select.querySelector(`option[value="${change.equipment_id}"]`);
+    
+    if (change.availability_status !== 'Available') {
+        if (existing) existing.remove();
+    } else if (existing) {
+        existing.textContent = `${change.name} (${change.serial_number})`;
+    } else {
+        const option = document.createElement('option');
+        option.value = change.equipment_id;
+        option.textContent = `${change.name} (${change.serial_number})`;
+        select.appendChild(option);
+    }
+}
+
+function removeEquipmentOption(change) {
+    const existing = document.querySelector(`#equipment option[value="${change.equipment_id}"]`);
+    if (existing) existing.remove();
 }
 
 async function loadStudents() {
@@ -99,7 +127,7 @@ async function handleCheckout(event) {
         if (response.ok) {
             showMessage('Equipment checked out successfully!', 'success');
             document.getElementById('checkout-form').reset();
-            setTimeout(() => loadEquipment(), 1000);
+            if (!window.EventSource) setTimeout(() => loadEquipment(), 1000);
         } else {
             showMessage(result.error || 'Error during checkout', 'danger');
         }
@@ -1,5 +1,15 @@
 // Dashboard functionality
-document.addEventListener('DOMContentLoaded', loadDashboard);
+document.addEventListener('DOMContentLoaded', () => {
+    loadDashboard();
+    subscribeToChanges();
+});
+
+// Current state, kept up to date from /api/events
+const dashboardState = {
+    equipmentStatus: new Map(),   // equipment id -> availability_status
+    activeLoans: new Set(),       // ids of borrowed loans
+    overdueLoans: new Map()       // loan id -> loan
+};
 
 async function loadDashboard() {
     try {
@@ -8,24 +18,23 @@ async function loadDashboard() {
         if (!equipResponse.ok) throw new Error('Failed to fetch equipment');
         const equipment = await equipResponse.json();
         
-        document.getElementById('total-equipment').textContent = (equipment && equipment.length) || 0;
-        document.getElementById('available-equipment').textContent = (equipment && equipment.filter(e => e.availability_status === 'Available').length) || 0;
+        dashboardState.equipmentStatus = new Map((equipment || []).map(e => [e.id, e.availability_status]));
         
         // Load loans stats
         const loansResponse = await fetch('/api/loans');
         if (!loansResponse.ok) throw new Error('Failed to fetch loans');
         const loans = await loansResponse.json();
         
-        document.getElementById('active-loans').textContent = (loans && loans.filter(l => l.status === 'Borrowed').length) || 0;
+        dashboardState.activeLoans = new Set((loans || []).filter(l => l.status === 'Borrowed').map(l => l.id));
         
         // Load overdue loans
         const overdueResponse = await fetch('/api/loans/overdue');
         if (!overdueResponse.ok) throw new Error('Failed to fetch overdue loans');
         const overdue = await overdueResponse.json();
         
-        document.getElementById('overdue-count').textContent = (overdue && overdue.length) || 0;
+        dashboardState.overdueLoans = new Map((overdue || []).map(l => [l.id, l]));
         
-        loadOverdueTable(overdue || []);
+        renderDashboard();
     } catch (error) {
         console.error('Error loading dashboard:', error);
         // Set defaults if error occurs
@@ -36,6 +45,53 @@ async function loadDashboard() {
     }
 }
 
+function renderDashboard() {
+    const statuses = [...dashboardState.equipmentStatus.values()];
+    document.getElementById('total-equipment').textContent = statuses.length;
+    document.getElementById('available-equipment').textContent = statuses.filter(s => s === 'Available').length;
+    document.getElementById('active-loans').textContent = dashboardState.activeLoans.size;
+    document.getElementById('overdue-count').textContent = dashboardState.overdueLoans.size;
+    loadOverdueTable([...dashboardState.overdueLoans.values()]);
+}
+
+// Apply server-pushed changes instead of polling; falls back to polling without EventSource
+function subscribeToChanges() {
+    if (!window.EventSource) {
+        setInterval(loadDashboard, 30000);
+        return;
+    }
+    
+    const source = new EventSource('/api/events');
+    const on = (type, handler) => source.addEventListener(type, event => {
+        handler(JSON.parse(event.data));
+        renderDashboard();
+    });
+    
+    on('equipment.availability', change => {
+        dashboardState.equipmentStatus.set(change.equipment_id, change.availability_status);
+    });
+    on('equipment.deleted', change => {
+        dashboardState.equipmentStatus.delete(change.equipment_id);
+    });
+    on('loan.created', change => {
+        dashboardState.activeLoans.add(change.loan_id);
+    });
+    on('loan.returned', change => {
+        dashboardState.activeLoans.delete(change.loan_id);
+        dashboardState.overdueLoans.delete(change.loan_id);
+    });
+    source.addEventListener('loan.overdue', async event => {
+        const change = JSON.parse(event.data);
+        const response = await fetch(`/api/loans/${change.loan_id}?fields=date_due,student,equipment&fields[student]=first_name,last_name&fields[equipment]=name`);
+        if (response.ok) {
+            dashboardState.overdueLoans.set(change.loan_id, await response.json());
+            renderDashboard();
+        }
+    });
+    // Too many missed changes to replay; reload everything
+    source.addEventListener('reset', loadDashboard);
+}
+
 function loadOverdueTable(overdueLoans) {
     const tbody = document.querySelector('#overdue-table tbody');
     const noOverdueMsg = document.getElementById('no-overdue');
@@ -88,6 +144,3 @@ async function returnEquipment(loanId) {
         alert('Error returning equipment');
     }
 }
-
-// Refresh dashboard every 30 seconds
-setInterval(loadDashboard, 30000);
@@ -0,0 +1,327 @@
+"""Lightweight request-scoped tracing.
+
+Opens a root span per request (continuing a W3C ``traceparent`` or
+``X-Trace-Id`` header when one is sent) and child spans around SQL
+statements, ``mail.send``, ``log_audit`` and scheduler jobs. Only sampled
+traces record spans; unsampled requests still get a trace ID so it can be
+quoted back from the ``X-Trace-Id`` response header.
+
+Finished spans are handed to a background thread which writes them to a
+rotating JSONL file or POSTs them as OTLP/JSON to a local collector, so the
+request path never blocks on I/O.
+"""
+import atexit
+import functools
+import json
+import logging
+import random
+import re
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from flask import g, request
+from sqlalchemy import event
+from models import db
+
+span_logger = logging.getLogger('equipment_loan.traces')
+
+_TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+_OTLP_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+_current_span = ContextVar('current_span', default=None)
+_processor = None
+_sample_rate = 0.0
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Span:
+    """A timed operation within a trace"""
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'sampled',
+                 'start_ns', 'end_ns', 'attributes', 'error')
+    
+    def __init__(self, name, trace_id, parent_id=None, sampled=True, kind='internal', attributes=None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+    
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+    
+    def finish(self, error=None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = str(error)
+        if self.sampled and _processor is not None:
+            _processor.submit(self)
+    
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start': self.start_ns / 1e9,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+    
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': _OTLP_KINDS.get(self.kind, 1),
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': k, 'value': {'stringValue': str(v)}} for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def current_span():
+    return _current_span.get()
+
+
+def parse_trace_headers(headers):
+    """(trace_id, parent_span_id, sampled) from incoming headers; sampled is None when undecided"""
+    match = _TRACEPARENT.match(headers.get('traceparent', '').strip().lower())
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        return trace_id, parent_id, bool(int(flags, 16) & 1)
+    trace_id = headers.get('X-Trace-Id', '').strip().lower()
+    if _TRACE_ID.match(trace_id):
+        return trace_id, None, None
+    return None, None, None
+
+
+def begin_trace(name, trace_id=None, parent_id=None, sampled=None, kind='server', attributes=None):
+    """Start a root span and make it current; returns (span, token)"""
+    if sampled is None:
+        sampled = _processor is not None and random.random() < _sample_rate
+    root = Span(name, trace_id or _new_id(128), parent_id, sampled, kind, attributes)
+    return root, _current_span.set(root)
+
+
+def end_trace(root, token, error=None):
+    root.finish(error)
+    _current_span.reset(token)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Run a block as its own root trace (scheduler jobs, scripts)"""
+    root, token = begin_trace(name, kind='internal', attributes=attributes)
+    error = None
+    try:
+        yield root
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        end_trace(root, token, error)
+
+
+def traced(name):
+    """Decorator running a function as its own root trace"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def span(name, **attributes):
+    """Child span of the current span; a no-op when the trace isn't sampled"""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent.span_id, True, 'internal', attributes)
+    token = _current_span.set(child)
+    error = None
+    try:
+        yield child
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish(error)
+
+
+class JsonlExporter:
+    """Appends spans to a size-rotated JSONL file"""
+    
+    def __init__(self, path, max_bytes, backups):
+        if not span_logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            span_logger.addHandler(handler)
+            span_logger.setLevel(logging.INFO)
+            span_logger.propagate = False
+    
+    def export(self, spans):
+        for s in spans:
+            span_logger.info(json.dumps(s.to_dict()))
+
+
+class OtlpHttpExporter:
+    """POSTs spans as OTLP/JSON to a collector (e.g. http://localhost:4318/v1/traces)"""
+    
+    def __init__(self, endpoint, service_name, timeout=2):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+    
+    def export(self, spans):
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+            'scopeSpans': [{'scope': {'name': 'equipment_loan'}, 'spans': [s.to_otlp() for s in spans]}]
+        }]}
+        req = urllib.request.Request(self.endpoint, data=json.dumps(payload).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(req, timeout=self.timeout):
+            pass
+
+
+class SpanProcessor(threading.Thread):
+    """Batches finished spans off the request path and hands them to an exporter"""
+    
+    def __init__(self, exporter, queue_size=10000, batch_size=256, flush_interval=1.0):
+        super().__init__(name='span-processor', daemon=True)
+        self.exporter = exporter
+        # deque appends are atomic, so submit() takes no lock on the request path
+        self.buffer = deque()
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+    
+    def submit(self, finished_span):
+        if len(self.buffer) < self.queue_size:
+            self.buffer.append(finished_span)
+        else:
+            self.dropped += 1
+    
+    def _drain(self):
+        batch = []
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(self.buffer.popleft())
+        except IndexError:
+            pass
+        if batch:
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                print(f"Error exporting {len(batch)} spans: {str(e)}")
+        return len(batch)
+    
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self):
+        while self._drain():
+            pass
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    child = None
+    if parent is not None and parent.sampled:
+        child = Span('sql', parent.trace_id, parent.span_id, True, 'client',
+                     {'db.statement': statement})
+    conn.info.setdefault('trace_spans', []).append(child)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('trace_spans')
+    child = stack.pop() if stack else None
+    if child is not None:
+        child.finish()
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    stack = conn.info.get('trace_spans') if conn is not None else None
+    child = stack.pop() if stack else None
+    if child is not None:
+        child.finish(exception_context.original_exception)
+
+
+def shutdown_tracing():
+    if _processor is not None:
+        _processor.flush()
+
+
+def init_tracing(app):
+    """Register request spans, SQL spans and the span exporter"""
+    global _processor, _sample_rate
+    if not app.config.get('TRACING_ENABLED', True):
+        return
+    
+    _sample_rate = app.config.get('TRACE_SAMPLE_RATE', 0.1)
+    if _processor is None:
+        if app.config.get('TRACE_EXPORTER', 'jsonl') == 'otlp':
+            exporter = OtlpHttpExporter(app.config['TRACE_OTLP_ENDPOINT'],
+                                        app.config.get('TRACE_SERVICE_NAME', 'equipment-loan'))
+        else:
+            exporter = JsonlExporter(app.config.get('TRACE_FILE', 'traces.jsonl'),
+                                     app.config.get('TRACE_FILE_MAX_BYTES', 10 * 1024 * 1024),
+                                     app.config.get('TRACE_FILE_BACKUPS', 5))
+        _processor = SpanProcessor(exporter, app.config.get('TRACE_QUEUE_SIZE', 10000))
+        _processor.start()
+        atexit.register(shutdown_tracing)
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+    
+    @app.before_request
+    def start_request_span():
+        trace_id, parent_id, sampled = parse_trace_headers(request.headers)
+        g._trace_root, g._trace_token = begin_trace(
+            f'{request.method} {request.url_rule.rule if request.url_rule else request.path}',
+            trace_id, parent_id, sampled, 'server', {'http.method': request.method, 'http.target': request.path})
+    
+    @app.after_request
+    def tag_request_span(response):
+        root = g.get('_trace_root')
+        if root is not None:
+            root.set_attribute('http.status_code', response.status_code)
+            root.set_attribute('endpoint', request.endpoint)
+            response.headers['X-Trace-Id'] = root.trace_id
+        return response
+    
+    @app.teardown_request
+    def finish_request_span(exc):
+        root = g.pop('_trace_root', None)
+        if root is not None:
+            end_trace(root, g.pop('_trace_token'), exc)